@@ -1,9 +1,62 @@
 import csv
 import random
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, TimeoutError as FuturesTimeoutError
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import openrouteservice
 from modulos.logger_config import logger, get_data_dir
+from modulos.cache_rutas import CacheRutas
+from modulos.salud_proveedores import SaludProveedor
+from modulos.cuotas_api import UsoDiario, LimitadorAPI, CuotaAgotada, identificador_clave
+from modulos.estimador_rutas import EstimadorRutas
+from modulos.llamada_unica import LlamadaUnica
+
+# Perfil de vehículo que usa cada proveedor; forma parte de la clave de la caché de rutas
+PERFILES_PROVEEDOR = {
+    "OpenRouteService": "driving-hgv",
+    "Here": "truck",
+    "TomTom": "car",
+    "OSRM": "driving",
+    "Valhalla": "truck",
+}
+# Motores autoalojados (OSRM o Valhalla en localhost): sin cuota ni coste por llamada, así que
+# admiten más concurrencia y se prefieren para las consultas por lotes
+PROVEEDORES_LOCALES = ("OSRM", "Valhalla")
+
+# Valores por defecto de red; cada fila de api_keys.csv puede sobrescribirlos con
+# las columnas opcionales `timeout_conexion`, `timeout_lectura` y `reintentos`
+TIMEOUT_CONEXION = 3.05
+TIMEOUT_LECTURA = 10
+REINTENTOS = 2
+TAMANO_POOL = 10
+# Peticiones simultáneas como máximo por proveedor (columna opcional `limite_concurrencia`)
+# y hilos del ejecutor compartido por todas las consultas concurrentes
+LIMITE_CONCURRENCIA = 4
+LIMITE_CONCURRENCIA_LOCAL = 16
+MAX_HILOS = 8
+# Peticiones de respaldo (hedging): se lanzan si la primera API tarda más que su p90 de latencia
+# (o este valor si aún no hay muestras), y como mucho en esta proporción de las consultas
+LATENCIA_RESPALDO_POR_DEFECTO = 1.0
+MAX_TASA_RESPALDO = 0.1
+ESTADOS_REINTENTABLES = (429, 500, 502, 503, 504)
+# Rutas nuevas en la caché tras las que se vuelve a calibrar el estimador sin API
+RUTAS_POR_RECALIBRADO = 200
+
+# Tamaño máximo (orígenes, destinos) de cada petición de matriz según el proveedor
+TESELAS_MATRIZ = {
+    "OpenRouteService": (50, 50),
+    "Here": (15, 100),
+    "TomTom": (10, 10),
+    "OSRM": (50, 50),
+    "Valhalla": (50, 50),
+}
+# HERE usa otro host para la matriz; la columna opcional `matrix_url` del CSV lo sobrescribe
+URL_MATRIZ_HERE = "https://matrix.router.hereapi.com/v8/matrix"
 
 
 class APIManager:
@@ -12,20 +65,78 @@ class APIManager:
 
     Métodos principales:
         - cargar_apis_desde_csv: Carga configuraciones de API desde un archivo CSV.
-        - seleccionar_api: Selecciona una API disponible basada en pesos configurados.
+        - seleccionar_api: Selecciona una API sana según su peso configurado y su rendimiento medido.
         - obtener_distancia: Calcula la distancia y duración entre dos coordenadas usando la API seleccionada.
+        - obtener_matriz: Calcula distancias y duraciones entre varios orígenes y destinos en una sola petición.
+        - obtener_distancias: Calcula varias rutas independientes en paralelo.
+        - estadisticas_respaldo: Devuelve cuántas consultas han lanzado una petición de respaldo.
+        - estadisticas_coalescencia: Devuelve cuántas consultas idénticas simultáneas se han agrupado.
+        - estadisticas_cache: Devuelve los aciertos y fallos de la caché persistente de rutas.
+        - estado_proveedores: Devuelve el estado del circuito, errores y latencia de cada API.
+
+    Si la API elegida falla, la misma llamada se repite con la siguiente API sana (failover).
+    Cada clave respeta su ritmo y cuota diaria (`rps`, `rpm`, `rpd` en el CSV); si todas están
+    agotadas, se devuelve la estimación de `EstimadorRutas`, calibrado con la caché de rutas.
+
+    Además de los servicios remotos admite motores autoalojados compatibles con OSRM o Valhalla
+    (`name` = `OSRM` o `Valhalla` y `url` = el servidor, p. ej. `http://localhost:5000`; la
+    clave puede ir vacía). No tienen cuota y las consultas por lotes los usan primero.
+
+    La aplicación usa un único gestor por proceso, el de `obtener_api_manager()`.
     """
 
-    def __init__(self, archivo_csv="api_keys.csv"):
+    def __init__(self, archivo_csv="api_keys.csv", timeout_conexion=TIMEOUT_CONEXION,
+                 timeout_lectura=TIMEOUT_LECTURA, reintentos=REINTENTOS, max_hilos=MAX_HILOS):
         """
         Inicializa el APIManager con el archivo CSV de claves.
 
         Args:
             archivo_csv (str): Nombre del archivo CSV con las claves API.
+            timeout_conexion (float): Segundos máximos para establecer la conexión.
+            timeout_lectura (float): Segundos máximos de espera de la respuesta.
+            reintentos (int): Reintentos ante errores de conexión o estados 429/5xx.
+            max_hilos (int): Hilos del ejecutor para las consultas concurrentes.
         """
         self.api_keys_path = os.path.join(get_data_dir(), archivo_csv)
+        self.timeout_conexion = timeout_conexion
+        self.timeout_lectura = timeout_lectura
+        self.reintentos = reintentos
         self.apis = self.cargar_apis_desde_csv()
 
+        # Sesiones HTTP y clientes ORS de larga duración (keep-alive), uno por clave de API
+        self.sesiones = {}
+        self.clientes_ors = {}
+        self.semaforos = {}
+        self.salud = {}
+        self.limitadores = {}
+        self.uso_diario = UsoDiario()
+        self.ultima_api_usada = None
+        self.consultas_respaldables = 0
+        self.respaldos_lanzados = 0
+        self.respaldos_ganados = 0
+        self._lock_respaldo = threading.Lock()
+        self._rutas_sin_calibrar = 0
+        self._lock_calibrado = threading.Lock()
+        # Consultas idénticas simultáneas (mismas coordenadas redondeadas y perfiles) comparten una sola petición.
+        # Agrupa las de todas las ventanas porque el gestor es único por proceso (`obtener_api_manager`)
+        self.en_curso = LlamadaUnica()
+        self._ejecutor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="rutas")
+        for api in self.apis:
+            try:
+                self._crear_conexion(api)
+            except Exception as e:
+                logger.error(f"[ERROR] No se pudo preparar la conexión con {api['name']}: {e}")
+
+        # Caché persistente de rutas: sin ella se sigue funcionando, solo que siempre contra la API
+        try:
+            self.cache = CacheRutas()
+        except Exception as e:
+            logger.error(f"[ERROR] No se pudo abrir la caché de rutas, se consultará siempre la API: {e}")
+            self.cache = None
+
+        self.estimador = EstimadorRutas()
+        self.recalibrar_estimador()
+
     def cargar_apis_desde_csv(self):
         """
         Carga las configuraciones de las APIs desde un archivo CSV.
@@ -50,53 +161,519 @@ class APIManager:
                         "key": row["key"],
                         "app_id": row.get("app_id", None),
                         "url": row["url"],
+                        "matrix_url": row.get("matrix_url") or None,
                         "weight": int(row["weight"]),
+                        "timeout": (float(row.get("timeout_conexion") or self.timeout_conexion),
+                                    float(row.get("timeout_lectura") or self.timeout_lectura)),
+                        "reintentos": int(row.get("reintentos") or self.reintentos),
+                        "limite_concurrencia": int(row.get("limite_concurrencia") or (
+                            LIMITE_CONCURRENCIA_LOCAL if row["name"] in PROVEEDORES_LOCALES else LIMITE_CONCURRENCIA)),
+                        "rps": float(row.get("rps") or 0) or None,
+                        "rpm": float(row.get("rpm") or 0) or None,
+                        "rpd": int(row.get("rpd") or 0) or None,
                     })
         except Exception as e:
             logger.error(f"[ERROR] No se pudo cargar el archivo CSV: {e}")
             raise
         return apis
 
-    def seleccionar_api(self):
+    @staticmethod
+    def _clave_api(api):
+        return api["name"], api["key"]
+
+    def _crear_conexion(self, api):
+        """
+        Crea la sesión HTTP con pool de conexiones y reintentos para una API,
+        y el cliente de OpenRouteService si corresponde.
+
+        Args:
+            api (dict): Configuración de la API.
+        """
+        clave = self._clave_api(api)
+        self.semaforos[clave] = threading.BoundedSemaphore(api["limite_concurrencia"])
+        self.salud[clave] = SaludProveedor(api["name"])
+        self.limitadores[clave] = LimitadorAPI(identificador_clave(*clave), self.uso_diario,
+                                               api["rps"], api["rpm"], api["rpd"])
+        if api["name"] == "OpenRouteService":
+            # El cliente de ORS mantiene su propia sesión y reintenta 429/503 hasta `retry_timeout`;
+            # se limita a un timeout de lectura para no bloquear la interfaz con reintentos largos.
+            # La URL base sale de la del CSV (p. ej. `https://api.openrouteservice.org/v2/directions`),
+            # así puede apuntar a un servidor propio o al simulado
+            self.clientes_ors[clave] = openrouteservice.Client(
+                key=api["key"],
+                base_url=api["url"].split("/v2/")[0].rstrip("/"),
+                timeout=api["timeout"],
+                retry_timeout=api["timeout"][1],
+            )
+            return
+
+        reintentos = Retry(
+            total=api["reintentos"],
+            backoff_factor=0.3,
+            status_forcelist=ESTADOS_REINTENTABLES,
+            allowed_methods=frozenset({"GET", "POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        tamano_pool = max(TAMANO_POOL, api["limite_concurrencia"])
+        adaptador = HTTPAdapter(pool_connections=tamano_pool, pool_maxsize=tamano_pool, max_retries=reintentos)
+        sesion = requests.Session()
+        sesion.mount("https://", adaptador)
+        sesion.mount("http://", adaptador)
+        self.sesiones[clave] = sesion
+
+    def cerrar(self):
+        """Detiene el ejecutor de consultas concurrentes, guarda el uso diario y cierra las sesiones HTTP abiertas."""
+        self._ejecutor.shutdown(wait=False)
+        self.uso_diario.guardar()
+        for sesion in self.sesiones.values():
+            sesion.close()
+
+    def seleccionar_api(self, excluir=(), preferir_locales=False, reserva_cuota=None):
         """
-        Selecciona una API basada en pesos configurados en el archivo CSV.
+        Selecciona una API entre las que tienen el circuito cerrado (o admiten la consulta de prueba)
+        y cuota diaria, con probabilidad proporcional al peso del archivo CSV multiplicado por su
+        rendimiento medido. Se prefieren las que pueden atender ya sin esperar a su límite de ritmo.
+
+        Args:
+            excluir (iterable): Claves `(nombre, clave)` de APIs ya intentadas en esta llamada.
+            preferir_locales (bool): Para consultas por lotes: si hay un motor local (`PROVEEDORES_LOCALES`)
+                disponible, se elige entre ellos.
+            reserva_cuota (float, optional): Para consultas en segundo plano: solo motores locales y
+                claves que conserven más de esta fracción (0-1) de una cuota diaria conocida (`rpd`).
 
         Returns:
-            dict: Configuración de la API seleccionada.
+            dict: Configuración de la API seleccionada, o None si no queda ninguna disponible.
         """
+        excluir = set(excluir)
         try:
-            total_weight = sum(api["weight"] for api in self.apis)
-            choice = random.uniform(0, total_weight)
-            current = 0
-            for api in self.apis:
-                current += api["weight"]
-                if current >= choice:
-                    return api
+            candidatas = [
+                api for api in self.apis
+                if api["weight"] > 0 and self._clave_api(api) not in excluir
+                and not self.limitadores[self._clave_api(api)].agotado()
+                and self._salud(api).disponible(reservar=False)
+                and (reserva_cuota is None or self._cuota_sobrante(api, reserva_cuota))
+            ]
+            if not candidatas:
+                return None
+            if preferir_locales:
+                candidatas = [api for api in candidatas if api["name"] in PROVEEDORES_LOCALES] or candidatas
+            candidatas = [
+                api for api in candidatas if self.limitadores[self._clave_api(api)].espera_estimada() == 0
+            ] or candidatas
+            pesos = [api["weight"] * self._salud(api).factor_rendimiento() for api in candidatas]
+            api = random.choices(candidatas, weights=pesos)[0]
+            self._salud(api).disponible()
+            return api
         except Exception as e:
+            # Sin devolver una API por defecto: quien llama reintenta hasta recibir None
             logger.error(f"[ERROR] Error al seleccionar API: {e}")
-        return self.apis[0]
+            return None
+
+    def _salud(self, api):
+        clave = self._clave_api(api)
+        if clave not in self.salud:
+            self.salud[clave] = SaludProveedor(api["name"])
+        return self.salud[clave]
+
+    def estado_proveedores(self):
+        """
+        Devuelve el estado de salud de cada API configurada.
+
+        Returns:
+            dict: Por nombre de API, estado del circuito, muestras, tasa de errores, latencia media
+            y peso efectivo.
+        """
+        estado = {}
+        for api in self.apis:
+            salud = self._salud(api)
+            estado[api["name"]] = {
+                **salud.resumen(),
+                "peso_efectivo": api["weight"] * salud.factor_rendimiento(),
+                "restante_diario": self.limitadores[self._clave_api(api)].restante_diario(),
+            }
+        return estado
+
+    def cuotas_agotadas(self):
+        """Indica si todas las claves con peso han agotado su cuota diaria."""
+        return all(self.limitadores[self._clave_api(api)].agotado() for api in self.apis if api["weight"] > 0)
+
+    def _cuota_sobrante(self, api, reserva):
+        """
+        Indica si la API admite consultas en segundo plano: los motores locales siempre; las
+        claves remotas, solo si tienen cuota diaria (`rpd`) y conservan más de `reserva` (0-1).
+        Una clave sin `rpd` tiene cuota desconocida y no se gasta en segundo plano.
+        """
+        if api["name"] in PROVEEDORES_LOCALES:
+            return True
+        limitador = self.limitadores[self._clave_api(api)]
+        restante = limitador.restante_diario()
+        return restante is not None and restante > limitador.rpd * reserva
+
+    def cuota_disponible(self, reserva=0.0):
+        """
+        Indica si alguna API con peso admite consultas en segundo plano: un motor local o una clave
+        que conserve más de `reserva` (fracción 0-1) de su cuota diaria conocida.
+        """
+        return any(self._cuota_sobrante(api, reserva) for api in self.apis if api["weight"] > 0)
+
+    def recalibrar_estimador(self):
+        """Vuelve a calibrar el estimador sin API con las rutas que hay ahora en la caché."""
+        if self.cache is None:
+            return
+        with self._lock_calibrado:
+            self._rutas_sin_calibrar = 0
+        try:
+            self.estimador = EstimadorRutas.construir(self.cache.muestras())
+        except Exception as e:
+            logger.error(f"[ERROR] No se pudo calibrar el estimador de rutas: {e}")
+
+    def _anotar_rutas_nuevas(self, cantidad):
+        """Cuenta las rutas guardadas en la caché y, cada `RUTAS_POR_RECALIBRADO`, recalibra el estimador en el ejecutor."""
+        with self._lock_calibrado:
+            self._rutas_sin_calibrar += cantidad
+            if self._rutas_sin_calibrar < RUTAS_POR_RECALIBRADO:
+                return
+            self._rutas_sin_calibrar = 0
+        try:
+            self._ejecutor.submit(self.recalibrar_estimador)
+        except RuntimeError:
+            # Ejecutor ya cerrado (`cerrar`)
+            pass
 
-    def obtener_distancia(self, lat_origen, lon_origen, lat_destino, lon_destino):
+    def estimar_ruta(self, lat_origen, lon_origen, lat_destino, lon_destino):
+        """
+        Estima distancia y duración sin API con el estimador calibrado. Acepta escalares o
+        arrays (se aplica broadcasting).
+
+        Returns:
+            tuple: Distancia en kilómetros y duración en minutos.
+        """
+        estimacion = self.estimador.estimar(lat_origen, lon_origen, lat_destino, lon_destino)
+        return estimacion["distancia"], estimacion["duracion"]
+
+    def obtener_distancia(self, lat_origen, lon_origen, lat_destino, lon_destino, respaldo=False,
+                          preferir_locales=False, presupuesto=None):
         """
         Calcula la distancia y duración entre dos coordenadas utilizando la API seleccionada.
+        Si falla, lo intenta con el resto de APIs sanas antes de rendirse.
 
         Args:
             lat_origen (float): Latitud de origen.
             lon_origen (float): Longitud de origen.
             lat_destino (float): Latitud de destino.
             lon_destino (float): Longitud de destino.
+            respaldo (bool): Para consultas interactivas: si la primera API no responde dentro de
+                su p90 de latencia, se lanza la misma consulta a otra API sana y gana la primera respuesta.
+            preferir_locales (bool): Usar un motor local (OSRM/Valhalla) si hay alguno disponible.
+            presupuesto (Presupuesto, optional): Plazo de la operación; si se agota antes de tener
+                la ruta se deja de esperar (la consulta sigue en segundo plano y acaba en la caché).
+
+        Returns:
+            tuple: Distancia en kilómetros y duración en minutos. Si ocurre un error o se agota
+            el plazo, devuelve (None, None).
+        """
+        perfiles = [PERFILES_PROVEEDOR.get(api["name"], api["name"]) for api in self.apis]
+        if self.cache is not None:
+            cacheado = self.cache.obtener(lat_origen, lon_origen, lat_destino, lon_destino, perfiles)
+            if cacheado is not None:
+                self.ultima_api_usada = "Caché"
+                return cacheado
+
+        coordenadas = (lat_origen, lon_origen, lat_destino, lon_destino)
+        clave = (CacheRutas._redondear(*coordenadas), tuple(perfiles))
+        if presupuesto is None:
+            return self.en_curso.ejecutar(clave, self._resolver_distancia, coordenadas, respaldo, preferir_locales)
+
+        if presupuesto.agotado():
+            logger.warning(f"{presupuesto.nombre}: plazo agotado; no se consulta la ruta")
+            return None, None
+        futuro = self._ejecutor.submit(self.en_curso.ejecutar, clave, self._resolver_distancia,
+                                       coordenadas, respaldo, preferir_locales)
+        try:
+            return futuro.result(timeout=presupuesto.restante())
+        except FuturesTimeoutError:
+            logger.warning(f"{presupuesto.nombre}: plazo agotado esperando la ruta; se continúa sin ella")
+            return None, None
+
+    def _resolver_distancia(self, coordenadas, respaldo, preferir_locales=False):
+        """
+        Resuelve una ruta que no está en la caché: con respaldo si se pide, con failover entre
+        APIs y, si todas han agotado su cuota, con la estimación sin API.
+        """
+        intentadas = set()
+        if respaldo:
+            resultado = self._obtener_con_respaldo(coordenadas, intentadas)
+            if resultado is not None:
+                return resultado
+
+        while True:
+            api = self.seleccionar_api(excluir=intentadas, preferir_locales=preferir_locales)
+            if api is None:
+                if self.cuotas_agotadas():
+                    logger.debug("[DEBUG] Cuotas de todas las APIs agotadas; se usa una distancia estimada")
+                    self.ultima_api_usada = "Estimación"
+                    distancia, duracion = self.estimar_ruta(*coordenadas)
+                    return float(distancia), float(duracion)
+                logger.error("[ERROR] Ninguna API de rutas disponible ha podido calcular la distancia")
+                return None, None
+            intentadas.add(self._clave_api(api))
+
+            resultado = self._intentar_api(api, coordenadas)
+            if resultado is not None:
+                self.ultima_api_usada = api["name"]
+                return resultado
+
+    def _intentar_api(self, api, coordenadas):
+        """
+        Consulta una ruta a una API concreta y, si responde, la guarda en la caché.
+
+        Returns:
+            tuple: Distancia y duración, o None si la API no tiene cuota o no devuelve la ruta.
+        """
+        try:
+            distancia, duracion = self._con_limite(api, self._consultar_api, *coordenadas)
+        except CuotaAgotada:
+            logger.debug(f"[DEBUG] {api['name']} sin cuota disponible; se prueba con otra API")
+            return None
+        if distancia is None or duracion is None:
+            logger.debug(f"[DEBUG] {api['name']} no ha devuelto la ruta; se prueba con otra API")
+            return None
+        if self.cache is not None:
+            self.cache.guardar(*coordenadas, PERFILES_PROVEEDOR.get(api["name"], api["name"]), distancia, duracion, api["name"])
+            self._anotar_rutas_nuevas(1)
+        return distancia, duracion
+
+    def _obtener_con_respaldo(self, coordenadas, intentadas):
+        """
+        Lanza la consulta a una API y, si tarda más que su p90 de latencia, la repite en otra API
+        sana. Devuelve la primera respuesta válida; la petición perdedora se cancela si aún no ha
+        salido y, si ya está en curso, su resultado solo se aprovecha para la caché.
+
+        Returns:
+            tuple: Distancia y duración, o None si ninguna de las dos APIs responde.
+        """
+        api = self.seleccionar_api(excluir=intentadas)
+        if api is None:
+            return None
+        intentadas.add(self._clave_api(api))
+        with self._lock_respaldo:
+            self.consultas_respaldables += 1
+
+        futuros = {self._ejecutor.submit(self._intentar_api, api, coordenadas): api}
+        espera = self._salud(api).latencia_percentil(90) or LATENCIA_RESPALDO_POR_DEFECTO
+        terminados, _ = wait(futuros, timeout=espera)
+        if not terminados and self._reservar_respaldo():
+            segunda = self.seleccionar_api(excluir=intentadas)
+            if segunda is None:
+                with self._lock_respaldo:
+                    self.respaldos_lanzados -= 1
+            else:
+                intentadas.add(self._clave_api(segunda))
+                logger.debug(f"[DEBUG] {api['name']} tarda más de {espera:.2f} s; respaldo con {segunda['name']}")
+                futuros[self._ejecutor.submit(self._intentar_api, segunda, coordenadas)] = segunda
+
+        for futuro in as_completed(futuros):
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                logger.error(f"[ERROR] Error en la consulta con respaldo: {e}")
+                continue
+            if resultado is None:
+                continue
+            ganadora = futuros[futuro]
+            if ganadora is not api:
+                with self._lock_respaldo:
+                    self.respaldos_ganados += 1
+            for otro in futuros:
+                otro.cancel()
+            self.ultima_api_usada = ganadora["name"]
+            return resultado
+        return None
+
+    def _reservar_respaldo(self):
+        """Cuenta un respaldo si no se supera `MAX_TASA_RESPALDO` de las consultas respaldables."""
+        with self._lock_respaldo:
+            if self.respaldos_lanzados >= max(1, MAX_TASA_RESPALDO * self.consultas_respaldables):
+                return False
+            self.respaldos_lanzados += 1
+            return True
+
+    def estadisticas_coalescencia(self):
+        """
+        Returns:
+            dict: Consultas de ruta `ejecutadas`, `compartidas` con otra idéntica en curso (de
+            cualquier ventana o hilo del proceso) y `en_curso`.
+        """
+        return self.en_curso.estadisticas()
+
+    def estadisticas_respaldo(self):
+        """
+        Devuelve los contadores de las peticiones de respaldo (hedging).
+
+        Returns:
+            dict: `consultas` que admitían respaldo, `respaldos` lanzados, `tasa_respaldo` (0-1)
+            y `ganados_por_respaldo` (veces que respondió antes la segunda API).
+        """
+        with self._lock_respaldo:
+            return {
+                "consultas": self.consultas_respaldables,
+                "respaldos": self.respaldos_lanzados,
+                "tasa_respaldo": self.respaldos_lanzados / self.consultas_respaldables if self.consultas_respaldables else 0.0,
+                "ganados_por_respaldo": self.respaldos_ganados,
+            }
+
+    def obtener_distancias(self, pares, al_completar=None, presupuesto=None):
+        """
+        Calcula varias rutas independientes en paralelo, respetando el límite de peticiones
+        simultáneas de cada proveedor. La espera total es la de la consulta más lenta, no la suma.
+
+        Args:
+            pares (list): Lista de `(lat_origen, lon_origen, lat_destino, lon_destino)`.
+            al_completar (callable, optional): Se llama con `(indice, distancia, duracion)` según
+                va terminando cada consulta, en el hilo que la ha resuelto.
+            presupuesto (Presupuesto, optional): Plazo de la operación; al agotarse se devuelven
+                los pares resueltos hasta entonces.
+
+        Returns:
+            list: `(distancia_km, duracion_min)` por par, en el mismo orden; `(None, None)` si falla
+            o no ha llegado a tiempo.
+        """
+        resultados = [(None, None)] * len(pares)
+        futuros = {
+            self._ejecutor.submit(self.obtener_distancia, *par, preferir_locales=True): indice
+            for indice, par in enumerate(pares)
+        }
+        try:
+            for futuro in as_completed(futuros, timeout=presupuesto.restante() if presupuesto else None):
+                indice = futuros[futuro]
+                try:
+                    resultados[indice] = futuro.result()
+                except Exception as e:
+                    logger.error(f"[ERROR] Error en la consulta concurrente {indice}: {e}")
+                    continue
+                if al_completar is not None:
+                    al_completar(indice, *resultados[indice])
+        except FuturesTimeoutError:
+            sin_terminar = [futuro for futuro in futuros if not futuro.done()]
+            for futuro in sin_terminar:
+                futuro.cancel()
+            logger.warning(f"{presupuesto.nombre}: plazo agotado con {len(sin_terminar)} de {len(pares)} rutas sin respuesta")
+        return resultados
+
+    def obtener_matriz(self, origenes, destinos, presupuesto=None, usar_cache=True, estimar=True, reserva_cuota=None):
+        """
+        Calcula distancias y duraciones entre todos los orígenes y destinos usando el endpoint
+        de matriz del proveedor seleccionado, en lugar de una petición por par.
+
+        Los pares ya presentes en la caché no se piden; el resto se agrupa en teselas del tamaño
+        máximo que admite el proveedor (`TESELAS_MATRIZ`).
+
+        Args:
+            origenes (list): Lista de `(latitud, longitud)` de origen.
+            destinos (list): Lista de `(latitud, longitud)` de destino.
+            presupuesto (Presupuesto, optional): Plazo de la operación; al agotarse se devuelve la
+                matriz tal como esté, sin esperar a las teselas pendientes ni probar otras APIs.
+            usar_cache (bool): False para no leer ni guardar en la caché de rutas (consultas masivas
+                que solo la llenarían de trayectos que no se buscan).
+            estimar (bool): False para dejar en NaN, en lugar de estimar, lo que no se pueda pedir
+                porque todas las APIs han agotado su cuota.
+            reserva_cuota (float, optional): Para consultas en segundo plano: solo se usan motores
+                locales y claves que conserven más de esta fracción de su cuota diaria conocida.
 
         Returns:
-            tuple: Distancia en kilómetros y duración en minutos. Si ocurre un error, devuelve (None, None).
+            tuple: Dos `np.ndarray` de forma `(len(origenes), len(destinos))` con la distancia en
+            kilómetros y la duración en minutos; NaN en los pares que no se pudieron calcular a tiempo.
+        """
+        distancias = np.full((len(origenes), len(destinos)), np.nan)
+        duraciones = np.full((len(origenes), len(destinos)), np.nan)
+        if not len(origenes) or not len(destinos):
+            return distancias, duraciones
+
+        cache = self.cache if usar_cache else None
+        if cache is not None:
+            perfiles = [PERFILES_PROVEEDOR.get(api["name"], api["name"]) for api in self.apis]
+            for i, (lat_o, lon_o) in enumerate(origenes):
+                for j, (lat_d, lon_d) in enumerate(destinos):
+                    cacheado = cache.obtener(lat_o, lon_o, lat_d, lon_d, perfiles)
+                    if cacheado is not None:
+                        distancias[i, j], duraciones[i, j] = cacheado
+
+        intentadas = set()
+        while True:
+            # Solo se piden las filas y columnas con algún par pendiente
+            pendientes = np.isnan(distancias)
+            filas = np.flatnonzero(pendientes.any(axis=1))
+            columnas = np.flatnonzero(pendientes.any(axis=0))
+            if not len(filas):
+                return distancias, duraciones
+            if presupuesto is not None and presupuesto.agotado():
+                logger.warning(f"{presupuesto.nombre}: plazo agotado con {int(pendientes.sum())} "
+                               f"pares de la matriz sin resolver")
+                return distancias, duraciones
+
+            # Lo que una API no resuelva se pide a la siguiente API sana (primero los motores locales)
+            api = self.seleccionar_api(excluir=intentadas, preferir_locales=True, reserva_cuota=reserva_cuota)
+            if api is None:
+                if estimar and self.cuotas_agotadas():
+                    logger.debug("[DEBUG] Cuotas de todas las APIs agotadas; se completa la matriz con estimaciones")
+                    lat_o, lon_o = np.asarray(origenes, dtype=float).T
+                    lat_d, lon_d = np.asarray(destinos, dtype=float).T
+                    estimadas, duraciones_estimadas = self.estimar_ruta(lat_o[:, None], lon_o[:, None], lat_d[None, :], lon_d[None, :])
+                    distancias[pendientes] = estimadas[pendientes]
+                    duraciones[pendientes] = duraciones_estimadas[pendientes]
+                return distancias, duraciones
+            intentadas.add(self._clave_api(api))
+
+            # Orígenes o destinos repetidos (p. ej. el mismo código postal en varios huecos) se piden una vez
+            unicas_filas, inversa_filas = self._coordenadas_unicas([origenes[i] for i in filas])
+            unicas_columnas, inversa_columnas = self._coordenadas_unicas([destinos[j] for j in columnas])
+            sub_distancias, sub_duraciones = self._consultar_matriz(api, unicas_filas, unicas_columnas, presupuesto)
+            sub_distancias = sub_distancias[inversa_filas][:, inversa_columnas]
+            sub_duraciones = sub_duraciones[inversa_filas][:, inversa_columnas]
+
+            perfil = PERFILES_PROVEEDOR.get(api["name"], api["name"])
+            guardadas = 0
+            for a, i in enumerate(filas):
+                for b, j in enumerate(columnas):
+                    if not pendientes[i, j] or np.isnan(sub_distancias[a, b]) or np.isnan(sub_duraciones[a, b]):
+                        continue
+                    distancias[i, j], duraciones[i, j] = sub_distancias[a, b], sub_duraciones[a, b]
+                    if cache is not None:
+                        cache.guardar(*origenes[i], *destinos[j], perfil,
+                                           distancias[i, j], duraciones[i, j], api["name"])
+                        guardadas += 1
+            if guardadas:
+                self._anotar_rutas_nuevas(guardadas)
+            if not np.isnan(sub_distancias).all():
+                self.ultima_api_usada = api["name"]
+
+            logger.debug(f"[DEBUG] Matriz {len(origenes)}x{len(destinos)} con {api['name']}: "
+                         f"{pendientes.sum()} pares pedidos, {int(np.isnan(distancias).sum())} sin resolver")
+
+    def estadisticas_cache(self):
+        """
+        Devuelve los contadores de la caché de rutas.
+
+        Returns:
+            dict: Aciertos, fallos, tasa de aciertos y número de entradas, o None si no hay caché.
+        """
+        return self.cache.estadisticas() if self.cache is not None else None
+
+    def _consultar_api(self, api, lat_origen, lon_origen, lat_destino, lon_destino):
+        """
+        Consulta la ruta directamente al proveedor indicado, sin pasar por la caché.
+
+        Returns:
+            tuple: Distancia en kilómetros y duración en minutos, o (None, None) si falla.
         """
-        api = self.seleccionar_api()
         coords_origen = [lon_origen, lat_origen]
         coords_destino = [lon_destino, lat_destino]
 
         try:
             if api["name"] == "OpenRouteService":
                 try:
-                    client = openrouteservice.Client(key=api["key"])
+                    client = self.clientes_ors[self._clave_api(api)]
                     ruta = client.directions(
                         coordinates=[coords_origen, coords_destino],
                         profile="driving-hgv",  # Para camiones
@@ -123,7 +700,7 @@ class APIManager:
                     "speedCap": 90  # Establece la velocidad máxima a 90 km/h
                 }
 
-                response = requests.get(api["url"], params=params)
+                response = self.sesiones[self._clave_api(api)].get(api["url"], params=params, timeout=api["timeout"])
                 response.raise_for_status()
                 ruta = response.json()
                 distancia = ruta["routes"][0]["sections"][0]["summary"]["length"] / 1000
@@ -133,7 +710,7 @@ class APIManager:
             elif api["name"] == "TomTom":
                 url = f"{api['url']}/routing/1/calculateRoute/{lat_origen},{lon_origen}:{lat_destino},{lon_destino}/json"
                 try:
-                    response = requests.get(url, params={"key": api["key"]})
+                    response = self.sesiones[self._clave_api(api)].get(url, params={"key": api["key"]}, timeout=api["timeout"])
                     response.raise_for_status()
                     ruta = response.json()
                     distancia = ruta['routes'][0]['summary']['lengthInMeters'] / 1000
@@ -143,6 +720,28 @@ class APIManager:
                     logger.error(f"[ERROR] Error en TomTom: {e}")
                     return None, None
 
+            elif api["name"] == "OSRM":
+                url = f"{api['url']}/route/v1/{PERFILES_PROVEEDOR['OSRM']}/{lon_origen},{lat_origen};{lon_destino},{lat_destino}"
+                response = self.sesiones[self._clave_api(api)].get(url, params={"overview": "false"}, timeout=api["timeout"])
+                response.raise_for_status()
+                ruta = response.json()
+                if ruta.get("code") != "Ok":
+                    logger.error(f"[ERROR] Error en OSRM: {ruta.get('code')} {ruta.get('message', '')}")
+                    return None, None
+                return ruta["routes"][0]["distance"] / 1000, ruta["routes"][0]["duration"] / 60
+
+            elif api["name"] == "Valhalla":
+                cuerpo = {
+                    "locations": [{"lat": lat_origen, "lon": lon_origen}, {"lat": lat_destino, "lon": lon_destino}],
+                    "costing": PERFILES_PROVEEDOR["Valhalla"],
+                    "units": "kilometers",
+                    "directions_type": "none",
+                }
+                response = self.sesiones[self._clave_api(api)].post(f"{api['url']}/route", json=cuerpo, timeout=api["timeout"])
+                response.raise_for_status()
+                resumen = response.json()["trip"]["summary"]
+                return resumen["length"], resumen["time"] / 60
+
         except requests.exceptions.RequestException as e:
             logger.error(f"[ERROR] Error en {api['name']}: {e}")
         except openrouteservice.exceptions.ApiError as e:
@@ -151,3 +750,219 @@ class APIManager:
             logger.error(f"[ERROR] Error inesperado en {api['name']}: {e}")
 
         return None, None
+
+    @staticmethod
+    def _coordenadas_unicas(coordenadas):
+        """
+        Agrupa coordenadas iguales tras redondearlas como la caché.
+
+        Returns:
+            tuple: Lista de coordenadas únicas y array con la posición de cada original en ella.
+        """
+        claves = np.array([CacheRutas._redondear(*c) for c in coordenadas]).reshape(-1, 2)
+        _, primeras, inversa = np.unique(claves, axis=0, return_index=True, return_inverse=True)
+        return [coordenadas[k] for k in primeras], inversa.ravel()
+
+    def _con_limite(self, api, consulta, *args):
+        """
+        Ejecuta `consulta(api, *args)` ocupando uno de los huecos de concurrencia del proveedor
+        y anota su latencia y resultado en la salud del proveedor.
+
+        Antes consume un token del límite de ritmo de la clave (una petición, aunque sea de
+        matriz) y lanza `CuotaAgotada` si no hay cuota o habría que esperar demasiado.
+        """
+        if not self.limitadores[self._clave_api(api)].adquirir():
+            raise CuotaAgotada(f"{api['name']} sin cuota disponible")
+        with self.semaforos[self._clave_api(api)]:
+            inicio = time.monotonic()
+            try:
+                resultado = consulta(api, *args)
+            except Exception:
+                self._salud(api).registrar(False, time.monotonic() - inicio)
+                raise
+            self._salud(api).registrar(resultado[0] is not None, time.monotonic() - inicio)
+            return resultado
+
+    def _consultar_matriz(self, api, origenes, destinos, presupuesto=None):
+        """
+        Consulta la matriz directamente al proveedor indicado, sin pasar por la caché. Las teselas
+        se piden en paralelo, con el límite de concurrencia del proveedor; con `presupuesto`, las
+        que no llegan a tiempo se quedan en NaN.
+
+        Returns:
+            tuple: Matrices de distancia (km) y duración (min); NaN donde falle una tesela o un par.
+        """
+        distancias = np.full((len(origenes), len(destinos)), np.nan)
+        duraciones = np.full((len(origenes), len(destinos)), np.nan)
+        max_origenes, max_destinos = TESELAS_MATRIZ.get(api["name"], (1, 1))
+
+        futuros = {}
+        for i in range(0, len(origenes), max_origenes):
+            for j in range(0, len(destinos), max_destinos):
+                tesela_origenes = origenes[i:i + max_origenes]
+                tesela_destinos = destinos[j:j + max_destinos]
+                bloque = (slice(i, i + len(tesela_origenes)), slice(j, j + len(tesela_destinos)))
+                futuro = self._ejecutor.submit(self._con_limite, api, self._consultar_tesela, tesela_origenes, tesela_destinos)
+                futuros[futuro] = bloque
+
+        try:
+            for futuro in as_completed(futuros, timeout=presupuesto.restante() if presupuesto else None):
+                bloque = futuros[futuro]
+                try:
+                    distancias[bloque], duraciones[bloque] = futuro.result()
+                except CuotaAgotada as e:
+                    logger.debug(f"[DEBUG] Tesela de matriz sin pedir: {e}")
+                except requests.exceptions.RequestException as e:
+                    logger.error(f"[ERROR] Error en la matriz de {api['name']}: {e}")
+                except openrouteservice.exceptions.ApiError as e:
+                    logger.error(f"[ERROR] Error en la matriz de OpenRouteService: {e}")
+                except Exception as e:
+                    logger.error(f"[ERROR] Error inesperado en la matriz de {api['name']}: {e}")
+        except FuturesTimeoutError:
+            # Las teselas aún en cola no se piden; las que ya están en curso acaban por su timeout HTTP
+            sin_terminar = [futuro for futuro in futuros if not futuro.done()]
+            for futuro in sin_terminar:
+                futuro.cancel()
+            logger.warning(f"{presupuesto.nombre}: plazo agotado con {len(sin_terminar)} de "
+                           f"{len(futuros)} teselas de {api['name']} sin respuesta")
+
+        return distancias, duraciones
+
+    def _consultar_tesela(self, api, origenes, destinos):
+        """
+        Pide una tesela de la matriz a un proveedor. Lanza las excepciones de red o de la API.
+
+        Returns:
+            tuple: Matrices de distancia (km) y duración (min) de la tesela.
+        """
+        if api["name"] == "OpenRouteService":
+            client = self.clientes_ors[self._clave_api(api)]
+            respuesta = client.distance_matrix(
+                locations=[[lon, lat] for lat, lon in origenes] + [[lon, lat] for lat, lon in destinos],
+                sources=list(range(len(origenes))),
+                destinations=list(range(len(origenes), len(origenes) + len(destinos))),
+                profile="driving-hgv",
+                metrics=["distance", "duration"],
+                units="km",
+            )
+            # ORS devuelve None en los pares sin ruta; np.array(..., dtype=float) los convierte en NaN
+            distancias = np.array(respuesta["distances"], dtype=float)
+            duraciones = np.array(respuesta["durations"], dtype=float) / 60
+            return distancias, duraciones
+
+        if api["name"] == "Here":
+            cuerpo = {
+                "origins": [{"lat": lat, "lng": lon} for lat, lon in origenes],
+                "destinations": [{"lat": lat, "lng": lon} for lat, lon in destinos],
+                "regionDefinition": {"type": "world"},
+                "transportMode": "truck",
+                "matrixAttributes": ["travelTimes", "distances"],
+            }
+            response = self.sesiones[self._clave_api(api)].post(
+                api.get("matrix_url") or URL_MATRIZ_HERE,
+                params={"apiKey": api["key"], "async": "false"},
+                json=cuerpo,
+                timeout=api["timeout"],
+            )
+            response.raise_for_status()
+            matriz = response.json()["matrix"]
+            forma = (matriz["numOrigins"], matriz["numDestinations"])
+            distancias = np.array(matriz["distances"], dtype=float).reshape(forma) / 1000
+            duraciones = np.array(matriz["travelTimes"], dtype=float).reshape(forma) / 60
+            # Los pares con código de error distinto de 0 no tienen ruta válida
+            if "errorCodes" in matriz:
+                errores = np.array(matriz["errorCodes"]).reshape(forma) != 0
+                distancias[errores] = np.nan
+                duraciones[errores] = np.nan
+            return distancias, duraciones
+
+        if api["name"] == "TomTom":
+            cuerpo = {
+                "origins": [{"point": {"latitude": lat, "longitude": lon}} for lat, lon in origenes],
+                "destinations": [{"point": {"latitude": lat, "longitude": lon}} for lat, lon in destinos],
+            }
+            response = self.sesiones[self._clave_api(api)].post(
+                f"{api['url']}/routing/matrix/2",
+                params={"key": api["key"]},
+                json=cuerpo,
+                timeout=api["timeout"],
+            )
+            response.raise_for_status()
+            distancias = np.full((len(origenes), len(destinos)), np.nan)
+            duraciones = np.full((len(origenes), len(destinos)), np.nan)
+            for celda in response.json()["data"]:
+                resumen = celda.get("routeSummary")
+                if resumen is None:
+                    continue
+                i, j = celda["originIndex"], celda["destinationIndex"]
+                distancias[i, j] = resumen["lengthInMeters"] / 1000
+                duraciones[i, j] = resumen["travelTimeInSeconds"] / 60
+            return distancias, duraciones
+
+        if api["name"] == "OSRM":
+            coordenadas = ";".join(f"{lon},{lat}" for lat, lon in list(origenes) + list(destinos))
+            response = self.sesiones[self._clave_api(api)].get(
+                f"{api['url']}/table/v1/{PERFILES_PROVEEDOR['OSRM']}/{coordenadas}",
+                params={
+                    "sources": ";".join(str(i) for i in range(len(origenes))),
+                    "destinations": ";".join(str(len(origenes) + j) for j in range(len(destinos))),
+                    "annotations": "distance,duration",
+                },
+                timeout=api["timeout"],
+            )
+            response.raise_for_status()
+            tabla = response.json()
+            if tabla.get("code") != "Ok":
+                raise ValueError(f"OSRM devolvió {tabla.get('code')}: {tabla.get('message', '')}")
+            # Los pares sin ruta vienen como null, que np.array(..., dtype=float) convierte en NaN
+            return np.array(tabla["distances"], dtype=float) / 1000, np.array(tabla["durations"], dtype=float) / 60
+
+        if api["name"] == "Valhalla":
+            cuerpo = {
+                "sources": [{"lat": lat, "lon": lon} for lat, lon in origenes],
+                "targets": [{"lat": lat, "lon": lon} for lat, lon in destinos],
+                "costing": PERFILES_PROVEEDOR["Valhalla"],
+                "units": "kilometers",
+            }
+            response = self.sesiones[self._clave_api(api)].post(
+                f"{api['url']}/sources_to_targets", json=cuerpo, timeout=api["timeout"])
+            response.raise_for_status()
+            distancias = np.full((len(origenes), len(destinos)), np.nan)
+            duraciones = np.full((len(origenes), len(destinos)), np.nan)
+            for fila in response.json()["sources_to_targets"]:
+                for celda in fila:
+                    if celda.get("distance") is None or celda.get("time") is None:
+                        continue
+                    distancias[celda["from_index"], celda["to_index"]] = celda["distance"]
+                    duraciones[celda["from_index"], celda["to_index"]] = celda["time"] / 60
+            return distancias, duraciones
+
+        # Proveedor sin endpoint de matriz: un par cada vez
+        distancias = np.full((len(origenes), len(destinos)), np.nan)
+        duraciones = np.full((len(origenes), len(destinos)), np.nan)
+        for i, (lat_o, lon_o) in enumerate(origenes):
+            for j, (lat_d, lon_d) in enumerate(destinos):
+                distancia, duracion = self._consultar_api(api, lat_o, lon_o, lat_d, lon_d)
+                if distancia is not None and duracion is not None:
+                    distancias[i, j], duraciones[i, j] = distancia, duracion
+        return distancias, duraciones
+
+
+_api_manager = None
+_lock_api_manager = threading.Lock()
+
+
+def obtener_api_manager():
+    """
+    Devuelve el APIManager de la aplicación, creándolo la primera vez que se necesita.
+
+    Todas las ventanas y módulos usan el mismo gestor, así que comparten los límites de ritmo,
+    el uso diario de cada clave, las consultas en curso (single-flight) y las sesiones HTTP.
+    Returns:
+        APIManager: Gestor compartido por todo el proceso.
+    """
+    global _api_manager
+    with _lock_api_manager:
+        if _api_manager is None:
+            _api_manager = APIManager()
+        return _api_manager
@@ -0,0 +1,249 @@
+# modulos/areas_servicio.py
+import os
+
+import numpy as np
+import pandas as pd
+
+from modulos.logger_config import logger, get_data_dir
+from modulos.utils import formatear_codigo_postal, limpiar_direccion, nombres_adt_de_rutas
+
+ARCHIVO_AREAS = "areas_servicio.csv"
+MARGEN_AREA_KM = 10.0
+PUNTOS_POR_CENTROIDE = 8
+CAPACIDAD_NODO = 16
+KM_POR_GRADO_LATITUD = 111.0
+
+
+def envolvente_convexa(puntos):
+    """
+    Calcula la envolvente convexa de un conjunto de puntos (cadena monótona de Andrew).
+
+    Args:
+        puntos (np.ndarray): Array (N, 2) de coordenadas (lon, lat).
+    Returns:
+        np.ndarray: Vértices de la envolvente en sentido antihorario, sin repetir el primero.
+    """
+    puntos = np.unique(puntos, axis=0)
+    if len(puntos) <= 2:
+        return puntos
+
+    def cruz(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    inferior, superior = [], []
+    for p in puntos:
+        while len(inferior) >= 2 and cruz(inferior[-2], inferior[-1], p) <= 0:
+            inferior.pop()
+        inferior.append(p)
+    for p in puntos[::-1]:
+        while len(superior) >= 2 and cruz(superior[-2], superior[-1], p) <= 0:
+            superior.pop()
+        superior.append(p)
+    return np.array(inferior[:-1] + superior[:-1])
+
+
+def poligono_desde_centroides(lat, lon, margen_km=MARGEN_AREA_KM):
+    """
+    Convierte un conjunto de centroides de código postal en un polígono de área de servicio.
+
+    Cada centroide se sustituye por un octógono de radio `margen_km`, de modo que un único
+    código postal también da lugar a un área, y se toma la envolvente convexa del conjunto.
+
+    Returns:
+        np.ndarray: Vértices (lon, lat) del polígono, o None si no hay centroides válidos.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    validos = ~(np.isnan(lat) | np.isnan(lon))
+    lat, lon = lat[validos], lon[validos]
+    if not len(lat):
+        return None
+
+    angulos = np.linspace(0, 2 * np.pi, PUNTOS_POR_CENTROIDE, endpoint=False)
+    d_lat = margen_km / KM_POR_GRADO_LATITUD
+    d_lon = d_lat / np.cos(np.radians(lat))
+    puntos_lon = (lon[:, None] + d_lon[:, None] * np.cos(angulos)[None, :]).ravel()
+    puntos_lat = (lat[:, None] + d_lat * np.sin(angulos)[None, :]).ravel()
+    return envolvente_convexa(np.column_stack([puntos_lon, puntos_lat]))
+
+
+def puntos_en_poligono(lon, lat, poligono):
+    """
+    Prueba de pertenencia (ray casting) de muchos puntos frente a un polígono, vectorizada sobre los puntos.
+
+    Args:
+        lon, lat (np.ndarray): Coordenadas de los puntos.
+        poligono (np.ndarray): Vértices (lon, lat) del polígono.
+    Returns:
+        np.ndarray: Máscara booleana de puntos dentro del polígono.
+    """
+    dentro = np.zeros(len(lon), dtype=bool)
+    x1, y1 = poligono[:, 0], poligono[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    for xa, ya, xb, yb in zip(x1, y1, x2, y2):
+        cruza = (ya > lat) != (yb > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_corte = xa + (lat - ya) * (xb - xa) / (yb - ya)
+        dentro ^= cruza & (lon < x_corte)
+    return dentro
+
+
+def cargar_codigos_por_tecnico(cp_tecnicos_adt, rutas_tecnicos=None, archivo=None):
+    """
+    Obtiene el conjunto de códigos postales que cubre cada técnico.
+
+    Si existe `areas_servicio.csv` (columnas `Nombre Enrutador` y `Codigo Postal`) en el
+    directorio de datos, se usa tal cual. Si no, el área de cada técnico es su código postal
+    de casa del archivo ADT más los códigos postales de las visitas que tiene en ruta; el
+    `Res_Label` de las visitas se traduce al `Nombre Enrutador` del ADT para que casa y
+    visitas formen un solo polígono.
+
+    Args:
+        cp_tecnicos_adt (pd.DataFrame): Técnicos con `Nombre Enrutador` y `Codigo Postal`.
+        rutas_tecnicos (pd.DataFrame, optional): Visitas con `Res_Label` y `Direcciones`.
+        archivo (str, optional): Ruta alternativa de `areas_servicio.csv`.
+    Returns:
+        pd.DataFrame: Pares únicos `Nombre Enrutador` / `Codigo Postal`.
+    """
+    archivo = archivo or os.path.join(get_data_dir(), ARCHIVO_AREAS)
+    if os.path.exists(archivo):
+        areas = pd.read_csv(archivo, dtype=str)
+        columnas_necesarias = ['Nombre Enrutador', 'Codigo Postal']
+        for columna in columnas_necesarias:
+            if columna not in areas.columns:
+                raise KeyError(f"Falta la columna '{columna}' en {ARCHIVO_AREAS}.")
+        areas = areas[columnas_necesarias].dropna()
+        areas['Codigo Postal'] = areas['Codigo Postal'].apply(formatear_codigo_postal)
+        logger.info(f"Áreas de servicio cargadas desde {archivo}")
+        return areas.dropna().drop_duplicates()
+
+    partes = [cp_tecnicos_adt[['Nombre Enrutador', 'Codigo Postal']]]
+    if rutas_tecnicos is not None and not rutas_tecnicos.empty:
+        visitas = pd.DataFrame({
+            'Nombre Enrutador': nombres_adt_de_rutas(rutas_tecnicos['Res_Label'], cp_tecnicos_adt['Nombre Enrutador']),
+            'Codigo Postal': rutas_tecnicos['Direcciones'].map(limpiar_direccion),
+        })
+        partes.append(visitas)
+    areas = pd.concat(partes, ignore_index=True).dropna()
+    return areas[areas['Codigo Postal'].astype(bool)].drop_duplicates()
+
+
+class AreasServicio:
+    """
+    Índice de áreas de servicio (un polígono por técnico) para asignar órdenes a técnicos.
+
+    Los polígonos se empaquetan en un R-tree estático de dos niveles con el método STR
+    (Sort-Tile-Recursive): cada nodo agrupa hasta `CAPACIDAD_NODO` polígonos vecinos y guarda
+    su caja envolvente. Una consulta por lotes descarta nodos y polígonos por caja con
+    operaciones vectorizadas y solo ejecuta el point-in-polygon sobre los puntos candidatos.
+    """
+
+    def __init__(self, tecnicos, poligonos):
+        self.tecnicos = list(tecnicos)
+        self.poligonos = list(poligonos)
+        if self.poligonos:
+            self.cajas = np.array([[p[:, 0].min(), p[:, 1].min(), p[:, 0].max(), p[:, 1].max()]
+                                   for p in self.poligonos])
+        else:
+            self.cajas = np.zeros((0, 4))
+        self.nodos, self.cajas_nodos = self._empaquetar_str(self.cajas)
+
+    @staticmethod
+    def _empaquetar_str(cajas, capacidad=CAPACIDAD_NODO):
+        """Agrupa las cajas en nodos con Sort-Tile-Recursive y devuelve los nodos y sus cajas."""
+        n = len(cajas)
+        if not n:
+            return [], np.zeros((0, 4))
+
+        centro_x = (cajas[:, 0] + cajas[:, 2]) / 2
+        centro_y = (cajas[:, 1] + cajas[:, 3]) / 2
+        num_nodos = int(np.ceil(n / capacidad))
+        num_franjas = int(np.ceil(np.sqrt(num_nodos)))
+        por_franja = num_franjas * capacidad
+
+        nodos = []
+        orden_x = np.argsort(centro_x, kind="stable")
+        for inicio in range(0, n, por_franja):
+            franja = orden_x[inicio:inicio + por_franja]
+            franja = franja[np.argsort(centro_y[franja], kind="stable")]
+            for desde in range(0, len(franja), capacidad):
+                nodos.append(franja[desde:desde + capacidad])
+
+        cajas_nodos = np.array([[cajas[nodo, 0].min(), cajas[nodo, 1].min(),
+                                 cajas[nodo, 2].max(), cajas[nodo, 3].max()] for nodo in nodos])
+        return nodos, cajas_nodos
+
+    @classmethod
+    def construir(cls, codigos_por_tecnico, df_codigos_postales, margen_km=MARGEN_AREA_KM):
+        """
+        Crea el índice a partir de los códigos postales que cubre cada técnico.
+
+        Args:
+            codigos_por_tecnico (pd.DataFrame): Pares `Nombre Enrutador` / `Codigo Postal`
+                (ver `cargar_codigos_por_tecnico`).
+            df_codigos_postales (pd.DataFrame): Tabla con `codigo_postal`, `Latitud` y `Longitud`.
+            margen_km (float): Margen alrededor de cada centroide.
+        Returns:
+            AreasServicio: Índice listo para consultar.
+        """
+        coords_cp = df_codigos_postales.drop_duplicates(subset='codigo_postal', keep='first').set_index('codigo_postal')
+        areas = codigos_por_tecnico.assign(
+            Latitud=codigos_por_tecnico['Codigo Postal'].map(coords_cp['Latitud']),
+            Longitud=codigos_por_tecnico['Codigo Postal'].map(coords_cp['Longitud']),
+        )
+
+        tecnicos, poligonos = [], []
+        for tecnico, grupo in areas.groupby('Nombre Enrutador', sort=False):
+            poligono = poligono_desde_centroides(grupo['Latitud'], grupo['Longitud'], margen_km)
+            if poligono is None:
+                logger.debug(f"[DEBUG] El técnico {tecnico} no tiene códigos postales con coordenadas para su área")
+                continue
+            tecnicos.append(tecnico)
+            poligonos.append(poligono)
+
+        logger.info(f"Índice de áreas de servicio creado con {len(tecnicos)} técnicos")
+        return cls(tecnicos, poligonos)
+
+    def asignar_lote(self, lat, lon):
+        """
+        Asigna un lote de puntos (órdenes) a los técnicos cuya área los contiene.
+
+        Args:
+            lat, lon (array-like): Coordenadas de los puntos; los NaN no se asignan.
+        Returns:
+            pd.DataFrame: Pares `posicion` (índice del punto en la entrada) / `tecnico`,
+            ordenados por posición.
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        posiciones_asignadas, areas_asignadas = [], []
+
+        for nodo, (x_min, y_min, x_max, y_max) in zip(self.nodos, self.cajas_nodos):
+            en_nodo = np.flatnonzero((lon >= x_min) & (lon <= x_max) & (lat >= y_min) & (lat <= y_max))
+            if not len(en_nodo):
+                continue
+            for area in nodo:
+                ax_min, ay_min, ax_max, ay_max = self.cajas[area]
+                lon_nodo, lat_nodo = lon[en_nodo], lat[en_nodo]
+                en_caja = (lon_nodo >= ax_min) & (lon_nodo <= ax_max) & (lat_nodo >= ay_min) & (lat_nodo <= ay_max)
+                candidatos = en_nodo[en_caja]
+                if not len(candidatos):
+                    continue
+                dentro = candidatos[puntos_en_poligono(lon[candidatos], lat[candidatos], self.poligonos[area])]
+                posiciones_asignadas.append(dentro)
+                areas_asignadas.append(np.full(len(dentro), area))
+
+        if not posiciones_asignadas:
+            return pd.DataFrame({'posicion': np.zeros(0, dtype=np.int64), 'tecnico': pd.Series(dtype=object)})
+
+        posiciones = np.concatenate(posiciones_asignadas)
+        areas = np.concatenate(areas_asignadas)
+        orden = np.lexsort((areas, posiciones))
+        return pd.DataFrame({
+            'posicion': posiciones[orden],
+            'tecnico': np.array(self.tecnicos, dtype=object)[areas[orden]],
+        }).reset_index(drop=True)
+
+    def tecnicos_que_cubren(self, lat, lon):
+        """Devuelve la lista de técnicos cuya área de servicio contiene el punto."""
+        return self.asignar_lote([lat], [lon])['tecnico'].tolist()
@@ -0,0 +1,160 @@
+# modulos/autocompletado.py
+import os
+from bisect import bisect_left
+from functools import lru_cache
+
+import pandas as pd
+from PyQt5.QtWidgets import QCompleter
+from PyQt5.QtGui import QStandardItemModel, QStandardItem
+from PyQt5.QtCore import Qt
+
+from modulos.logger_config import logger, get_data_dir
+from modulos.geo import cargar_tabla_codigos_postales
+from modulos.geocodificador import normalizar_texto, ARCHIVO_CALLEJERO
+
+MAX_SUGERENCIAS = 15
+COLUMNAS_MUNICIPIO = ("municipio", "Municipio", "poblacion", "Poblacion", "localidad", "Localidad")
+
+
+class IndicePrefijos:
+    """
+    Índice de prefijos sobre códigos postales y nombres de municipio.
+
+    Las claves normalizadas se guardan ordenadas, de modo que todas las que empiezan por un
+    prefijo forman un tramo contiguo que se localiza con una búsqueda binaria (`bisect`),
+    equivalente a descender por un trie pero con arrays planos.
+    """
+
+    def __init__(self, entradas):
+        """
+        Args:
+            entradas (iterable): Tuplas `(clave, texto_mostrado, codigo_postal)`.
+        """
+        entradas = sorted({(normalizar_texto(clave), texto, cp) for clave, texto, cp in entradas if clave})
+        self.claves = [clave for clave, _, _ in entradas]
+        self.textos = [texto for _, texto, _ in entradas]
+        self.codigos = [cp for _, _, cp in entradas]
+        self.codigos_validos = set(self.codigos)
+
+    def __len__(self):
+        return len(self.claves)
+
+    def buscar(self, prefijo, limite=MAX_SUGERENCIAS):
+        """
+        Devuelve las entradas cuya clave empieza por `prefijo`.
+
+        Args:
+            prefijo (str): Texto escrito por el usuario.
+            limite (int): Número máximo de sugerencias.
+        Returns:
+            list: Tuplas `(texto_mostrado, codigo_postal)` en orden alfabético.
+        """
+        prefijo = normalizar_texto(prefijo)
+        if not prefijo:
+            return []
+        resultados = []
+        i = bisect_left(self.claves, prefijo)
+        while i < len(self.claves) and len(resultados) < limite and self.claves[i].startswith(prefijo):
+            resultados.append((self.textos[i], self.codigos[i]))
+            i += 1
+        return resultados
+
+    def es_codigo_valido(self, codigo_postal):
+        """Indica si el código postal existe en el listado."""
+        return codigo_postal in self.codigos_validos
+
+
+def _municipios_callejero():
+    """Pares municipio / código postal del callejero local, si existe y tiene esas columnas."""
+    ruta = os.path.join(get_data_dir(), ARCHIVO_CALLEJERO)
+    if not os.path.exists(ruta):
+        return pd.DataFrame(columns=["municipio", "codigo_postal"])
+    try:
+        df = pd.read_csv(ruta, usecols=["municipio", "codigo_postal"], dtype=str)
+    except ValueError:
+        # Callejero sin columna de código postal: no aporta sugerencias
+        return pd.DataFrame(columns=["municipio", "codigo_postal"])
+    df["codigo_postal"] = df["codigo_postal"].str.strip().str.zfill(5)
+    return df.dropna()
+
+
+@lru_cache(maxsize=1)
+def cargar_indice_autocompletado():
+    """
+    Construye (una sola vez por sesión) el índice de prefijos a partir de `Listado-de-CP`
+    y, si están disponibles, de sus columnas de municipio y del callejero local.
+
+    Returns:
+        IndicePrefijos: Índice compartido por todos los campos de código postal.
+    """
+    df = cargar_tabla_codigos_postales()
+    entradas = [(cp, cp, cp) for cp in df["codigo_postal"]]
+
+    municipios = [df.rename(columns={columna: "municipio"})[["municipio", "codigo_postal"]]
+                  for columna in COLUMNAS_MUNICIPIO if columna in df.columns]
+    municipios.append(_municipios_callejero())
+    municipios = pd.concat(municipios, ignore_index=True).dropna().drop_duplicates()
+    municipios = municipios[municipios["codigo_postal"].isin(set(df["codigo_postal"]))]
+    entradas += [(nombre, f"{nombre} ({cp})", cp)
+                 for nombre, cp in zip(municipios["municipio"].astype(str), municipios["codigo_postal"])]
+
+    indice = IndicePrefijos(entradas)
+    logger.debug(f"[DEBUG] Índice de autocompletado creado con {len(indice)} entradas")
+    return indice
+
+
+class CompletadorCodigoPostal(QCompleter):
+    """
+    `QCompleter` que sugiere códigos postales y municipios mientras se escribe.
+
+    El modelo se recalcula en cada pulsación con `IndicePrefijos.buscar`; al elegir una
+    sugerencia, el campo recibe solo el código postal aunque se haya elegido por municipio.
+    """
+
+    def __init__(self, indice, parent=None):
+        super().__init__(parent)
+        self.indice = indice
+        self.modelo = QStandardItemModel(self)
+        self.setModel(self.modelo)
+        self.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.setCaseSensitivity(Qt.CaseInsensitive)
+        self.setMaxVisibleItems(MAX_SUGERENCIAS)
+
+    def pathFromIndex(self, index):
+        return index.data(Qt.UserRole) or ""
+
+    def actualizar(self, texto):
+        """Sustituye las sugerencias por las que corresponden al texto escrito."""
+        self.modelo.clear()
+        for texto_mostrado, codigo_postal in self.indice.buscar(texto):
+            item = QStandardItem(texto_mostrado)
+            item.setData(codigo_postal, Qt.UserRole)
+            self.modelo.appendRow(item)
+        if self.modelo.rowCount():
+            self.complete()
+        else:
+            self.popup().hide()
+
+
+def configurar_autocompletado(line_edit):
+    """
+    Añade el autocompletado de códigos postales a un `QLineEdit`.
+
+    Si el listado de códigos postales no se puede cargar, el campo queda como estaba.
+
+    Args:
+        line_edit (QLineEdit): Campo de entrada de código postal.
+    Returns:
+        CompletadorCodigoPostal: El completador instalado, o None si no se pudo crear.
+    """
+    try:
+        indice = cargar_indice_autocompletado()
+    except Exception as e:
+        logger.error(f"[ERROR] No se pudo crear el índice de autocompletado: {e}")
+        return None
+
+    completador = CompletadorCodigoPostal(indice, line_edit)
+    completador.setWidget(line_edit)
+    completador.activated[str].connect(line_edit.setText)
+    line_edit.textEdited.connect(completador.actualizar)
+    return completador
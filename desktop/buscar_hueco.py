@@ -4,18 +4,31 @@ from PyQt5.QtWidgets import QVBoxLayout, QWidget, QLabel, QLineEdit, QPushButton
 from PyQt5.QtCore import Qt
 
 import pandas as pd
+import numpy as np
 import re
 from datetime import time, timedelta, datetime
 from modulos.utils import (
     cargar_configuracion, obtener_lat_lon_de_direccion, calcular_distancia_haversine, 
     formatear_codigo_postal, obtener_cp_de_direccion, cargar_horarios_tecnicos,
-    obtener_distancia_real
+    obtener_matriz_distancias_reales, limpiar_direccion, obtener_geocodificador, nombres_adt_de_rutas
 )
 from modulos.logger_config import logger
 from modulos.festivos import festivos, ciudades_a_comunidades
-from modulos.api_manager import APIManager
-
-api_manager = APIManager()
+from modulos.api_manager import obtener_api_manager
+from modulos.matriz_tecnicos import MatrizTecnicos
+from modulos.fragmentos_geograficos import FragmentosGeograficos, ZONA_SIN_ASIGNAR
+from modulos.areas_servicio import AreasServicio, cargar_codigos_por_tecnico
+from modulos.autocompletado import configurar_autocompletado
+from modulos.nucleos import huecos_entre_visitas, coste_insercion
+from modulos.presupuesto import Presupuesto
+from modulos.hitos import Hitos
+from modulos.isocronas import Isocronas
+
+api_manager = obtener_api_manager()
+
+PLAZO_BUSQUEDA_SEGUNDOS = 3  # Tras el plazo se muestran resultados parciales con distancias estimadas
+MAX_ORIGENES_CONSULTA = 25  # Orígenes por consulta de matriz a la API; los que sobrevivan a la poda van en varias
+ALCANCE_HUECO_MINUTOS = 60  # Técnicos que no llegan desde casa en este tiempo se evalúan los últimos
 
 class BuscarHueco(QWidget):
     """
@@ -25,12 +38,14 @@ class BuscarHueco(QWidget):
     en los horarios de los técnicos más cercanos.
     """
         
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, precalentador=None):
         """
         Inicializa la clase BuscarHueco.
 
         Args:
             parent (QWidget, optional): Widget padre. Por defecto, None.
+            precalentador (Precalentador, optional): Tarea que calienta la caché de distancias con
+                los datos del ExportBase una vez cargados.
         """
         super().__init__(parent)
         self.init_ui()
@@ -56,6 +71,18 @@ class BuscarHueco(QWidget):
         self.cp_tecnicos_adt['Codigo Postal'] = self.cp_tecnicos_adt['Codigo Postal'].apply(formatear_codigo_postal)
         self.cp_tecnicos_adt['Nombre Enrutador'] = self.cp_tecnicos_adt['Nombre Enrutador'].apply(limpiar_texto)
 
+        # Matriz casa del técnico x código postal, memory-mapped y reconstruida solo si cambia el ADT o el listado de CP
+        self.matriz_tecnicos = MatrizTecnicos.cargar_o_construir(
+            self.cp_tecnicos_adt, self.df_codigos_postales, configuracion['archivo_cp_tecnicos_adt'],
+            configuracion['archivo_codigos_postales'])
+
+        # Códigos postales alcanzables desde cada casa en 15/30/45/60 minutos
+        try:
+            self.isocronas = Isocronas.cargar_o_construir(self.matriz_tecnicos, self.df_codigos_postales)
+        except Exception as e:
+            logger.error(f"[ERROR] No se pudieron abrir las isócronas de los técnicos: {e}")
+            self.isocronas = None
+
         self.horarios_tecnicos = cargar_horarios_tecnicos()
 
         # Continuación de la inicialización
@@ -69,6 +96,27 @@ class BuscarHueco(QWidget):
         
         self.rutas_tecnicos['Evt_Label'] = self.rutas_tecnicos['Evt_Label'].astype(str)
 
+        # Nombre del técnico en el archivo ADT (áreas de servicio, isócronas y zonas van por `Nombre Enrutador`)
+        self.rutas_tecnicos['Nombre_ADT'] = nombres_adt_de_rutas(self.rutas_tecnicos['Res_Label'],
+                                                                 self.cp_tecnicos_adt['Nombre Enrutador'])
+
+        # Rutas particionadas por la zona del técnico, para no recorrer toda la flota en cada búsqueda
+        self.fragmentos = self.construir_fragmentos_rutas(self.rutas_tecnicos)
+
+        # Polígono de área de servicio por técnico, para empezar la búsqueda por quien cubre la zona
+        try:
+            codigos_por_tecnico = cargar_codigos_por_tecnico(self.cp_tecnicos_adt, self.rutas_tecnicos)
+            self.areas_servicio = AreasServicio.construir(codigos_por_tecnico, self.df_codigos_postales)
+        except Exception as e:
+            logger.error(f"[ERROR] No se pudo crear el índice de áreas de servicio: {e}")
+            self.areas_servicio = None
+
+        # Cotas de distancia por carretera entre códigos postales, para descartar huecos sin llamar a la API
+        try:
+            self.hitos = Hitos.cargar_o_construir(self.df_codigos_postales, configuracion['archivo_codigos_postales'])
+        except Exception as e:
+            logger.error(f"[ERROR] No se pudo abrir la tabla de hitos: {e}")
+            self.hitos = None
         
         self.todos_eventos = pd.read_excel(configuracion['archivo_excel'])
         self.todos_eventos = self.todos_eventos[self.todos_eventos['Evt_Type'].isin(['Tarea', 'Indisponibilidad'])]
@@ -79,6 +127,43 @@ class BuscarHueco(QWidget):
             if columna not in self.rutas_tecnicos.columns:
                 logger.debug(f"[DEBUG] La columna {columna} no está presente en rutas_tecnicos")
 
+        if precalentador is not None:
+            precalentador.programar(self.rutas_tecnicos, self.cp_tecnicos_adt, self.df_codigos_postales,
+                                    self.hitos, self.isocronas)
+
+    def construir_fragmentos_rutas(self, rutas_tecnicos):
+        """
+        Particiona las rutas por la `Zona` del técnico (archivo ADT) e indexa cada visita
+        por las coordenadas del código postal de su dirección.
+
+        Args:
+            rutas_tecnicos (pd.DataFrame): Visitas de los técnicos con las columnas `Direcciones` y `Nombre_ADT`.
+        Returns:
+            FragmentosGeograficos: Rutas agrupadas por zona.
+        """
+        rutas = rutas_tecnicos.copy()
+        coords_cp = self.df_codigos_postales.drop_duplicates(subset='codigo_postal', keep='first').set_index('codigo_postal')
+        cp_visita = rutas['Direcciones'].map(limpiar_direccion)
+        rutas['Latitud_visita'] = cp_visita.map(coords_cp['Latitud'])
+        rutas['Longitud_visita'] = cp_visita.map(coords_cp['Longitud'])
+
+        # Con callejero, indexar las visitas con las mismas coordenadas que dará `obtener_lat_lon_de_direccion`
+        geocodificador = obtener_geocodificador()
+        if geocodificador is not None:
+            direcciones = rutas['Direcciones'].dropna().astype(str)
+            finas = {d: geocodificador.geocodificar(d, limpiar_direccion(d)) for d in direcciones.unique()}
+            lat_fina = direcciones.map(lambda d: finas[d][0]).astype(float)
+            lon_fina = direcciones.map(lambda d: finas[d][1]).astype(float)
+            rutas['Latitud_visita'] = lat_fina.combine_first(rutas['Latitud_visita'])
+            rutas['Longitud_visita'] = lon_fina.combine_first(rutas['Longitud_visita'])
+
+        zonas = self.cp_tecnicos_adt.drop_duplicates(subset='Nombre Enrutador', keep='first').set_index('Nombre Enrutador')['Zona']
+        rutas['Zona_tecnico'] = rutas['Nombre_ADT'].map(zonas).fillna(ZONA_SIN_ASIGNAR)
+
+        return FragmentosGeograficos.construir(rutas, 'Zona_tecnico',
+                                               columnas_coordenadas=('Latitud_visita', 'Longitud_visita'),
+                                               columna_tiempo='FechaHoraInicio')
+
     def init_ui(self):
         """
         Inicializa la interfaz de usuario para la funcionalidad de búsqueda de huecos.
@@ -116,6 +201,7 @@ class BuscarHueco(QWidget):
         self.codigo_postal_input.setPlaceholderText("Introduce código postal")
         self.codigo_postal_input.setFixedSize(400, 40)
         self.codigo_postal_input.setStyleSheet("font-size: 16px; border-radius: 5px; padding: 5px; border: 2px solid #046d94;")
+        self.completador_cp = configurar_autocompletado(self.codigo_postal_input)
 
         self.duracion_input = QLineEdit(self)
         self.duracion_input.setPlaceholderText("Duración estimada en horas (ej. 1.5)")
@@ -257,14 +343,70 @@ class BuscarHueco(QWidget):
             layout.addWidget(label_error)
             return
 
+        # Se anota el código postal buscado: el precalentamiento da prioridad a los más buscados
+        logger.info(f"Búsqueda de hueco en el código postal {cp_usuario}")
+
         # Buscar y mostrar huecos
-        opciones_huecos = self.buscar_huecos_disponibles(self.rutas_tecnicos, duracion_nueva_visita, lat_nueva_visita, lon_nueva_visita)
+        # Solo las zonas con alguna visita dentro del radio de `filtrar_y_ordenar_por_proximidad`
+        # pueden aportar huecos; el resto se descartaría igualmente al filtrar por distancia
+        if len(self.fragmentos.fragmentos):
+            rutas_cercanas = self.fragmentos.datos_en_radio(lat_nueva_visita, lon_nueva_visita, 200).sort_index()
+        else:
+            rutas_cercanas = self.rutas_tecnicos
+
+        # Empezar por los técnicos cuya área de servicio cubre la visita; si ninguno tiene hueco, el resto
+        grupos_tecnicos = [rutas_cercanas]
+        if self.areas_servicio is not None:
+            tecnicos_cubren = self.areas_servicio.tecnicos_que_cubren(lat_nueva_visita, lon_nueva_visita)
+            cubren = rutas_cercanas['Nombre_ADT'].isin(tecnicos_cubren)
+            if cubren.any():
+                logger.debug(f"[DEBUG] {len(tecnicos_cubren)} técnicos cubren el código postal {cp_usuario}")
+                grupos_tecnicos = [rutas_cercanas[cubren], rutas_cercanas[~cubren]]
+
+        # Quien seguro no llega desde casa en ALCANCE_HUECO_MINUTOS (isócronas ya construidas) se deja
+        # para el final: solo se evalúa si nadie más tiene hueco, como el radio de 200 km de antes
+        if self.isocronas is not None:
+            fuera_de_alcance = self.isocronas.tecnicos_fuera_de_alcance(cp_usuario, ALCANCE_HUECO_MINUTOS)
+            if fuera_de_alcance:
+                logger.debug(f"[DEBUG] {len(fuera_de_alcance)} técnicos no llegan en {ALCANCE_HUECO_MINUTOS} minutos a {cp_usuario}")
+                lejos = rutas_cercanas['Nombre_ADT'].isin(fuera_de_alcance)
+                grupos_tecnicos = [grupo[~lejos.loc[grupo.index]] for grupo in grupos_tecnicos] + [rutas_cercanas[lejos]]
+
+        # Plazo total de la búsqueda: la mitad para los huecos y el resto para las distancias reales
+        presupuesto = Presupuesto(PLAZO_BUSQUEDA_SEGUNDOS, "Buscar Hueco")
+        with presupuesto.etapa("huecos", 0.5) as plazo_huecos:
+            opciones_huecos = []
+            # Con el plazo agotado quedan técnicos sin evaluar, haya o no huecos
+            busqueda_parcial = False
+            for rutas_grupo in grupos_tecnicos:
+                if rutas_grupo.empty:
+                    continue
+                if plazo_huecos.agotado():
+                    busqueda_parcial = True
+                    break
+                opciones_huecos = self.buscar_huecos_disponibles(rutas_grupo, duracion_nueva_visita, lat_nueva_visita,
+                                                                 lon_nueva_visita, cp_usuario, plazo_huecos)
+                busqueda_parcial = self.huecos_incompletos
+                if opciones_huecos or busqueda_parcial:
+                    break
+
+        if busqueda_parcial:
+            label_incompleta = QLabel("⚠️ Se agotó el tiempo de búsqueda: no se han evaluado todos los técnicos.")
+            label_incompleta.setStyleSheet("color: #888;")
+            layout.addWidget(label_incompleta)
         if not opciones_huecos:
             label_no_result = QLabel("No se encontraron huecos disponibles.")
             layout.addWidget(label_no_result)
             return
         
-        opciones_filtradas = self.filtrar_y_ordenar_por_proximidad(opciones_huecos, lat_nueva_visita, lon_nueva_visita, self.df_codigos_postales)
+        with presupuesto.etapa("proximidad") as plazo_proximidad:
+            opciones_filtradas = self.filtrar_y_ordenar_por_proximidad(opciones_huecos, lat_nueva_visita, lon_nueva_visita,
+                                                                       self.df_codigos_postales, presupuesto=plazo_proximidad,
+                                                                       cp_nueva_visita=cp_usuario)
+        if any(opcion.get('estimado') for opcion in opciones_filtradas[:5]):
+            label_parcial = QLabel("⚠️ Algunas distancias no han llegado a tiempo y se muestran estimadas.")
+            label_parcial.setStyleSheet("color: #888;")
+            layout.addWidget(label_parcial)
 
         # Limitar a mostrar solo los primeros cinco huecos disponibles
         if not opciones_filtradas:
@@ -273,6 +415,7 @@ class BuscarHueco(QWidget):
         else:
             for opcion in opciones_filtradas[:5]:  # Solo toma los primeros cinco
                 fecha_visita = opcion['hora_fin_anterior'].strftime('%d/%m/%Y')
+                marca_estimado = " <span style='color: #888;'>(estimado)</span>" if opcion.get('estimado') else ""
                 texto_opcion = (
                     f"<div style='border-radius: 10px; background-color: #f8f9fa; padding: 15px; margin: 10px 0; "
                     f"border: 1px solid #ccc; box-shadow: 2px 2px 10px rgba(0,0,0,0.1); font-size: 14px;'>"
@@ -280,7 +423,7 @@ class BuscarHueco(QWidget):
                     f"<h3 style='color: #046d94; margin-bottom: 5px;'>📅 {fecha_visita}</h3>"
                     f"<p><b style='color: #046d94;'>&nbsp;&nbsp;&nbsp;&nbsp;👨‍🔧 Técnico:</b> {opcion['tecnico']} <span style='color: #888;'>({opcion['direccion_siguiente']})</span></p>"
                     f"<p><b style='color: #046d94;'>&nbsp;&nbsp;&nbsp;&nbsp;📍 Distancia:</b> {opcion['distancia']:.2f} km</p>"
-                    f"<p><b style='color: #046d94;'>&nbsp;&nbsp;&nbsp;&nbsp;⏱️ Tiempo estimado:</b> {opcion.get('tiempo_estimado', 'N/A')} minutos</p>"
+                    f"<p><b style='color: #046d94;'>&nbsp;&nbsp;&nbsp;&nbsp;⏱️ Tiempo estimado:</b> {opcion.get('tiempo_estimado', 'N/A')} minutos{marca_estimado}</p>"
 
                     f"<p><b style='color: #046d94;'>&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; Ubicación Anterior:</b> {opcion['direccion_anterior']}</p>"
                     f"<p><b style='color: #046d94;'>&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; Ubicación Siguiente:</b> {opcion['direccion_siguiente']}</p>"
@@ -337,7 +480,7 @@ class BuscarHueco(QWidget):
             return codigo_postal
         return None
 
-    def buscar_huecos_disponibles(self, rutas_tecnicos, duracion_nueva_visita, lat_nueva_visita, lon_nueva_visita):
+    def buscar_huecos_disponibles(self, rutas_tecnicos, duracion_nueva_visita, lat_nueva_visita, lon_nueva_visita, cp_nueva_visita=None, presupuesto=None):
         """
         Busca huecos disponibles en las rutas de técnicos considerando su horario de jornada y el fin de jornada a las 18:00 por defecto.
 
@@ -346,11 +489,15 @@ class BuscarHueco(QWidget):
             duracion_nueva_visita (float): Duración estimada de la nueva visita.
             lat_nueva_visita (float): Latitud de la nueva visita.
             lon_nueva_visita (float): Longitud de la nueva visita.
+            cp_nueva_visita (str, optional): Código postal de la nueva visita, para leer la matriz de técnicos.
+            presupuesto (Presupuesto, optional): Plazo de la etapa; al agotarse se devuelven los huecos
+                de los técnicos evaluados hasta entonces y `self.huecos_incompletos` queda a True.
 
         Returns:
             list: Lista de huecos disponibles con detalles como técnico, distancia y horarios.
         """
         opciones_huecos = []
+        self.huecos_incompletos = False
         duracion_con_desplazamiento = duracion_nueva_visita + 1  # Añadir 60 min adicionales para el desplazamiento
 
         # Filtrar técnicos excluyendo aquellos en estado "Pendiente RECUR"
@@ -373,29 +520,51 @@ class BuscarHueco(QWidget):
                 logger.error("ERROR: No se puede calcular 'FechaHoraFin' porque faltan columnas necesarias.")
                 return []
 
-        # Procesar huecos entre citas
-        for tecnico, visitas in rutas_tecnicos.groupby('Res_Label'):
+        # Distancias desde la casa de cada técnico a la nueva visita en una sola lectura de la matriz
+        distancias_casa = self.matriz_tecnicos.distancias_por_tecnico(cp_nueva_visita, lat_nueva_visita, lon_nueva_visita)
+
+        # Procesar huecos entre citas, de la casa más cercana a la más lejana: si se agota el plazo,
+        # los que se quedan sin evaluar son los más alejados (los que no están en la matriz, al final)
+        por_tecnico = sorted(rutas_tecnicos.groupby('Res_Label'),
+                             key=lambda grupo: np.nan_to_num(float(distancias_casa.get(grupo[0], np.nan)), nan=np.inf))
+        for tecnico, visitas in por_tecnico:
+            if presupuesto is not None and presupuesto.agotado():
+                logger.warning(f"{presupuesto.nombre}: plazo agotado; se devuelven los huecos de los técnicos "
+                               f"evaluados ({len(opciones_huecos)})")
+                self.huecos_incompletos = True
+                break
             print(f"🔍 Evaluando técnico: {tecnico}, tiene {len(visitas)} visitas en fechas: {visitas['FechaHoraInicio'].dt.strftime('%Y-%m-%d').unique()}")
 
-            # Obtener código postal del técnico
-            codigo_postal_tecnico = self.obtener_cp_predeterminado_tecnico(tecnico)
+            distancia_hasta_nueva_visita = distancias_casa.get(tecnico, np.nan)
 
-            # Si no tiene código postal predeterminado, intentamos con su última visita
-            if not codigo_postal_tecnico and not visitas.empty:
-                codigo_postal_tecnico = visitas.iloc[-1].get('Evt_PROVINCIA', None)
+            # Técnicos fuera de la matriz: se resuelve su ubicación como antes
+            if pd.isna(distancia_hasta_nueva_visita):
+                # Obtener código postal del técnico
+                codigo_postal_tecnico = self.obtener_cp_predeterminado_tecnico(tecnico)
 
-            # Si sigue sin código postal, descartar este técnico
-            if not codigo_postal_tecnico:
-                print(f"⚠️ No se encontró código postal para el técnico {tecnico}. Omitiendo evaluación de hueco.")
-                continue
+                # Si no tiene código postal predeterminado, intentamos con su última visita
+                if not codigo_postal_tecnico and not visitas.empty:
+                    codigo_postal_tecnico = visitas.iloc[-1].get('Evt_PROVINCIA', None)
 
-            print(f"🔍 Comparando código postal técnico: {codigo_postal_tecnico} con la nueva visita: {formatear_codigo_postal(codigo_postal_tecnico)}")
+                # Si sigue sin código postal, descartar este técnico
+                if not codigo_postal_tecnico:
+                    print(f"⚠️ No se encontró código postal para el técnico {tecnico}. Omitiendo evaluación de hueco.")
+                    continue
 
-            # Obtener coordenadas del técnico
-            lat_tecnico, lon_tecnico = obtener_lat_lon_de_direccion(codigo_postal_tecnico, self.df_codigos_postales)
-            if lat_tecnico is None or lon_tecnico is None:
-                print(f"⚠️ No se encontraron coordenadas para el técnico {tecnico}. Omitiendo evaluación de hueco.")
-                continue
+                print(f"🔍 Comparando código postal técnico: {codigo_postal_tecnico} con la nueva visita: {formatear_codigo_postal(codigo_postal_tecnico)}")
+
+                # Obtener coordenadas del técnico
+                lat_tecnico, lon_tecnico = obtener_lat_lon_de_direccion(codigo_postal_tecnico, self.df_codigos_postales)
+                if lat_tecnico is None or lon_tecnico is None:
+                    print(f"⚠️ No se encontraron coordenadas para el técnico {tecnico}. Omitiendo evaluación de hueco.")
+                    continue
+
+                distancia_hasta_nueva_visita = calcular_distancia_haversine(lat_tecnico, lon_tecnico, lat_nueva_visita, lon_nueva_visita)
+
+            # Horas de viaje optimistas (p10) desde casa, con el desvío y la velocidad aprendidos de la caché: el prefiltro
+            # no debe descartar huecos que quizá caben; sin calibrar es la línea recta a 60 km/h de siempre
+            tiempo_hasta_nueva_visita = float(api_manager.estimador.horas_desde_recta(
+                distancia_hasta_nueva_visita, lat_nueva_visita, lon_nueva_visita))
 
             # Obtener horario del técnico desde el archivo horarios_tecnicos
             horario_tecnico = self.horarios_tecnicos[self.horarios_tecnicos['Nombre_Tecnico'].str.contains(tecnico, case=False, na=False, regex=False)]
@@ -415,15 +584,17 @@ class BuscarHueco(QWidget):
             # Ordenar visitas por fecha
             visitas = visitas.sort_values('FechaHoraInicio').reset_index(drop=True)
 
-            # Revisar huecos entre citas
-            for i in range(len(visitas) - 1):
+            # Huecos entre citas consecutivas de todo el técnico en una sola llamada al núcleo
+            huecos, mismo_dia = huecos_entre_visitas(visitas['FechaHoraInicio'], visitas['FechaHoraFin'])
+
+            # Primera pasada: huecos válidos por horario y coordenadas de la visita siguiente
+            candidatos = []
+            for i in np.flatnonzero((huecos > 0) & mismo_dia):
                 hora_fin_actual = visitas.loc[i, 'FechaHoraFin']
                 hora_inicio_siguiente = visitas.loc[i + 1, 'FechaHoraInicio']
-                hueco_horas = (hora_inicio_siguiente - hora_fin_actual).total_seconds() / 3600
+                hueco_horas = huecos[i]
 
-                if (hueco_horas > 0 and 
-                    hora_fin_actual.date() == hora_inicio_siguiente.date() and
-                    inicio_jornada <= hora_fin_actual.time() <= fin_jornada and
+                if (inicio_jornada <= hora_fin_actual.time() <= fin_jornada and
                     inicio_jornada <= hora_inicio_siguiente.time() <= fin_jornada):
 
                     if hora_fin_actual.time() < fin_comida and hora_inicio_siguiente.time() > inicio_comida:
@@ -432,30 +603,44 @@ class BuscarHueco(QWidget):
                         if hueco_horas < duracion_con_desplazamiento:
                             continue
 
-                    distancia_hasta_nueva_visita = calcular_distancia_haversine(lat_tecnico, lon_tecnico, lat_nueva_visita, lon_nueva_visita)
-                    tiempo_hasta_nueva_visita = distancia_hasta_nueva_visita / 60
-
                     direccion_siguiente = visitas.loc[i + 1, 'Direcciones']
                     lat_siguiente, lon_siguiente = obtener_lat_lon_de_direccion(direccion_siguiente, self.df_codigos_postales)
                     if lat_siguiente is None or lon_siguiente is None:
                         continue
 
-                    distancia_hasta_siguiente_visita = calcular_distancia_haversine(lat_nueva_visita, lon_nueva_visita, lat_siguiente, lon_siguiente)
-                    tiempo_hasta_siguiente_visita = distancia_hasta_siguiente_visita / 60
+                    lat_anterior, lon_anterior = obtener_lat_lon_de_direccion(visitas.loc[i, 'Direcciones'], self.df_codigos_postales)
+                    candidatos.append((i, hueco_horas, hora_fin_actual, hora_inicio_siguiente, lat_siguiente, lon_siguiente,
+                                       np.nan if lat_anterior is None else lat_anterior,
+                                       np.nan if lon_anterior is None else lon_anterior))
+
+            # Coste de insertar la nueva visita en todos los huecos a la vez: ida desde la visita
+            # anterior (desde casa si no tiene coordenadas) y vuelta hasta la siguiente
+            if candidatos:
+                ida, vuelta, _ = coste_insercion([c[6] for c in candidatos], [c[7] for c in candidatos],
+                                                 [c[4] for c in candidatos], [c[5] for c in candidatos],
+                                                 lat_nueva_visita, lon_nueva_visita)
+                tiempos_ida = api_manager.estimador.horas_desde_recta(ida, lat_nueva_visita, lon_nueva_visita)
+                tiempos_ida = np.where(np.isnan(ida), tiempo_hasta_nueva_visita, tiempos_ida)
+                tiempos_siguientes = api_manager.estimador.horas_desde_recta(vuelta, lat_nueva_visita, lon_nueva_visita)
+            else:
+                tiempos_ida, tiempos_siguientes = [], []
+
+            for candidato, tiempo_desde_anterior, tiempo_hasta_siguiente_visita in zip(candidatos, tiempos_ida, tiempos_siguientes):
+                i, hueco_horas, hora_fin_actual, hora_inicio_siguiente = candidato[:4]
 
-                    tiempo_total_necesario = tiempo_hasta_nueva_visita + duracion_nueva_visita + tiempo_hasta_siguiente_visita
+                tiempo_total_necesario = tiempo_desde_anterior + duracion_nueva_visita + tiempo_hasta_siguiente_visita
 
-                    if hueco_horas >= tiempo_total_necesario:
-                        opciones_huecos.append({
-                            'tecnico': tecnico,
-                            'direccion_anterior': visitas.loc[i, 'Direcciones'],
-                            'direccion_siguiente': visitas.loc[i + 1, 'Direcciones'],
-                            'hora_fin_anterior': hora_fin_actual,
-                            'hora_inicio_siguiente': hora_inicio_siguiente,
-                            'fecha': hora_fin_actual.strftime('%d/%m/%Y'),
-                            'distancia': distancia_hasta_nueva_visita,
-                            'Evt_ORDENSERVICIO': visitas.loc[i, 'Evt_ORDENSERVICIO']
-                        })
+                if hueco_horas >= tiempo_total_necesario:
+                    opciones_huecos.append({
+                        'tecnico': tecnico,
+                        'direccion_anterior': visitas.loc[i, 'Direcciones'],
+                        'direccion_siguiente': visitas.loc[i + 1, 'Direcciones'],
+                        'hora_fin_anterior': hora_fin_actual,
+                        'hora_inicio_siguiente': hora_inicio_siguiente,
+                        'fecha': hora_fin_actual.strftime('%d/%m/%Y'),
+                        'distancia': distancia_hasta_nueva_visita,
+                        'Evt_ORDENSERVICIO': visitas.loc[i, 'Evt_ORDENSERVICIO']
+                    })
 
 
             # Revisar hueco al final de la jornada
@@ -481,7 +666,7 @@ class BuscarHueco(QWidget):
         return opciones_huecos
 
 
-    def filtrar_y_ordenar_por_proximidad(self, opciones_huecos, lat_nueva_visita, lon_nueva_visita, df_codigos_postales, max_distancia_km=200, top_n=5):
+    def filtrar_y_ordenar_por_proximidad(self, opciones_huecos, lat_nueva_visita, lon_nueva_visita, df_codigos_postales, max_distancia_km=200, top_n=5, presupuesto=None, cp_nueva_visita=None):
         """
     Filtra y ordena opciones de huecos disponibles según la proximidad a una nueva visita.
     Args:
@@ -490,7 +675,12 @@ class BuscarHueco(QWidget):
         lon_nueva_visita (float): Longitud de la nueva visita.
         df_codigos_postales (pd.DataFrame): DataFrame con códigos postales y coordenadas.
         max_distancia_km (float, optional): Distancia máxima en kilómetros para filtrar opciones. Por defecto, 200.
-        top_n (int, optional): Número máximo de opciones a devolver. Por defecto, 5.
+        top_n (int, optional): Número de mejores opciones buscadas; con la tabla de hitos se devuelven todas
+            las que pueden estar entre ellas. Por defecto, 5.
+        presupuesto (Presupuesto, optional): Plazo para la consulta a la API; las opciones sin
+            respuesta a tiempo se ordenan por la distancia estimada y se marcan con 'estimado'.
+        cp_nueva_visita (str, optional): Código postal de la nueva visita, para acotar las distancias
+            por carretera con la tabla de hitos.
 
     Returns:
         list: Lista de opciones filtradas y ordenadas según la distancia calculada.
@@ -510,21 +700,57 @@ class BuscarHueco(QWidget):
                     opcion['distancia'] = distancia_aproximada
                     opciones_filtradas.append(opcion)
 
-        # Ordenar y seleccionar las cinco mejores opciones según la distancia calculada
-        opciones_filtradas = sorted(opciones_filtradas, key=lambda x: x['distancia'])[:top_n]
+        # Con la tabla de hitos se descartan, sin llamar a la API, las opciones cuya distancia por
+        # carretera no puede estar entre las `top_n` mejores; sin datos, las `top_n` más cercanas en línea recta
+        seleccion = None
+        if self.hitos is not None and cp_nueva_visita:
+            codigos_anteriores = [limpiar_direccion(opcion['direccion_anterior']) for opcion in opciones_filtradas]
+            seleccion = self.hitos.podar(codigos_anteriores, cp_nueva_visita, top_n)
+        if seleccion is not None:
+            logger.debug(f"[DEBUG] Hitos: {len(opciones_filtradas) - len(seleccion)} de {len(opciones_filtradas)} "
+                         f"opciones descartadas sin consultar la API")
+            opciones_filtradas = [opciones_filtradas[k] for k in seleccion]
+        else:
+            opciones_filtradas = sorted(opciones_filtradas, key=lambda x: x['distancia'])[:top_n]
 
-        # Llamar a la API para obtener la distancia real y tiempo de viaje de las cinco mejores opciones
+        # Consultas de matriz a la API para la distancia real y el tiempo de viaje de las opciones que
+        # quedan, por tandas de `MAX_ORIGENES_CONSULTA` en orden de cota inferior
+        origenes = []
+        opciones_con_origen = []
         for opcion in opciones_filtradas:
             lat_anterior, lon_anterior = obtener_lat_lon_de_direccion(opcion['direccion_anterior'], df_codigos_postales)
             if lat_anterior and lon_anterior:
-                # Llamada a la API para obtener la distancia y duración precisas
-                distancia_real, duracion_real = obtener_distancia_real(lat_anterior, lon_anterior, lat_nueva_visita, lon_nueva_visita)
-                if distancia_real is not None and duracion_real is not None:
-                    opcion['distancia_real'] = distancia_real
-                    opcion['tiempo_estimado'] = round(duracion_real)
+                origenes.append((lat_anterior, lon_anterior))
+                opciones_con_origen.append(opcion)
 
-        # Reordenar según la distancia real
-        opciones_filtradas = sorted(opciones_filtradas, key=lambda x: x.get('distancia_real', x['distancia']))
+        if origenes:
+            for inicio in range(0, len(origenes), MAX_ORIGENES_CONSULTA):
+                if presupuesto is not None and presupuesto.agotado():
+                    break
+                tanda = slice(inicio, inicio + MAX_ORIGENES_CONSULTA)
+                distancias_reales, duraciones_reales = obtener_matriz_distancias_reales(origenes[tanda], [(lat_nueva_visita, lon_nueva_visita)], presupuesto)
+                if distancias_reales is None:
+                    break
+                for opcion, distancia_real, duracion_real in zip(opciones_con_origen[tanda], distancias_reales[:, 0], duraciones_reales[:, 0]):
+                    if not np.isnan(distancia_real) and not np.isnan(duracion_real):
+                        opcion['distancia_real'] = float(distancia_real)
+                        opcion['tiempo_estimado'] = round(duracion_real)
+
+            # Sin respuesta de la API (o fuera de plazo): distancia y tiempo estimados sin conexión, con su horquilla
+            sin_ruta = [k for k, opcion in enumerate(opciones_con_origen) if 'tiempo_estimado' not in opcion]
+            if sin_ruta:
+                lat_origenes, lon_origenes = np.array([origenes[k] for k in sin_ruta], dtype=float).T
+                estimacion = api_manager.estimador.estimar(lat_origenes, lon_origenes, lat_nueva_visita, lon_nueva_visita)
+                for fila, k in enumerate(sin_ruta):
+                    opciones_con_origen[k]['estimado'] = True
+                    opciones_con_origen[k]['distancia_estimada'] = float(estimacion['distancia'][fila])
+                    opciones_con_origen[k]['tiempo_estimado'] = (
+                        f"~{round(estimacion['duracion'][fila])} "
+                        f"({round(estimacion['duracion_p10'][fila])}-{round(estimacion['duracion_p90'][fila])})"
+                    )
+
+        # Reordenar según la distancia real (o la estimada por carretera si no la hay)
+        opciones_filtradas = sorted(opciones_filtradas, key=lambda x: x.get('distancia_real', x.get('distancia_estimada', x['distancia'])))
 
         return opciones_filtradas
 
@@ -551,35 +777,35 @@ class BuscarHueco(QWidget):
         lon = fila_cp.iloc[0]['Longitud']
         return lat, lon
 
-    def encontrar_cinco_tecnicos_mas_cercanos_dia_libre(self, lat_nueva_visita, lon_nueva_visita):
+    def encontrar_cinco_tecnicos_mas_cercanos_dia_libre(self, lat_nueva_visita, lon_nueva_visita, cp_nueva_visita=None):
         """
         Encuentra los cinco técnicos más cercanos con al menos cinco días libres próximos.
         Args:
             lat_nueva_visita (float): Latitud de la nueva visita.
             lon_nueva_visita (float): Longitud de la nueva visita.
+            cp_nueva_visita (str, optional): Código postal de la nueva visita, para leer la matriz de técnicos.
 
         Returns:
             list: Lista con los cinco técnicos más cercanos, sus cinco días libres y la distancia calculada.
         """
         tecnicos_disponibles = []
+        num_tecnicos = 5
 
-        for tecnico in self.cp_tecnicos_adt['Nombre Enrutador'].unique():
-            cp_predeterminado = self.obtener_cp_predeterminado_tecnico(tecnico)
-            if not cp_predeterminado:
-                continue
+        distancias = self.matriz_tecnicos.distancias_desde(cp_nueva_visita, lat_nueva_visita, lon_nueva_visita)
 
-            lat_predeterminado, lon_predeterminado = obtener_lat_lon_de_direccion(cp_predeterminado, self.df_codigos_postales)
-            if lat_predeterminado is None or lon_predeterminado is None:
-                continue
+        # Ordenar primero por distancia (descartando técnicos sin coordenadas de casa) y calcular
+        # los días libres solo hasta reunir cinco técnicos con disponibilidad
+        candidatos = np.flatnonzero(~np.isnan(distancias))
+        candidatos = candidatos[np.argsort(distancias[candidatos], kind='stable')]
 
-            distancia = calcular_distancia_haversine(lat_nueva_visita, lon_nueva_visita, lat_predeterminado, lon_predeterminado)
+        for indice in candidatos:
+            tecnico = self.matriz_tecnicos.tecnicos[indice]
             dias_libres_mas_cercanos = self.obtener_dias_libres(tecnico, num_dias=5)
 
             if dias_libres_mas_cercanos:
-                tecnicos_disponibles.append((tecnico, dias_libres_mas_cercanos, distancia))
-
-        # Ordenar técnicos por distancia y devolver los primeros cinco
-        tecnicos_disponibles = sorted(tecnicos_disponibles, key=lambda x: x[2])[:5]
+                tecnicos_disponibles.append((tecnico, dias_libres_mas_cercanos, float(distancias[indice])))
+                if len(tecnicos_disponibles) >= num_tecnicos:
+                    break
 
         return tecnicos_disponibles
 
@@ -603,7 +829,7 @@ class BuscarHueco(QWidget):
             layout.addWidget(QLabel("Error: No se encontraron coordenadas para la dirección proporcionada."))
             return
 
-        tecnicos_mas_cercanos = self.encontrar_cinco_tecnicos_mas_cercanos_dia_libre(lat_nueva_visita, lon_nueva_visita)
+        tecnicos_mas_cercanos = self.encontrar_cinco_tecnicos_mas_cercanos_dia_libre(lat_nueva_visita, lon_nueva_visita, cp_usuario)
 
         if tecnicos_mas_cercanos:
             for tecnico, dias_libres, distancia_a_cp in tecnicos_mas_cercanos:
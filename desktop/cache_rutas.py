@@ -0,0 +1,183 @@
+# modulos/cache_rutas.py
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+from modulos.logger_config import logger, get_data_dir
+
+ARCHIVO_CACHE = "cache_rutas.sqlite"
+TTL_POR_DEFECTO_HORAS = 24 * 30
+MAX_ENTRADAS_POR_DEFECTO = 100_000
+DECIMALES_COORDENADAS = 4  # ~11 m, más fino que cualquier centroide de código postal
+HORAS_POR_FRANJA = 3
+
+
+def franja_horaria(momento=None):
+    """
+    Devuelve la franja horaria de un instante: tipo de día (laborable o fin de semana)
+    y bloque de `HORAS_POR_FRANJA` horas, p. ej. `L3` para un martes a las 10:00.
+
+    Args:
+        momento (datetime, optional): Instante de la consulta. Por defecto, ahora.
+    Returns:
+        str: Identificador de la franja.
+    """
+    momento = momento or datetime.now()
+    tipo_dia = "F" if momento.weekday() >= 5 else "L"
+    return f"{tipo_dia}{momento.hour // HORAS_POR_FRANJA}"
+
+
+class CacheRutas:
+    """
+    Caché persistente (SQLite en `get_data_dir()`) de distancias y duraciones por carretera.
+
+    La clave es el par origen/destino redondeado a `DECIMALES_COORDENADAS`, el perfil del
+    proveedor (p. ej. `driving-hgv`) y la franja horaria. Al consultar se prefiere la ruta de
+    la franja actual, pero si no la hay vale la de cualquier otra franja vigente: una ruta no
+    se vuelve a pedir solo porque haya cambiado la franja. Las entradas caducan a las
+    `ttl_horas` y, al superar `max_entradas`, se eliminan las usadas hace más tiempo (LRU).
+
+    La conexión se comparte entre hilos (`check_same_thread=False`) protegida por un lock.
+    """
+
+    def __init__(self, ruta=None, ttl_horas=TTL_POR_DEFECTO_HORAS, max_entradas=MAX_ENTRADAS_POR_DEFECTO):
+        self.ruta = ruta or os.path.join(get_data_dir(), ARCHIVO_CACHE)
+        self.ttl_segundos = ttl_horas * 3600
+        self.max_entradas = max_entradas
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+
+        self._conexion = sqlite3.connect(self.ruta, check_same_thread=False, timeout=5)
+        with self._lock, self._conexion:
+            self._conexion.execute("PRAGMA journal_mode=WAL")
+            self._conexion.execute("""
+                CREATE TABLE IF NOT EXISTS rutas (
+                    lat_origen INTEGER NOT NULL,
+                    lon_origen INTEGER NOT NULL,
+                    lat_destino INTEGER NOT NULL,
+                    lon_destino INTEGER NOT NULL,
+                    perfil TEXT NOT NULL,
+                    franja TEXT NOT NULL,
+                    distancia REAL NOT NULL,
+                    duracion REAL NOT NULL,
+                    proveedor TEXT,
+                    creado REAL NOT NULL,
+                    ultimo_uso REAL NOT NULL,
+                    PRIMARY KEY (lat_origen, lon_origen, lat_destino, lon_destino, perfil, franja)
+                )
+            """)
+            self._conexion.execute("CREATE INDEX IF NOT EXISTS idx_rutas_ultimo_uso ON rutas (ultimo_uso)")
+        self._entradas = self._contar()
+
+    @staticmethod
+    def _redondear(*coordenadas):
+        return tuple(int(round(float(c) * 10 ** DECIMALES_COORDENADAS)) for c in coordenadas)
+
+    def _contar(self):
+        with self._lock:
+            return self._conexion.execute("SELECT COUNT(*) FROM rutas").fetchone()[0]
+
+    def obtener(self, lat_origen, lon_origen, lat_destino, lon_destino, perfiles, momento=None):
+        """
+        Busca una ruta en la caché: la de la franja horaria de `momento` o, si no está, la
+        usada más recientemente de cualquier otra franja.
+
+        Args:
+            lat_origen, lon_origen, lat_destino, lon_destino (float): Coordenadas.
+            perfiles (str | list): Perfil o perfiles aceptables (p. ej. los de todos los proveedores).
+            momento (datetime, optional): Instante de la consulta, para preferir su franja horaria.
+        Returns:
+            tuple: `(distancia_km, duracion_min)` o None si no está o ha caducado.
+        """
+        perfiles = [perfiles] if isinstance(perfiles, str) else list(perfiles)
+        clave = self._redondear(lat_origen, lon_origen, lat_destino, lon_destino)
+        ahora = time.time()
+        marcadores = ",".join("?" * len(perfiles))
+
+        with self._lock, self._conexion:
+            fila = self._conexion.execute(
+                f"""SELECT rowid, distancia, duracion FROM rutas
+                    WHERE lat_origen = ? AND lon_origen = ? AND lat_destino = ? AND lon_destino = ?
+                      AND perfil IN ({marcadores}) AND creado >= ?
+                    ORDER BY franja = ? DESC, ultimo_uso DESC LIMIT 1""",
+                (*clave, *perfiles, ahora - self.ttl_segundos, franja_horaria(momento)),
+            ).fetchone()
+            if fila is None:
+                self.fallos += 1
+                return None
+            self._conexion.execute("UPDATE rutas SET ultimo_uso = ? WHERE rowid = ?", (ahora, fila[0]))
+            self.aciertos += 1
+            return fila[1], fila[2]
+
+    def guardar(self, lat_origen, lon_origen, lat_destino, lon_destino, perfil, distancia, duracion,
+                proveedor=None, momento=None):
+        """Guarda (o renueva) una ruta y aplica el límite de tamaño."""
+        clave = self._redondear(lat_origen, lon_origen, lat_destino, lon_destino)
+        ahora = time.time()
+        with self._lock, self._conexion:
+            self._conexion.execute(
+                """INSERT OR REPLACE INTO rutas
+                   (lat_origen, lon_origen, lat_destino, lon_destino, perfil, franja,
+                    distancia, duracion, proveedor, creado, ultimo_uso)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (*clave, perfil, franja_horaria(momento), float(distancia), float(duracion), proveedor, ahora, ahora),
+            )
+            self._entradas += 1
+            if self._entradas > self.max_entradas:
+                self._expulsar(ahora)
+
+    def _expulsar(self, ahora):
+        """Elimina las entradas caducadas y, si aún sobran, las menos usadas recientemente (con el lock tomado)."""
+        self._conexion.execute("DELETE FROM rutas WHERE creado < ?", (ahora - self.ttl_segundos,))
+        entradas = self._conexion.execute("SELECT COUNT(*) FROM rutas").fetchone()[0]
+        # Dejar un 10 % de margen para no expulsar en cada inserción
+        objetivo = int(self.max_entradas * 0.9)
+        if entradas > objetivo:
+            self._conexion.execute(
+                "DELETE FROM rutas WHERE rowid IN (SELECT rowid FROM rutas ORDER BY ultimo_uso ASC LIMIT ?)",
+                (entradas - objetivo,),
+            )
+            logger.debug(f"[DEBUG] Caché de rutas: expulsadas {entradas - objetivo} entradas por LRU")
+            entradas = objetivo
+        self._entradas = entradas
+
+    def muestras(self, limite=None):
+        """
+        Devuelve las rutas vigentes para calibrar estimaciones sin API.
+
+        Args:
+            limite (int, optional): Máximo de rutas, las usadas más recientemente.
+        Returns:
+            list: Filas `(lat_origen, lon_origen, lat_destino, lon_destino, distancia_km, duracion_min)`.
+        """
+        escala = 10 ** DECIMALES_COORDENADAS
+        with self._lock:
+            filas = self._conexion.execute(
+                """SELECT lat_origen, lon_origen, lat_destino, lon_destino, distancia, duracion FROM rutas
+                   WHERE creado >= ? ORDER BY ultimo_uso DESC LIMIT ?""",
+                (time.time() - self.ttl_segundos, -1 if limite is None else limite),
+            ).fetchall()
+        return [(lat_o / escala, lon_o / escala, lat_d / escala, lon_d / escala, distancia, duracion)
+                for lat_o, lon_o, lat_d, lon_d, distancia, duracion in filas]
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores de la caché.
+
+        Returns:
+            dict: `aciertos`, `fallos`, `tasa_aciertos` (0-1) y `entradas`.
+        """
+        consultas = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+            "entradas": self._entradas,
+        }
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
@@ -0,0 +1,204 @@
+# modulos/cuotas_api.py
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from modulos.logger_config import logger, get_data_dir
+
+ARCHIVO_USO = "uso_api.json"
+SEGUNDOS_ENTRE_GUARDADOS = 5
+ESPERA_MAXIMA_TOKEN = 2.0  # Segundos que una consulta puede esperar a que se libere un token
+
+
+class CuotaAgotada(Exception):
+    """La clave de API no admite más peticiones ahora (cuota diaria o ritmo)."""
+
+
+def dia_actual():
+    """Día en UTC, que es cuando reinician las cuotas diarias los proveedores."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def identificador_clave(nombre, clave):
+    """Identificador estable de una clave de API que no expone la clave en el archivo de uso."""
+    return f"{nombre}:{hashlib.sha1(clave.encode('utf-8')).hexdigest()[:10]}"
+
+
+class CuboTokens:
+    """
+    Cubo de tokens (token bucket): admite ráfagas de hasta `capacidad` peticiones y se
+    rellena a `por_segundo` tokens por segundo.
+    """
+
+    def __init__(self, capacidad, por_segundo):
+        self.capacidad = float(capacidad)
+        self.por_segundo = float(por_segundo)
+        self.tokens = float(capacidad)
+        self._ultimo = time.monotonic()
+
+    def _rellenar(self, ahora):
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self._ultimo) * self.por_segundo)
+        self._ultimo = ahora
+
+    def espera(self, ahora, coste=1):
+        """Segundos hasta que haya `coste` tokens (0 si ya los hay)."""
+        self._rellenar(ahora)
+        if self.tokens >= coste:
+            return 0.0
+        return (coste - self.tokens) / self.por_segundo
+
+    def consumir(self, coste=1):
+        self.tokens -= coste
+
+
+class UsoDiario:
+    """
+    Contadores de peticiones del día por clave de API, persistidos en `get_data_dir()`
+    para que la cuota diaria se respete entre reinicios de la aplicación.
+
+    Al guardar se suman al archivo las peticiones hechas desde el último guardado, en vez de
+    sobrescribirlo, así que otro proceso que use el mismo archivo no pierde sus cuentas.
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or os.path.join(get_data_dir(), ARCHIVO_USO)
+        self._lock = threading.Lock()
+        self._ultimo_guardado = 0.0
+        self.dia = dia_actual()
+        self.uso = {}
+        self._pendiente = {}  # Peticiones aún no sumadas al archivo
+        try:
+            self.uso = self._leer()
+        except Exception as e:
+            logger.error(f"[ERROR] No se pudo leer el uso de las APIs, se empieza de cero: {e}")
+
+    def _leer(self):
+        """Contadores guardados para `self.dia` (vacío si el archivo no existe o es de otro día)."""
+        if not os.path.exists(self.ruta):
+            return {}
+        with open(self.ruta, "r", encoding="utf-8") as archivo:
+            datos = json.load(archivo)
+        if datos.get("dia") != self.dia:
+            return {}
+        return {k: int(v) for k, v in datos.get("uso", {}).items()}
+
+    def _renovar_dia(self):
+        """Pone los contadores a cero al cambiar de día (con el lock tomado)."""
+        hoy = dia_actual()
+        if hoy != self.dia:
+            self.dia = hoy
+            self.uso = {}
+            self._pendiente = {}
+
+    def obtener(self, identificador):
+        with self._lock:
+            self._renovar_dia()
+            return self.uso.get(identificador, 0)
+
+    def reservar(self, identificador, limite=None, cantidad=1):
+        """
+        Suma `cantidad` al contador si no supera `limite` (comprobación y suma atómicas).
+
+        Returns:
+            bool: False si la cuota del día no alcanza.
+        """
+        with self._lock:
+            self._renovar_dia()
+            usado = self.uso.get(identificador, 0)
+            if limite is not None and usado + cantidad > limite:
+                return False
+            self.uso[identificador] = usado + cantidad
+            self._pendiente[identificador] = self._pendiente.get(identificador, 0) + cantidad
+            if time.monotonic() - self._ultimo_guardado >= SEGUNDOS_ENTRE_GUARDADOS:
+                self._guardar()
+            return True
+
+    def guardar(self):
+        with self._lock:
+            self._guardar()
+
+    def _guardar(self):
+        """
+        Suma las peticiones pendientes a las del archivo (que pueden incluir las de otro proceso),
+        lo escribe en un temporal y lo renombra, para no dejarlo a medias.
+        """
+        try:
+            try:
+                guardado = self._leer()
+            except (OSError, ValueError) as e:
+                logger.warning(f"No se pudo leer el uso guardado de las APIs, se reescribe: {e}")
+                guardado = {}
+            combinado = {}
+            for identificador in set(guardado) | set(self.uso):
+                combinado[identificador] = max(guardado.get(identificador, 0) + self._pendiente.get(identificador, 0),
+                                               self.uso.get(identificador, 0))
+
+            temporal = f"{self.ruta}.{os.getpid()}.tmp"
+            with open(temporal, "w", encoding="utf-8") as archivo:
+                json.dump({"dia": self.dia, "uso": combinado}, archivo, indent=2)
+            os.replace(temporal, self.ruta)
+            self.uso = combinado
+            self._pendiente = {}
+            self._ultimo_guardado = time.monotonic()
+        except Exception as e:
+            logger.error(f"[ERROR] No se pudo guardar el uso de las APIs: {e}")
+
+
+class LimitadorAPI:
+    """
+    Límite de ritmo y cuota de una clave de API, según las columnas opcionales `rps`, `rpm`
+    y `rpd` (peticiones por segundo, minuto y día) de `api_keys.csv`. Una columna vacía
+    significa sin límite.
+    """
+
+    def __init__(self, identificador, uso_diario, rps=None, rpm=None, rpd=None):
+        self.identificador = identificador
+        self.uso_diario = uso_diario
+        self.rpd = rpd
+        self.cubos = []
+        if rps:
+            self.cubos.append(CuboTokens(rps, rps))
+        if rpm:
+            self.cubos.append(CuboTokens(rpm, rpm / 60))
+        self._lock = threading.Lock()
+
+    def restante_diario(self):
+        """Peticiones que quedan hoy, o None si la clave no tiene cuota diaria."""
+        if not self.rpd:
+            return None
+        return max(self.rpd - self.uso_diario.obtener(self.identificador), 0)
+
+    def agotado(self):
+        return self.restante_diario() == 0
+
+    def espera_estimada(self, coste=1):
+        """Segundos hasta que la clave admita una petición, sin consumir nada."""
+        with self._lock:
+            ahora = time.monotonic()
+            return max((cubo.espera(ahora, coste) for cubo in self.cubos), default=0.0)
+
+    def adquirir(self, coste=1, espera_maxima=ESPERA_MAXIMA_TOKEN):
+        """
+        Reserva `coste` peticiones, esperando a que se rellenen los cubos si hace falta.
+
+        Returns:
+            bool: False si la cuota diaria está agotada o habría que esperar más de `espera_maxima`.
+        """
+        if self.agotado():
+            return False
+        limite = time.monotonic() + espera_maxima
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                espera = max((cubo.espera(ahora, coste) for cubo in self.cubos), default=0.0)
+                if espera == 0:
+                    for cubo in self.cubos:
+                        cubo.consumir(coste)
+                    break
+            if ahora + espera > limite:
+                return False
+            time.sleep(espera)
+        return self.uso_diario.reservar(self.identificador, self.rpd, coste)
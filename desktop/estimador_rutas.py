@@ -0,0 +1,148 @@
+# modulos/estimador_rutas.py
+import numpy as np
+
+from modulos.logger_config import logger
+from modulos.geo import distancia_haversine_np
+
+# Valores de partida cuando no hay muestras: la estimación sin cuota de APIManager (desvío de 1,3 a 60 km/h)
+# y, como extremo optimista (p10), la línea recta que usaba el prefiltro de huecos
+FACTOR_DESVIO_POR_DEFECTO = 1.3
+FACTOR_DESVIO_MINIMO = 1.0
+VELOCIDAD_POR_DEFECTO_KMH = 60
+# Bandas de distancia en línea recta (km): los trayectos cortos dan más rodeo y menos velocidad
+LIMITES_BANDAS_KM = np.array([5, 15, 40, 100, 250])
+TAMANO_CELDA_GRADOS = 1.0
+MIN_MUESTRAS = 5
+DISTANCIA_MINIMA_KM = 0.5  # Por debajo, el factor de desvío es ruido de redondeo
+
+
+class EstimadorRutas:
+    """
+    Estimador de distancia y duración por carretera sin llamar a ninguna API.
+
+    Aprende de las rutas ya guardadas en la caché el factor de desvío (km por carretera /
+    km en línea recta) y la velocidad media, por región (celda de `TAMANO_CELDA_GRADOS`
+    alrededor del punto medio del trayecto) y banda de distancia. Para cada grupo guarda la
+    mediana y los percentiles 10 y 90, que dan la horquilla de error de la estimación.
+
+    Si una región/banda tiene menos de `MIN_MUESTRAS`, se usa la banda sin región y, si
+    tampoco hay datos, los valores por defecto.
+    """
+
+    def __init__(self, tablas=None, tablas_banda=None, muestras=0):
+        # {(celda_lat, celda_lon, banda): (factor_p10, factor_p50, factor_p90, vel_p10, vel_p50, vel_p90)}
+        self.tablas = tablas or {}
+        self.tablas_banda = tablas_banda or {}
+        self.muestras = muestras
+
+    @classmethod
+    def construir(cls, rutas):
+        """
+        Calibra el estimador a partir de rutas conocidas.
+
+        Args:
+            rutas (list | np.ndarray): Filas `(lat_origen, lon_origen, lat_destino, lon_destino,
+                distancia_km, duracion_min)`, p. ej. las de `CacheRutas.muestras()`.
+        Returns:
+            EstimadorRutas: Estimador calibrado (con los valores por defecto si no hay rutas).
+        """
+        datos = np.asarray(rutas, dtype=np.float64).reshape(-1, 6)
+        lat_o, lon_o, lat_d, lon_d, distancia, duracion = datos.T
+        recta = distancia_haversine_np(lat_o, lon_o, lat_d, lon_d)
+
+        validas = (recta >= DISTANCIA_MINIMA_KM) & (distancia > 0) & (duracion > 0)
+        factor = distancia[validas] / recta[validas]
+        velocidad = distancia[validas] / (duracion[validas] / 60)
+        # Fuera de rango: coordenadas mal geocodificadas o rutas con ferry
+        razonables = (factor >= 1) & (factor <= 4) & (velocidad >= 5) & (velocidad <= 130)
+        factor, velocidad = factor[razonables], velocidad[razonables]
+
+        celda_lat, celda_lon = cls._celdas((lat_o + lat_d)[validas][razonables] / 2,
+                                           (lon_o + lon_d)[validas][razonables] / 2)
+        banda = np.searchsorted(LIMITES_BANDAS_KM, recta[validas][razonables])
+
+        tablas = cls._agrupar(np.column_stack([celda_lat, celda_lon, banda]), factor, velocidad)
+        tablas_banda = cls._agrupar(banda[:, None], factor, velocidad)
+        logger.debug(f"[DEBUG] Estimador de rutas calibrado con {len(factor)} rutas en {len(tablas)} regiones/bandas")
+        return cls(tablas, tablas_banda, len(factor))
+
+    @staticmethod
+    def _celdas(lat, lon):
+        return (np.floor(np.asarray(lat) / TAMANO_CELDA_GRADOS).astype(np.int64),
+                np.floor(np.asarray(lon) / TAMANO_CELDA_GRADOS).astype(np.int64))
+
+    @staticmethod
+    def _agrupar(claves, factor, velocidad):
+        """Percentiles 10/50/90 de factor y velocidad por cada clave con suficientes muestras."""
+        tablas = {}
+        if not len(claves):
+            return tablas
+        unicas, grupo = np.unique(claves, axis=0, return_inverse=True)
+        grupo = grupo.ravel()
+        for g, clave in enumerate(unicas):
+            en_grupo = grupo == g
+            if en_grupo.sum() < MIN_MUESTRAS:
+                continue
+            p_factor = np.percentile(factor[en_grupo], [10, 50, 90])
+            p_velocidad = np.percentile(velocidad[en_grupo], [10, 50, 90])
+            tablas[tuple(int(c) for c in clave)] = tuple(float(p) for p in (*p_factor, *p_velocidad))
+        return tablas
+
+    def _parametros(self, celda_lat, celda_lon, banda):
+        parametros = self.tablas.get((celda_lat, celda_lon, banda)) or self.tablas_banda.get((banda,))
+        if parametros is None:
+            return (FACTOR_DESVIO_MINIMO,) + (FACTOR_DESVIO_POR_DEFECTO,) * 2 + (VELOCIDAD_POR_DEFECTO_KMH,) * 3
+        return parametros
+
+    def estimar_desde_recta(self, distancia_recta, lat_referencia, lon_referencia):
+        """
+        Estima la ruta por carretera a partir de la distancia en línea recta ya calculada.
+
+        Args:
+            distancia_recta (float | array): Distancia en línea recta en km.
+            lat_referencia, lon_referencia (float | array): Punto de la región (p. ej. el punto medio).
+        Returns:
+            dict: Arrays `distancia`, `distancia_p10`, `distancia_p90` (km) y `duracion`,
+            `duracion_p10`, `duracion_p90` (minutos).
+        """
+        recta = np.atleast_1d(np.asarray(distancia_recta, dtype=np.float64))
+        celda_lat, celda_lon = self._celdas(*np.broadcast_arrays(lat_referencia, lon_referencia))
+        celda_lat, celda_lon = np.broadcast_to(celda_lat, recta.shape).ravel(), np.broadcast_to(celda_lon, recta.shape).ravel()
+        banda = np.searchsorted(LIMITES_BANDAS_KM, recta.ravel())
+
+        # Una consulta a la tabla por combinación distinta, no por trayecto
+        claves, inversa = np.unique(np.column_stack([celda_lat, celda_lon, banda]), axis=0, return_inverse=True)
+        parametros = np.array([self._parametros(*(int(c) for c in clave)) for clave in claves]).reshape(-1, 6)
+        factor_p10, factor_p50, factor_p90, vel_p10, vel_p50, vel_p90 = parametros[inversa.ravel()].T
+
+        recta = recta.ravel()
+        estimacion = {
+            "distancia": recta * factor_p50,
+            "distancia_p10": recta * factor_p10,
+            "distancia_p90": recta * factor_p90,
+        }
+        estimacion["duracion"] = estimacion["distancia"] / vel_p50 * 60
+        estimacion["duracion_p10"] = estimacion["distancia_p10"] / vel_p90 * 60
+        estimacion["duracion_p90"] = estimacion["distancia_p90"] / vel_p10 * 60
+        forma = np.shape(distancia_recta)
+        return {clave: valor.reshape(forma) for clave, valor in estimacion.items()}
+
+    def estimar(self, lat_origen, lon_origen, lat_destino, lon_destino):
+        """
+        Estima la ruta por carretera entre coordenadas (escalares o arrays con broadcasting).
+
+        Returns:
+            dict: Igual que `estimar_desde_recta`.
+        """
+        recta = distancia_haversine_np(lat_origen, lon_origen, lat_destino, lon_destino)
+        lat_media = (np.asarray(lat_origen, dtype=np.float64) + lat_destino) / 2
+        lon_media = (np.asarray(lon_origen, dtype=np.float64) + lon_destino) / 2
+        return self.estimar_desde_recta(recta, *np.broadcast_arrays(lat_media, lon_media, recta)[:2])
+
+    def horas_desde_recta(self, distancia_recta, lat_referencia, lon_referencia):
+        """
+        Horas de viaje optimistas (p10) para una distancia en línea recta, para prefiltrar sin
+        descartar lo que quizá cabe; sin calibrar equivalen a `km / 60`. La mediana y el p90
+        quedan para mostrar la estimación.
+        """
+        return self.estimar_desde_recta(distancia_recta, lat_referencia, lon_referencia)["duracion_p10"] / 60
@@ -0,0 +1,199 @@
+# modulos/fragmentos_geograficos.py
+import numpy as np
+import pandas as pd
+
+from modulos.logger_config import logger
+from modulos.geo import distancia_haversine_np
+
+KM_POR_GRADO_LATITUD = 111.0
+MARGEN_INTERSECCION = 1.02  # Holgura para la distancia punto-rectángulo sobre la esfera
+ZONA_SIN_ASIGNAR = "SIN ZONA"
+
+
+class FragmentoGeografico:
+    """
+    Filas de una zona (NORTE, SUR, ... o la `Zona` del técnico) con sus propios índices.
+
+    - Índice espacial: posiciones de las filas con coordenadas ordenadas por latitud, para
+      acotar cada consulta por radio con `searchsorted` antes de calcular distancias.
+    - Índice temporal (opcional): posiciones ordenadas por `columna_tiempo`.
+
+    Se conservan también las filas sin coordenadas, porque hay consultas (como la agenda
+    completa de un técnico) que necesitan todas las filas del fragmento.
+    """
+
+    def __init__(self, zona, df, columnas_coordenadas=("Latitud", "Longitud"), columna_tiempo=None):
+        self.zona = zona
+        self.datos = df
+        self.columna_lat, self.columna_lon = columnas_coordenadas
+        self.columna_tiempo = columna_tiempo
+
+        lat = pd.to_numeric(df[self.columna_lat], errors="coerce").to_numpy(dtype=np.float64)
+        lon = pd.to_numeric(df[self.columna_lon], errors="coerce").to_numpy(dtype=np.float64)
+        con_coordenadas = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+
+        orden = con_coordenadas[np.argsort(lat[con_coordenadas], kind="stable")]
+        self.posiciones_espaciales = orden
+        self.lat = lat[orden]
+        self.lon = lon[orden]
+
+        if len(orden):
+            self.caja = (self.lat.min(), self.lat.max(), self.lon.min(), self.lon.max())
+        else:
+            self.caja = None
+
+        self.posiciones_temporales = None
+        self.tiempos = None
+        if columna_tiempo and columna_tiempo in df.columns:
+            tiempos = pd.to_datetime(df[columna_tiempo], errors="coerce").to_numpy(dtype="datetime64[ns]")
+            validos = np.flatnonzero(~np.isnat(tiempos))
+            orden_temporal = validos[np.argsort(tiempos[validos], kind="stable")]
+            self.posiciones_temporales = orden_temporal
+            self.tiempos = tiempos[orden_temporal]
+
+    def __len__(self):
+        return len(self.datos)
+
+    def intersecta_radio(self, lat, lon, radio_km):
+        """Indica si el círculo de `radio_km` alrededor del punto toca la caja del fragmento."""
+        if self.caja is None:
+            return False
+        if not np.isfinite(radio_km):
+            return True
+        lat_min, lat_max, lon_min, lon_max = self.caja
+        lat_cercana = min(max(lat, lat_min), lat_max)
+        lon_cercana = min(max(lon, lon_min), lon_max)
+        return distancia_haversine_np(lat, lon, lat_cercana, lon_cercana) <= radio_km * MARGEN_INTERSECCION
+
+    def consultar_radio(self, lat, lon, radio_km, desde=None, hasta=None):
+        """
+        Devuelve las filas del fragmento a menos de `radio_km`, con su distancia.
+
+        Args:
+            lat (float): Latitud del centro.
+            lon (float): Longitud del centro.
+            radio_km (float): Radio de búsqueda en km (`np.inf` para todo el fragmento).
+            desde, hasta (datetime, optional): Intervalo temporal, si el fragmento tiene índice temporal.
+        Returns:
+            pd.DataFrame: Filas dentro del radio con la columna `Distancia`.
+        """
+        if np.isfinite(radio_km):
+            margen = radio_km / KM_POR_GRADO_LATITUD
+            inicio = np.searchsorted(self.lat, lat - margen, side="left")
+            fin = np.searchsorted(self.lat, lat + margen, side="right")
+        else:
+            inicio, fin = 0, len(self.lat)
+
+        distancias = distancia_haversine_np(lat, lon, self.lat[inicio:fin], self.lon[inicio:fin])
+        dentro = distancias <= radio_km
+        posiciones = self.posiciones_espaciales[inicio:fin][dentro]
+        distancias = distancias[dentro]
+
+        if desde is not None or hasta is not None:
+            en_intervalo = np.isin(posiciones, self.posiciones_en_intervalo(desde, hasta))
+            posiciones, distancias = posiciones[en_intervalo], distancias[en_intervalo]
+
+        resultado = self.datos.iloc[posiciones].copy()
+        resultado["Distancia"] = distancias
+        return resultado
+
+    def posiciones_en_intervalo(self, desde=None, hasta=None):
+        """Posiciones (en `self.datos`) de las filas con `columna_tiempo` dentro de [desde, hasta]."""
+        if self.tiempos is None:
+            raise ValueError(f"El fragmento '{self.zona}' no tiene índice temporal.")
+        inicio = 0 if desde is None else np.searchsorted(self.tiempos, np.datetime64(pd.Timestamp(desde)), side="left")
+        fin = len(self.tiempos) if hasta is None else np.searchsorted(self.tiempos, np.datetime64(pd.Timestamp(hasta)), side="right")
+        return self.posiciones_temporales[inicio:fin]
+
+
+class FragmentosGeograficos:
+    """
+    Conjunto de datos en memoria particionado por zona geográfica.
+
+    Las consultas por radio solo visitan los fragmentos cuya caja intersecta el círculo de
+    búsqueda, y cada zona puede recargarse por separado con `actualizar_fragmento`.
+    """
+
+    def __init__(self, columnas_coordenadas=("Latitud", "Longitud"), columna_tiempo=None):
+        self.columnas_coordenadas = columnas_coordenadas
+        self.columna_tiempo = columna_tiempo
+        self.fragmentos = {}
+
+    @classmethod
+    def construir(cls, df, columna_zona, columnas_coordenadas=("Latitud", "Longitud"), columna_tiempo=None):
+        """
+        Crea un fragmento por cada valor de `columna_zona`.
+
+        Args:
+            df (pd.DataFrame): Datos completos.
+            columna_zona (str): Columna que define la zona de cada fila.
+            columnas_coordenadas (tuple): Columnas de latitud y longitud.
+            columna_tiempo (str, optional): Columna para el índice temporal de cada fragmento.
+        Returns:
+            FragmentosGeograficos: Conjunto de fragmentos.
+        """
+        conjunto = cls(columnas_coordenadas, columna_tiempo)
+        zonas = df[columna_zona].fillna(ZONA_SIN_ASIGNAR)
+        for zona, grupo in df.groupby(zonas, sort=False):
+            conjunto.actualizar_fragmento(zona, grupo)
+        return conjunto
+
+    def actualizar_fragmento(self, zona, df):
+        """
+        Reconstruye (o crea) solo el fragmento de `zona`, sin tocar los demás.
+
+        Las consultas concatenan filas de varios fragmentos, así que el índice de `df` no debe
+        repetir etiquetas de otras zonas (p. ej. cortar cada zona de un único DataFrame).
+        """
+        self.fragmentos[zona] = FragmentoGeografico(zona, df, self.columnas_coordenadas, self.columna_tiempo)
+        logger.debug(f"[DEBUG] Fragmento '{zona}' indexado con {len(df)} filas")
+
+    def __len__(self):
+        return sum(len(fragmento) for fragmento in self.fragmentos.values())
+
+    def fragmentos_en_radio(self, lat, lon, radio_km):
+        """Devuelve los fragmentos que intersectan el círculo de búsqueda."""
+        return [f for f in self.fragmentos.values() if f.intersecta_radio(lat, lon, radio_km)]
+
+    def consultar_radio(self, lat, lon, radio_km, desde=None, hasta=None):
+        """
+        Devuelve las filas de todas las zonas a menos de `radio_km`, con la columna `Distancia`.
+        """
+        partes = [f.consultar_radio(lat, lon, radio_km, desde, hasta)
+                  for f in self.fragmentos_en_radio(lat, lon, radio_km)]
+        partes = [p for p in partes if not p.empty]
+        if not partes:
+            return pd.DataFrame(columns=list(self._columnas()) + ["Distancia"])
+        return pd.concat(partes)
+
+    def datos_en_radio(self, lat, lon, radio_km):
+        """
+        Devuelve todas las filas (con o sin coordenadas) de los fragmentos que intersectan el radio.
+
+        Útil cuando la consulta necesita el contexto completo de cada zona, no solo los puntos cercanos.
+        """
+        partes = [f.datos for f in self.fragmentos_en_radio(lat, lon, radio_km)]
+        if not partes:
+            return pd.DataFrame(columns=list(self._columnas()))
+        return pd.concat(partes)
+
+    def mas_cercanos(self, lat, lon, n, radio_inicial_km=25):
+        """
+        Devuelve las `n` filas más cercanas, ampliando el radio hasta tener suficientes.
+
+        El resultado es exacto: cuando hay al menos `n` filas dentro del radio, ninguna fila
+        fuera de él puede estar más cerca.
+        """
+        radio_km = radio_inicial_km
+        while True:
+            visitados = self.fragmentos_en_radio(lat, lon, radio_km)
+            cercanos = self.consultar_radio(lat, lon, radio_km)
+            if len(cercanos) >= n or not np.isfinite(radio_km):
+                return cercanos.sort_values(by="Distancia", kind="stable").head(n)
+            # Si ya se visitan todas las zonas, la última vuelta cubre todo el conjunto
+            radio_km = np.inf if len(visitados) == len(self.fragmentos) else radio_km * 2
+
+    def _columnas(self):
+        for fragmento in self.fragmentos.values():
+            return fragmento.datos.columns
+        return []
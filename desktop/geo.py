@@ -0,0 +1,74 @@
+# modulos/geo.py
+import os
+
+import numpy as np
+import pandas as pd
+
+from modulos.logger_config import logger
+
+RADIO_TIERRA_KM = 6371.0088
+
+
+def distancia_haversine_np(lat1, lon1, lat2, lon2):
+    """
+    Calcula distancias Haversine en kilómetros de forma vectorizada.
+
+    Los argumentos se combinan con las reglas de broadcasting de NumPy, por lo que
+    se puede calcular un punto contra un array o una matriz completa
+    (`lat1[:, None]` contra `lat2[None, :]`) en una sola llamada.
+
+    Args:
+        lat1, lon1 (float | np.ndarray): Coordenadas de origen en grados.
+        lat2, lon2 (float | np.ndarray): Coordenadas de destino en grados.
+    Returns:
+        np.ndarray: Distancias en kilómetros.
+    """
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lon1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lon2, dtype=np.float64))
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
+    return 2.0 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def ruta_listado_codigos_postales():
+    """
+    Devuelve la ruta configurada de `Listado-de-CP.xlsx`, la misma que
+    `cargar_configuracion()['archivo_codigos_postales']`.
+
+    Raises:
+        FileNotFoundError: Si el listado no existe.
+    """
+    # Importación diferida: utils -> api_manager -> estimador_rutas ya importa este módulo
+    from modulos.utils import cargar_listado_codigos_postales
+    return cargar_listado_codigos_postales()
+
+
+def cargar_tabla_codigos_postales(archivo=None):
+    """
+    Carga `Listado-de-CP.xlsx` como tabla de centroides lista para indexar.
+
+    Formatea los códigos a cinco dígitos, descarta filas sin coordenadas y conserva
+    la primera aparición de cada código, igual que `obtener_lat_lon_de_direccion`.
+
+    Args:
+        archivo (str, optional): Ruta del listado. Por defecto, la configurada (`ruta_listado_codigos_postales`).
+    Returns:
+        pd.DataFrame: Columnas `codigo_postal`, `Latitud` y `Longitud` con índice 0..N-1.
+    Raises:
+        FileNotFoundError: Si el listado no existe.
+    """
+    archivo = archivo or ruta_listado_codigos_postales()
+    if not os.path.exists(archivo):
+        raise FileNotFoundError(f"El archivo '{archivo}' no fue encontrado.")
+
+    df = pd.read_excel(archivo, dtype={"codigo_postal": str})
+    df["codigo_postal"] = df["codigo_postal"].astype(str).str.strip().str.zfill(5)
+    df = df.dropna(subset=["Latitud", "Longitud"])
+    df = df.drop_duplicates(subset="codigo_postal", keep="first").reset_index(drop=True)
+
+    logger.debug(f"[DEBUG] Tabla de códigos postales cargada: {len(df)} centroides")
+    return df
@@ -0,0 +1,153 @@
+# modulos/geocodificador.py
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from modulos.logger_config import logger, get_data_dir
+
+ARCHIVO_CALLEJERO = "callejero.csv"
+PUNTUACION_MINIMA = 0.5
+TAMANO_CACHE = 4096
+
+# Tipos de vía y partículas que no distinguen una entrada de otra
+PALABRAS_VACIAS = {
+    "DE", "DEL", "LA", "LAS", "EL", "LOS", "Y", "A", "EN",
+    "C", "CL", "CALLE", "AV", "AVD", "AVDA", "AVENIDA", "PZ", "PZA", "PLAZA", "PS", "PASEO",
+    "CTRA", "CARRETERA", "CM", "CAMINO", "TR", "TRAVESIA", "RONDA", "URB", "URBANIZACION",
+    "SN", "N", "NUM", "NUMERO", "BAJO", "PISO", "PTA", "PUERTA", "ESC",
+}
+
+
+def normalizar_texto(texto):
+    """
+    Normaliza un texto para compararlo: mayúsculas, sin tildes ni signos de puntuación.
+
+    Args:
+        texto (str): Texto original.
+    Returns:
+        str: Texto normalizado con las palabras separadas por un espacio.
+    """
+    if pd.isna(texto):
+        return ""
+    texto = unicodedata.normalize("NFKD", str(texto))
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).upper()
+    return re.sub(r"[^A-Z0-9Ñ]+", " ", texto).strip()
+
+
+def tokenizar(texto):
+    """Devuelve las palabras significativas del texto normalizado (sin números ni palabras vacías)."""
+    return [t for t in normalizar_texto(texto).split() if not t.isdigit() and t not in PALABRAS_VACIAS]
+
+
+class Geocodificador:
+    """
+    Geocodificador offline sobre un callejero local (`callejero.csv` en el directorio de datos).
+
+    El callejero tiene las columnas `nombre`, `municipio`, `provincia`, `Latitud`, `Longitud`
+    y, opcionalmente, `codigo_postal`. Cada fila puede ser una calle o un municipio completo.
+
+    Las filas se guardan en un índice invertido compacto (palabra -> filas, en formato CSR)
+    y cada consulta puntúa las filas candidatas según el peso IDF de las palabras compartidas,
+    sin recorrer el callejero completo ni llamar a servicios externos.
+    """
+
+    def __init__(self, df):
+        self.lat = pd.to_numeric(df["Latitud"], errors="coerce").to_numpy(dtype=np.float64)
+        self.lon = pd.to_numeric(df["Longitud"], errors="coerce").to_numpy(dtype=np.float64)
+        if "codigo_postal" in df.columns:
+            self.codigos = df["codigo_postal"].astype(str).str.strip().str.zfill(5).to_numpy(dtype="U5")
+        else:
+            self.codigos = None
+
+        textos = (df["nombre"].fillna("").astype(str) + " " + df["municipio"].fillna("").astype(str)
+                  + " " + df["provincia"].fillna("").astype(str))
+
+        self.vocabulario = {}
+        filas, ids = [], []
+        for fila, texto in enumerate(textos):
+            for token in set(tokenizar(texto)):
+                ids.append(self.vocabulario.setdefault(token, len(self.vocabulario)))
+                filas.append(fila)
+
+        ids = np.asarray(ids, dtype=np.int64)
+        filas = np.asarray(filas, dtype=np.int32)
+        orden = np.argsort(ids, kind="stable")
+        self.filas = filas[orden]
+        conteos = np.bincount(ids, minlength=len(self.vocabulario))
+        self.indptr = np.zeros(len(self.vocabulario) + 1, dtype=np.int64)
+        np.cumsum(conteos, out=self.indptr[1:])
+
+        n = max(len(textos), 1)
+        self.idf = np.log((n + 1) / (conteos + 1)) + 1.0
+        self.peso_fila = np.bincount(filas, weights=self.idf[ids], minlength=len(textos))
+
+        self.geocodificar = lru_cache(maxsize=TAMANO_CACHE)(self._geocodificar)
+
+    @classmethod
+    def cargar(cls, ruta=None):
+        """
+        Carga el callejero local.
+
+        Args:
+            ruta (str, optional): Ruta de `callejero.csv`. Por defecto, el de `get_data_dir()`.
+        Returns:
+            Geocodificador | None: El geocodificador, o None si no hay callejero o no es válido.
+        """
+        ruta = ruta or os.path.join(get_data_dir(), ARCHIVO_CALLEJERO)
+        if not os.path.exists(ruta):
+            logger.debug(f"[DEBUG] No hay callejero en {ruta}; se usarán los centroides de código postal")
+            return None
+
+        try:
+            df = pd.read_csv(ruta, dtype={"codigo_postal": str})
+            columnas_necesarias = ["nombre", "municipio", "provincia", "Latitud", "Longitud"]
+            for columna in columnas_necesarias:
+                if columna not in df.columns:
+                    raise KeyError(f"Falta la columna '{columna}' en {ARCHIVO_CALLEJERO}.")
+            df = df.dropna(subset=["Latitud", "Longitud"]).reset_index(drop=True)
+            geocodificador = cls(df)
+        except Exception as e:
+            logger.error(f"[ERROR] No se pudo cargar el callejero: {e}")
+            return None
+
+        logger.info(f"Callejero cargado: {len(df)} entradas, {len(geocodificador.vocabulario)} palabras indexadas")
+        return geocodificador
+
+    def _geocodificar(self, direccion, codigo_postal=None):
+        """
+        Resuelve una dirección (p. ej. `Evt_POBLACION, Evt_PROVINCIA`) a coordenadas.
+
+        Args:
+            direccion (str): Dirección en texto libre.
+            codigo_postal (str, optional): Si se indica, solo se aceptan entradas de ese código postal.
+        Returns:
+            tuple: `(lat, lon)`, o `(None, None)` si ninguna entrada alcanza `PUNTUACION_MINIMA`.
+        """
+        ids = [self.vocabulario[t] for t in set(tokenizar(direccion)) if t in self.vocabulario]
+        if not ids:
+            return None, None
+
+        filas = np.concatenate([self.filas[self.indptr[i]:self.indptr[i + 1]] for i in ids])
+        pesos = np.repeat(self.idf[ids], [self.indptr[i + 1] - self.indptr[i] for i in ids])
+        candidatas, inverso = np.unique(filas, return_inverse=True)
+        coincidencia = np.bincount(inverso, weights=pesos)
+
+        if codigo_postal and self.codigos is not None:
+            mismo_cp = self.codigos[candidatas] == codigo_postal
+            candidatas, coincidencia = candidatas[mismo_cp], coincidencia[mismo_cp]
+            if not len(candidatas):
+                return None, None
+
+        # Cobertura de la consulta por la entrada y de la entrada por la consulta
+        peso_consulta = sum(self.idf[i] for i in ids)
+        puntuacion = (coincidencia / peso_consulta) * (coincidencia / self.peso_fila[candidatas])
+        mejor = int(np.argmax(puntuacion))
+        if puntuacion[mejor] < PUNTUACION_MINIMA:
+            return None, None
+
+        fila = candidatas[mejor]
+        return float(self.lat[fila]), float(self.lon[fila])
@@ -0,0 +1,283 @@
+# modulos/hitos.py
+import os
+import json
+
+import numpy as np
+
+from modulos.logger_config import logger, get_data_dir
+from modulos.geo import distancia_haversine_np
+from modulos.matriz_tecnicos import firma_archivo
+
+ARCHIVO_DISTANCIAS = "hitos_distancias.npy"
+ARCHIVO_DURACIONES = "hitos_duraciones.npy"
+ARCHIVO_METADATOS = "hitos.json"
+NUM_HITOS = 32
+CODIGOS_POR_BLOQUE = 50        # Códigos postales por consulta de matriz al completar la tabla
+VELOCIDAD_MAXIMA_KMH = 120     # Para la cota inferior de duración a partir de la línea recta
+# Las cotas son entre centroides de código postal y las rutas reales salen de direcciones geocodificadas;
+# al podar se admite este error en cada extremo del trayecto
+HOLGURA_KM = 5
+HOLGURA_MINUTOS = 6
+DESDE, HACIA = 0, 1            # Sentido del trayecto respecto al hito
+
+
+class Hitos:
+    """
+    Cotas de distancia y duración por carretera entre códigos postales mediante hitos
+    (landmarks, técnica ALT).
+
+    Para `NUM_HITOS` códigos postales repartidos por el mapa (selección del punto más lejano)
+    se guardan las rutas reales desde cada hito a todos los códigos postales y de vuelta, en
+    arrays float32 de forma (códigos postales × 2 sentidos × hitos) abiertos con `np.load(mmap_mode=...)`.
+    Por la desigualdad triangular, para cualquier par `u -> v` y hito `L`:
+
+        d(L, v) - d(L, u) <= d(u, v) <= d(u, L) + d(L, v)
+        d(u, L) - d(v, L) <= d(u, v)
+
+    La tabla empieza vacía (NaN) y se completa por bloques con `completar`, normalmente desde el
+    precalentamiento en segundo plano. Mientras falten datos, la cota inferior es la línea recta.
+    """
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio or get_data_dir()
+        self.codigos = []
+        self.indice_cp = {}
+        self.hitos = np.zeros(0, dtype=np.int64)
+        self.lat = np.zeros(0)
+        self.lon = np.zeros(0)
+        self.distancias = None
+        self.duraciones = None
+        self._bloques_intentados = set()
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    @classmethod
+    def cargar_o_construir(cls, df_codigos_postales, archivo_codigos_postales, directorio=None):
+        """
+        Abre la tabla de hitos y la vuelve a crear (vacía) si el listado de códigos postales ha cambiado.
+
+        Args:
+            df_codigos_postales (pd.DataFrame): Tabla con `codigo_postal`, `Latitud` y `Longitud`.
+            archivo_codigos_postales (str): Ruta del listado de códigos postales usado.
+            directorio (str, optional): Carpeta de la tabla. Por defecto, `get_data_dir()`.
+        Returns:
+            Hitos: Tabla lista para consultar.
+        """
+        tabla = cls(directorio)
+        firma = firma_archivo(archivo_codigos_postales)
+
+        metadatos = tabla._leer_metadatos()
+        if metadatos is None or metadatos.get("firma_cp") != firma:
+            logger.info("Listado de códigos postales nuevo o modificado: creando la tabla de hitos.")
+            metadatos = tabla.construir(df_codigos_postales, firma)
+            if tabla.distancias is not None:
+                return tabla
+
+        tabla._abrir(metadatos)
+        return tabla
+
+    def _leer_metadatos(self):
+        ruta = self._ruta(ARCHIVO_METADATOS)
+        if not (os.path.exists(ruta) and os.path.exists(self._ruta(ARCHIVO_DISTANCIAS))
+                and os.path.exists(self._ruta(ARCHIVO_DURACIONES))):
+            return None
+        try:
+            with open(ruta, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"No se pudieron leer los metadatos de la tabla de hitos: {e}")
+            return None
+
+    @staticmethod
+    def elegir_hitos(lat, lon, num_hitos=NUM_HITOS):
+        """
+        Elige hitos por el punto más lejano: el primero es el más alejado del centro y cada
+        siguiente, el más alejado de los ya elegidos. Quedan en la periferia y repartidos, que
+        es donde dan cotas más ajustadas.
+
+        Returns:
+            np.ndarray: Índices de los puntos elegidos.
+        """
+        if not len(lat):
+            return np.zeros(0, dtype=np.int64)
+        primero = int(np.argmax(distancia_haversine_np(np.mean(lat), np.mean(lon), lat, lon)))
+        elegidos = [primero]
+        cercania = distancia_haversine_np(lat[primero], lon[primero], lat, lon)
+        for _ in range(min(num_hitos, len(lat)) - 1):
+            siguiente = int(np.argmax(cercania))
+            elegidos.append(siguiente)
+            cercania = np.minimum(cercania, distancia_haversine_np(lat[siguiente], lon[siguiente], lat, lon))
+        return np.array(elegidos, dtype=np.int64)
+
+    def construir(self, df_codigos_postales, firma_cp=None):
+        """
+        Elige los hitos y crea en disco la tabla vacía (NaN), que se rellena con `completar`.
+
+        Returns:
+            dict: Metadatos de la tabla (códigos postales, hitos y firma del listado).
+        """
+        tabla_cp = (df_codigos_postales.dropna(subset=["codigo_postal", "Latitud", "Longitud"])
+                    .drop_duplicates(subset="codigo_postal", keep="first"))
+        codigos = tabla_cp["codigo_postal"].tolist()
+        lat = tabla_cp["Latitud"].to_numpy(dtype=np.float64)
+        lon = tabla_cp["Longitud"].to_numpy(dtype=np.float64)
+        hitos = self.elegir_hitos(lat, lon)
+
+        distancias = np.full((len(codigos), 2, len(hitos)), np.nan, dtype=np.float32)
+        duraciones = np.full((len(codigos), 2, len(hitos)), np.nan, dtype=np.float32)
+        metadatos = {
+            "firma_cp": firma_cp,
+            "codigos": codigos,
+            "lat": lat.tolist(),
+            "lon": lon.tolist(),
+            "hitos": hitos.tolist(),
+        }
+        try:
+            for nombre, valores in ((ARCHIVO_DISTANCIAS, distancias), (ARCHIVO_DURACIONES, duraciones)):
+                temporal = self._ruta(nombre + ".tmp")
+                with open(temporal, "wb") as file:
+                    np.save(file, valores)
+                os.replace(temporal, self._ruta(nombre))
+            with open(self._ruta(ARCHIVO_METADATOS), "w", encoding="utf-8") as file:
+                json.dump(metadatos, file)
+        except OSError as e:
+            logger.error(f"[ERROR] No se pudo guardar la tabla de hitos, se usará en memoria: {e}")
+            self._abrir(metadatos, distancias, duraciones)
+            return metadatos
+
+        logger.info(f"Tabla de hitos creada: {len(codigos)} códigos postales x {len(hitos)} hitos")
+        return metadatos
+
+    def _abrir(self, metadatos, distancias=None, duraciones=None):
+        self.codigos = metadatos["codigos"]
+        self.indice_cp = {cp: i for i, cp in enumerate(self.codigos)}
+        self.lat = np.array(metadatos["lat"], dtype=np.float64)
+        self.lon = np.array(metadatos["lon"], dtype=np.float64)
+        self.hitos = np.array(metadatos["hitos"], dtype=np.int64)
+
+        if distancias is not None:
+            self.distancias, self.duraciones = distancias, duraciones
+            return
+
+        self.distancias = np.load(self._ruta(ARCHIVO_DISTANCIAS), mmap_mode="r+")
+        self.duraciones = np.load(self._ruta(ARCHIVO_DURACIONES), mmap_mode="r+")
+
+    def pendiente(self):
+        """Fracción (0-1) de la tabla aún sin datos."""
+        if self.distancias is None or not self.distancias.size:
+            return 0.0
+        return float(np.isnan(self.distancias).mean())
+
+    def completar(self, api_manager, max_bloques=1, reserva_cuota=None):
+        """
+        Pide las rutas de los siguientes `max_bloques` bloques de códigos postales sin datos:
+        una matriz desde los hitos y otra hacia ellos por bloque. No usa la caché de rutas (la
+        llenaría de trayectos que nadie busca) ni guarda estimaciones.
+
+        Args:
+            api_manager (APIManager): Gestor de APIs con el que consultar las matrices.
+            max_bloques (int): Bloques de `CODIGOS_POR_BLOQUE` códigos postales a completar.
+            reserva_cuota (float, optional): Fracción de la cuota diaria que no se debe gastar
+                (ver `APIManager.obtener_matriz`).
+        Returns:
+            bool: True si aún quedan bloques por intentar en esta sesión.
+        """
+        if self.distancias is None or not len(self.hitos):
+            return False
+        coords_hitos = list(zip(self.lat[self.hitos], self.lon[self.hitos]))
+        sin_datos = np.isnan(self.distancias).reshape(len(self.codigos), -1).any(axis=1)
+
+        bloques = [inicio for inicio in range(0, len(self.codigos), CODIGOS_POR_BLOQUE)
+                   if inicio not in self._bloques_intentados and sin_datos[inicio:inicio + CODIGOS_POR_BLOQUE].any()]
+        for inicio in bloques[:max_bloques]:
+            # Un bloque que no se completa (p. ej. códigos postales sin acceso por carretera) se reintenta en otra sesión
+            self._bloques_intentados.add(inicio)
+            filas = slice(inicio, inicio + CODIGOS_POR_BLOQUE)
+            coords_bloque = list(zip(self.lat[filas], self.lon[filas]))
+
+            km, minutos = api_manager.obtener_matriz(coords_hitos, coords_bloque, usar_cache=False, estimar=False,
+                                                     reserva_cuota=reserva_cuota)
+            self.distancias[filas, DESDE, :] = km.T
+            self.duraciones[filas, DESDE, :] = minutos.T
+            km, minutos = api_manager.obtener_matriz(coords_bloque, coords_hitos, usar_cache=False, estimar=False,
+                                                     reserva_cuota=reserva_cuota)
+            self.distancias[filas, HACIA, :] = km
+            self.duraciones[filas, HACIA, :] = minutos
+
+        for valores in (self.distancias, self.duraciones):
+            if hasattr(valores, "flush"):
+                valores.flush()
+        return len(bloques) > max_bloques
+
+    def cotas(self, codigos_origen, codigo_destino, magnitud="distancia"):
+        """
+        Cotas inferior y superior de la ruta por carretera desde varios códigos postales a uno.
+
+        Args:
+            codigos_origen (list): Códigos postales de origen.
+            codigo_destino (str): Código postal de destino.
+            magnitud (str): "distancia" (km) o "duracion" (minutos).
+        Returns:
+            tuple: Arrays `(inferior, superior)` alineados con `codigos_origen`; 0 e infinito para
+            los orígenes desconocidos. None si el destino no está en la tabla.
+        """
+        destino = self.indice_cp.get(codigo_destino)
+        if destino is None or self.distancias is None:
+            return None
+        tabla = self.distancias if magnitud == "distancia" else self.duraciones
+
+        filas = np.array([self.indice_cp.get(cp, -1) for cp in codigos_origen], dtype=np.int64)
+        conocidos = filas >= 0
+        inferior = np.zeros(len(filas))
+        superior = np.full(len(filas), np.inf)
+        if not conocidos.any():
+            return inferior, superior
+
+        origen = np.asarray(tabla[filas[conocidos]], dtype=np.float64)    # (n, 2, hitos)
+        fila_destino = np.asarray(tabla[destino], dtype=np.float64)      # (2, hitos)
+        candidatas_inferior = np.concatenate([
+            fila_destino[DESDE] - origen[:, DESDE],    # d(L, v) - d(L, u)
+            origen[:, HACIA] - fila_destino[HACIA],    # d(u, L) - d(v, L)
+        ], axis=1)
+        candidatas_superior = origen[:, HACIA] + fila_destino[DESDE]   # d(u, L) + d(L, v)
+
+        # Los hitos sin datos no acotan; la línea recta siempre acota por abajo
+        recta = distancia_haversine_np(self.lat[filas[conocidos]], self.lon[filas[conocidos]],
+                                       self.lat[destino], self.lon[destino])
+        if magnitud != "distancia":
+            recta = recta / VELOCIDAD_MAXIMA_KMH * 60
+        inferior[conocidos] = np.maximum(np.where(np.isnan(candidatas_inferior), -np.inf, candidatas_inferior).max(axis=1), recta)
+        superior[conocidos] = np.where(np.isnan(candidatas_superior), np.inf, candidatas_superior).min(axis=1)
+        superior = np.maximum(superior, inferior)
+        return inferior, superior
+
+    def podar(self, codigos_origen, codigo_destino, top_n, magnitud="distancia", holgura=None):
+        """
+        Descarta, sin consultar ninguna API, los orígenes que no pueden estar entre los `top_n`
+        más cercanos al destino: aquellos cuya cota inferior supera la `top_n`-ésima cota superior.
+
+        Como las rutas reales salen de la dirección y no del centroide de cada código postal, a
+        ambas cotas se les aplica `holgura` por extremo del trayecto (origen y destino).
+
+        Args:
+            holgura (float, optional): Error admitido por extremo, en km o minutos según `magnitud`.
+                Por defecto, `HOLGURA_KM` o `HOLGURA_MINUTOS`.
+        Returns:
+            np.ndarray: Índices (en `codigos_origen`) de los que pueden estarlo, ordenados por su
+            cota inferior; None si no se puede podar (destino fuera de la tabla o aún sin datos).
+        """
+        resultado = self.cotas(codigos_origen, codigo_destino, magnitud)
+        if resultado is None:
+            return None
+        inferior, superior = resultado
+        if holgura is None:
+            holgura = HOLGURA_KM if magnitud == "distancia" else HOLGURA_MINUTOS
+        if len(superior) <= top_n:
+            return np.argsort(inferior, kind="stable")
+        umbral = np.partition(superior, top_n - 1)[top_n - 1]
+        if not np.isfinite(umbral):
+            return None
+        # Entre direcciones, cada cota puede desviarse hasta `holgura` por extremo (dos extremos)
+        candidatos = np.flatnonzero(inferior - 2 * holgura <= umbral + 2 * holgura)
+        return candidatos[np.argsort(inferior[candidatos], kind="stable")]
@@ -0,0 +1,259 @@
+# modulos/isocronas.py
+import os
+import json
+
+import numpy as np
+
+from modulos.logger_config import logger, get_data_dir
+
+ARCHIVO_BITS = "isocronas.npy"
+ARCHIVO_METADATOS = "isocronas.json"
+UMBRALES_MINUTOS = (15, 30, 45, 60)
+VELOCIDAD_MAXIMA_KMH = 120     # Más allá de UMBRALES_MINUTOS[-1] a esta velocidad en línea recta no se llega
+FRACCION_MINIMA_RESUELTA = 0.95  # Códigos postales del radio con ruta para dar por buena una isócrona
+
+
+class Isocronas:
+    """
+    Códigos postales alcanzables desde la casa de cada técnico en 15/30/45/60 minutos por carretera.
+
+    Cada isócrona es un bitset sobre los códigos postales de `MatrizTecnicos` (un bit por código
+    postal, `np.packbits`), guardado en un array uint8 de forma (umbrales × técnicos × bytes)
+    abierto con `np.load(mmap_mode=...)`. "¿Qué técnicos llegan a este código postal en 45
+    minutos?" es la lectura de un byte por técnico.
+
+    Las duraciones salen de la matriz de técnicos, que se completa técnico a técnico con
+    `completar` (normalmente desde el precalentamiento) pidiendo solo los códigos postales a los
+    que se podría llegar en línea recta. Se vacía al cambiar el archivo ADT. Mientras la isócrona
+    de un técnico no está construida, sus consultas devuelven "desconocido"; también las de los
+    códigos postales que quedaron sin ruta al construirla (`sin_resolver`).
+    """
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio or get_data_dir()
+        self.firma_adt = None
+        self.tecnicos = []
+        self.codigos = []
+        self.indice_tecnico = {}
+        self.indice_cp = {}
+        self.construidas = np.zeros(0, dtype=bool)
+        self.sin_resolver = {}
+        self.bits = None
+        self.metadatos = None
+        self.matriz = None
+        self.lat_cp = np.zeros(0)
+        self.lon_cp = np.zeros(0)
+        self._intentados = set()
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    @classmethod
+    def cargar(cls, firma_adt=None, directorio=None):
+        """
+        Abre las isócronas guardadas solo para consultarlas.
+
+        Args:
+            firma_adt (dict, optional): Firma del archivo ADT actual (`firma_archivo`); si no coincide
+                con la de las isócronas guardadas, están desfasadas y no se cargan.
+        Returns:
+            Isocronas: Isócronas listas para consultar, o None si no hay o están desfasadas.
+        """
+        isocronas = cls(directorio)
+        metadatos = isocronas._leer_metadatos()
+        if metadatos is None or (firma_adt is not None and metadatos.get("firma_adt") != firma_adt):
+            return None
+        isocronas._abrir(metadatos)
+        return isocronas
+
+    @classmethod
+    def cargar_o_construir(cls, matriz_tecnicos, df_codigos_postales, directorio=None):
+        """
+        Abre las isócronas y las vuelve a crear (vacías) si la matriz de técnicos es de otro archivo
+        ADT o de otro listado de códigos postales.
+
+        Args:
+            matriz_tecnicos (MatrizTecnicos): Matriz de la que salen técnicos, casas y duraciones.
+            df_codigos_postales (pd.DataFrame): Tabla con `codigo_postal`, `Latitud` y `Longitud`.
+            directorio (str, optional): Carpeta de las isócronas. Por defecto, `get_data_dir()`.
+        Returns:
+            Isocronas: Isócronas listas para consultar y completar.
+        """
+        isocronas = cls(directorio)
+        metadatos = isocronas._leer_metadatos()
+        if (metadatos is None or metadatos.get("firma_adt") != matriz_tecnicos.firma_adt
+                or metadatos.get("tecnicos") != list(matriz_tecnicos.tecnicos)
+                or metadatos.get("num_codigos") != len(matriz_tecnicos.codigos)
+                or metadatos.get("codigos") != list(matriz_tecnicos.codigos)):
+            logger.info("Archivo ADT o listado de códigos postales nuevo o modificado: creando las isócronas de los técnicos.")
+            metadatos = isocronas.construir(matriz_tecnicos)
+        if isocronas.bits is None:
+            isocronas._abrir(metadatos)
+
+        isocronas.matriz = matriz_tecnicos
+        coords_cp = (df_codigos_postales.dropna(subset=["codigo_postal"])
+                     .drop_duplicates(subset="codigo_postal", keep="first")
+                     .set_index("codigo_postal")[["Latitud", "Longitud"]].reindex(matriz_tecnicos.codigos))
+        isocronas.lat_cp = coords_cp["Latitud"].to_numpy(dtype=np.float64)
+        isocronas.lon_cp = coords_cp["Longitud"].to_numpy(dtype=np.float64)
+        return isocronas
+
+    def _leer_metadatos(self):
+        ruta = self._ruta(ARCHIVO_METADATOS)
+        if not (os.path.exists(ruta) and os.path.exists(self._ruta(ARCHIVO_BITS))):
+            return None
+        try:
+            with open(ruta, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"No se pudieron leer los metadatos de las isócronas: {e}")
+            return None
+
+    def construir(self, matriz_tecnicos):
+        """
+        Crea en disco las isócronas vacías para los técnicos de la matriz; las duraciones que la
+        matriz ya conozca se aprovechan al completar.
+
+        Returns:
+            dict: Metadatos de las isócronas.
+        """
+        num_codigos = len(matriz_tecnicos.codigos)
+        bits = np.zeros((len(UMBRALES_MINUTOS), len(matriz_tecnicos.tecnicos), (num_codigos + 7) // 8), dtype=np.uint8)
+        metadatos = {
+            "firma_adt": matriz_tecnicos.firma_adt,
+            "umbrales": list(UMBRALES_MINUTOS),
+            "tecnicos": list(matriz_tecnicos.tecnicos),
+            "codigos": list(matriz_tecnicos.codigos),
+            "num_codigos": num_codigos,
+            "construidas": [False] * len(matriz_tecnicos.tecnicos),
+            "sin_resolver": {},
+        }
+        try:
+            temporal = self._ruta(ARCHIVO_BITS + ".tmp")
+            with open(temporal, "wb") as file:
+                np.save(file, bits)
+            os.replace(temporal, self._ruta(ARCHIVO_BITS))
+            self._guardar_metadatos(metadatos)
+        except OSError as e:
+            logger.error(f"[ERROR] No se pudieron guardar las isócronas, se usarán en memoria: {e}")
+            self._abrir(metadatos, bits)
+        return metadatos
+
+    def _guardar_metadatos(self, metadatos):
+        temporal = self._ruta(ARCHIVO_METADATOS + ".tmp")
+        with open(temporal, "w", encoding="utf-8") as file:
+            json.dump(metadatos, file)
+        os.replace(temporal, self._ruta(ARCHIVO_METADATOS))
+
+    def _abrir(self, metadatos, bits=None):
+        self.metadatos = metadatos
+        self.firma_adt = metadatos.get("firma_adt")
+        self.tecnicos = metadatos["tecnicos"]
+        self.codigos = metadatos["codigos"]
+        self.indice_tecnico = {tecnico: i for i, tecnico in enumerate(self.tecnicos)}
+        self.indice_cp = {cp: i for i, cp in enumerate(self.codigos)}
+        self.construidas = np.array(metadatos["construidas"], dtype=bool)
+        # {técnico: filas sin duración}: su bit a 0 no significa "no llega"
+        self.sin_resolver = {int(t): set(filas) for t, filas in metadatos.get("sin_resolver", {}).items()}
+        self.bits = bits if bits is not None else np.load(self._ruta(ARCHIVO_BITS), mmap_mode="r+")
+
+    def pendiente(self):
+        """Fracción (0-1) de técnicos sin isócrona."""
+        return float(1 - self.construidas.mean()) if len(self.construidas) else 0.0
+
+    def completar(self, api_manager, max_tecnicos=1, reserva_cuota=None):
+        """
+        Construye las isócronas de los siguientes `max_tecnicos` técnicos: pide a la API (sin caché
+        ni estimaciones) la duración desde su casa a los códigos postales a los que se podría llegar
+        a `VELOCIDAD_MAXIMA_KMH` en línea recta, la guarda en la matriz de técnicos y marca los bits.
+
+        Args:
+            api_manager (APIManager): Gestor de APIs con el que consultar las matrices.
+            max_tecnicos (int): Técnicos a completar en esta llamada.
+            reserva_cuota (float, optional): Fracción de la cuota diaria que no se debe gastar
+                (ver `APIManager.obtener_matriz`).
+        Returns:
+            bool: True si aún quedan técnicos por intentar en esta sesión.
+        """
+        if self.matriz is None or self.matriz.duraciones is None or self.bits is None:
+            return False
+        radio_km = VELOCIDAD_MAXIMA_KMH * UMBRALES_MINUTOS[-1] / 60
+        pendientes = [t for t in np.flatnonzero(~self.construidas)
+                      if t not in self._intentados and not np.isnan(self.matriz.lat_casa[t])]
+
+        for t in pendientes[:max_tecnicos]:
+            # Un técnico que no se completa se reintenta en otra sesión
+            self._intentados.add(t)
+            tecnico = self.tecnicos[t]
+            filas = np.flatnonzero(np.asarray(self.matriz.distancias[:, t]) <= radio_km)
+            filas = filas[~np.isnan(self.lat_cp[filas])]
+            minutos = np.asarray(self.matriz.duraciones[filas, t], dtype=np.float64)
+
+            sin_duracion = np.isnan(minutos)
+            if sin_duracion.any():
+                destinos = list(zip(self.lat_cp[filas[sin_duracion]], self.lon_cp[filas[sin_duracion]]))
+                _, duraciones = api_manager.obtener_matriz([(self.matriz.lat_casa[t], self.matriz.lon_casa[t])], destinos,
+                                                           usar_cache=False, estimar=False, reserva_cuota=reserva_cuota)
+                minutos[sin_duracion] = duraciones[0]
+                self.matriz.registrar_duraciones_tecnico(tecnico, filas, minutos)
+
+            resueltos = ~np.isnan(minutos)
+            if len(filas) and resueltos.mean() < FRACCION_MINIMA_RESUELTA:
+                logger.debug(f"[DEBUG] Isócrona de {tecnico} sin completar: {int(resueltos.sum())} de {len(filas)} rutas")
+                continue
+
+            alcanzable = np.zeros(len(self.codigos), dtype=bool)
+            for u, umbral in enumerate(UMBRALES_MINUTOS):
+                alcanzable[:] = False
+                alcanzable[filas[resueltos]] = minutos[resueltos] <= umbral
+                self.bits[u, t] = np.packbits(alcanzable)
+            self.construidas[t] = True
+            if not resueltos.all():
+                self.sin_resolver[int(t)] = set(filas[~resueltos].tolist())
+
+        if hasattr(self.bits, "flush"):
+            self.bits.flush()
+        self.metadatos["construidas"] = self.construidas.tolist()
+        self.metadatos["sin_resolver"] = {str(t): sorted(filas) for t, filas in self.sin_resolver.items()}
+        try:
+            self._guardar_metadatos(self.metadatos)
+        except OSError as e:
+            logger.error(f"[ERROR] No se pudieron guardar los metadatos de las isócronas: {e}")
+        return len(pendientes) > max_tecnicos
+
+    def alcance(self, codigo_postal, minutos):
+        """
+        Qué técnicos llegan desde casa a un código postal en `minutos`, con la isócrona del menor
+        umbral que no sea inferior (p. ej. 40 minutos usa la de 45).
+
+        Returns:
+            tuple: Arrays booleanos `(alcanzan, conocidas)` alineados con `self.tecnicos`; `alcanzan`
+            solo es fiable donde `conocidas` (isócrona construida y el código postal con ruta).
+            None si el código postal no está o `minutos` supera el mayor umbral.
+        """
+        fila = self.indice_cp.get(codigo_postal)
+        umbral = next((u for u, valor in enumerate(UMBRALES_MINUTOS) if valor >= minutos), None)
+        if fila is None or umbral is None or self.bits is None:
+            return None
+        alcanzan = (np.asarray(self.bits[umbral, :, fila >> 3]) & (0x80 >> (fila & 7))) != 0
+        conocidas = self.construidas.copy()
+        for t, filas in self.sin_resolver.items():
+            if fila in filas:
+                conocidas[t] = False
+        return alcanzan, conocidas
+
+    def tecnicos_que_alcanzan(self, codigo_postal, minutos):
+        """Técnicos con isócrona construida que llegan desde casa en `minutos` (lista vacía si no se sabe)."""
+        resultado = self.alcance(codigo_postal, minutos)
+        if resultado is None:
+            return []
+        alcanzan, conocidas = resultado
+        return [self.tecnicos[t] for t in np.flatnonzero(alcanzan & conocidas)]
+
+    def tecnicos_fuera_de_alcance(self, codigo_postal, minutos):
+        """Técnicos con isócrona construida que seguro no llegan desde casa en `minutos`."""
+        resultado = self.alcance(codigo_postal, minutos)
+        if resultado is None:
+            return []
+        alcanzan, conocidas = resultado
+        return [self.tecnicos[t] for t in np.flatnonzero(~alcanzan & conocidas)]
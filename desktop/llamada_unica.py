@@ -0,0 +1,58 @@
+# modulos/llamada_unica.py
+import threading
+from concurrent.futures import Future
+
+
+class LlamadaUnica:
+    """
+    Agrupa llamadas idénticas simultáneas (single-flight): mientras hay una llamada en curso
+    para una clave, las demás con la misma clave no repiten el trabajo, esperan y reciben
+    el mismo resultado (o la misma excepción). Al terminar, la clave se libera y la siguiente
+    llamada vuelve a ejecutarse (normalmente ya encontrará el resultado en la caché).
+
+    Es seguro usarlo desde varios hilos.
+    """
+
+    def __init__(self):
+        self._en_curso = {}
+        self._lock = threading.Lock()
+        self.ejecutadas = 0
+        self.compartidas = 0
+
+    def ejecutar(self, clave, funcion, *args, **kwargs):
+        """
+        Ejecuta `funcion(*args, **kwargs)` salvo que ya haya una llamada en curso con `clave`,
+        en cuyo caso espera a que termine y devuelve su resultado.
+        """
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            propietaria = futuro is None
+            if propietaria:
+                futuro = Future()
+                self._en_curso[clave] = futuro
+                self.ejecutadas += 1
+            else:
+                self.compartidas += 1
+
+        if not propietaria:
+            return futuro.result()
+
+        try:
+            resultado = funcion(*args, **kwargs)
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        else:
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Llamadas `ejecutadas`, llamadas `compartidas` (ahorradas) y las que están `en_curso`.
+        """
+        with self._lock:
+            return {"ejecutadas": self.ejecutadas, "compartidas": self.compartidas, "en_curso": len(self._en_curso)}
@@ -1,7 +1,7 @@
 #modulos/main_window.py
 import os
 
-from PyQt5.QtWidgets import QMainWindow, QLabel, QVBoxLayout, QWidget, QPushButton, QHBoxLayout, QMessageBox, QDialog
+from PyQt5.QtWidgets import QMainWindow, QLabel, QVBoxLayout, QWidget, QPushButton, QHBoxLayout, QMessageBox, QDialog, QApplication
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QPixmap
 
@@ -11,6 +11,8 @@ from modulos.tecnicos import BuscarTecnicoWindow
 from modulos.actualizar_tecnicos import ActualizarTecnicos
 from modulos.logger_config import logger, get_data_dir
 from modulos.loader import LoaderWidget
+from modulos.precalentamiento import DetectorInactividad, Precalentador
+from modulos.utils import api_manager
 
 from modulos.ordenes_cercanas import OrdenesCercanas
 from modulos.ventana_recor import VentanaRecordatorio
@@ -48,6 +50,12 @@ class MainWindow(QMainWindow):
         self.init_timer()
         self.recordatorio_activo = None 
 
+        # Precalentamiento de la caché de distancias mientras la aplicación está ociosa;
+        # arranca cuando "Buscar Hueco" carga el ExportBase
+        self.detector_inactividad = DetectorInactividad(self)
+        QApplication.instance().installEventFilter(self.detector_inactividad)
+        self.precalentador = Precalentador(api_manager, self.detector_inactividad.inactivo)
+
     def initUI(self):
         """
     Inicializa la interfaz gráfica principal de la aplicación, incluyendo el logo,
@@ -172,6 +180,15 @@ class MainWindow(QMainWindow):
         self.login_window = LoginWindow()
         self.login_window.show()
 
+    def closeEvent(self, event):
+        """
+    Al cerrar la aplicación detiene el precalentamiento y cierra el gestor de APIs compartido,
+    que guarda el uso diario de las claves aún no escrito en disco.
+    """
+        self.precalentador.detener()
+        api_manager.cerrar()
+        super().closeEvent(event)
+
     # Órdenes Cercanas
     def show_ordenes_cercanas(self):
         self.clear_content_area()
@@ -215,7 +232,7 @@ class MainWindow(QMainWindow):
 
     def load_buscar_hueco(self):
         try:
-            widget = BuscarHueco()
+            widget = BuscarHueco(precalentador=self.precalentador)
             self.content_area.addWidget(widget)
         except Exception as e:
             self.show_error_message("Error", "Error al mostrar Búsqueda de Hueco")
@@ -0,0 +1,241 @@
+# modulos/matriz_tecnicos.py
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from modulos.logger_config import logger, get_data_dir
+from modulos.geo import distancia_haversine_np
+from modulos.nucleos import distancias_pares
+
+ARCHIVO_DISTANCIAS = "matriz_tecnicos_distancias.npy"
+ARCHIVO_DURACIONES = "matriz_tecnicos_duraciones.npy"
+ARCHIVO_METADATOS = "matriz_tecnicos.json"
+FILAS_POR_BLOQUE = 1024
+
+
+def firma_archivo(ruta):
+    """
+    Devuelve una firma ligera (tamaño y fecha de modificación) para detectar cambios en un archivo.
+
+    Args:
+        ruta (str): Ruta del archivo.
+    Returns:
+        dict: Firma del archivo, o None si no existe.
+    """
+    if not ruta or not os.path.exists(ruta):
+        return None
+    estado = os.stat(ruta)
+    return {"ruta": os.path.basename(ruta), "tamano": estado.st_size, "mtime": estado.st_mtime}
+
+
+class MatrizTecnicos:
+    """
+    Matriz float32 de distancias (y duraciones por carretera cuando se conocen) desde la casa
+    de cada técnico del archivo ADT hasta cada centroide de `Listado-de-CP`.
+
+    Se guarda en `get_data_dir()` con forma (códigos postales × técnicos) y se abre con
+    `np.load(mmap_mode=...)`, de modo que "qué técnicos están más cerca de este código postal"
+    es la lectura de una única fila contigua del archivo.
+    """
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio or get_data_dir()
+        self.tecnicos = []
+        self.codigos = []
+        self.distancias = None
+        self.duraciones = None
+        self.lat_casa = np.zeros(0)
+        self.lon_casa = np.zeros(0)
+        self.indice_tecnico = {}
+        self.indice_cp = {}
+        self.firma_adt = None
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    @classmethod
+    def cargar_o_construir(cls, cp_tecnicos_adt, df_codigos_postales, archivo_cp_tecnicos_adt,
+                           archivo_codigos_postales=None, directorio=None):
+        """
+        Abre la matriz memory-mapped y la reconstruye si el archivo ADT o el listado de códigos
+        postales han cambiado desde la última vez.
+
+        Args:
+            cp_tecnicos_adt (pd.DataFrame): Técnicos con `Nombre Enrutador` y `Codigo Postal` ya formateados.
+            df_codigos_postales (pd.DataFrame): Tabla con `codigo_postal`, `Latitud` y `Longitud`.
+            archivo_cp_tecnicos_adt (str): Ruta del archivo `CODIGOS POSTALES TECNICOS ADT` usado.
+            archivo_codigos_postales (str, optional): Ruta del listado de códigos postales usado.
+            directorio (str, optional): Carpeta de la matriz. Por defecto, `get_data_dir()`.
+        Returns:
+            MatrizTecnicos: Matriz lista para consultar.
+        """
+        matriz = cls(directorio)
+        firma = firma_archivo(archivo_cp_tecnicos_adt)
+        firma_cp = firma_archivo(archivo_codigos_postales)
+
+        metadatos = matriz._leer_metadatos()
+        if metadatos is None or metadatos.get("firma_adt") != firma or metadatos.get("firma_cp") != firma_cp:
+            logger.info("Archivo ADT o listado de códigos postales nuevo o modificado: "
+                        "reconstruyendo la matriz de distancias de técnicos.")
+            metadatos = matriz.construir(cp_tecnicos_adt, df_codigos_postales, firma, firma_cp)
+            if matriz.distancias is not None:
+                return matriz
+
+        matriz._abrir(metadatos)
+        return matriz
+
+    def _leer_metadatos(self):
+        ruta = self._ruta(ARCHIVO_METADATOS)
+        if not (os.path.exists(ruta) and os.path.exists(self._ruta(ARCHIVO_DISTANCIAS))):
+            return None
+        try:
+            with open(ruta, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"No se pudieron leer los metadatos de la matriz de técnicos: {e}")
+            return None
+
+    def construir(self, cp_tecnicos_adt, df_codigos_postales, firma_adt=None, firma_cp=None):
+        """
+        Calcula y guarda en disco las matrices de distancias y duraciones.
+
+        Las duraciones se inicializan a NaN y se rellenan con `registrar_duraciones`
+        a medida que hay datos reales de carretera.
+
+        Returns:
+            dict: Metadatos de la matriz (técnicos, códigos postales y firmas del ADT y del listado).
+        """
+        tecnicos_unicos = cp_tecnicos_adt.drop_duplicates(subset="Nombre Enrutador", keep="first")
+        tecnicos = tecnicos_unicos["Nombre Enrutador"].tolist()
+        cps_casa = tecnicos_unicos["Codigo Postal"].tolist()
+
+        tabla_cp = df_codigos_postales.dropna(subset=["codigo_postal"]).drop_duplicates(subset="codigo_postal", keep="first")
+        codigos = tabla_cp["codigo_postal"].tolist()
+        lat_cp = tabla_cp["Latitud"].to_numpy(dtype=np.float64)
+        lon_cp = tabla_cp["Longitud"].to_numpy(dtype=np.float64)
+
+        coords_cp = tabla_cp.set_index("codigo_postal")[["Latitud", "Longitud"]]
+        coords_casa = coords_cp.reindex(cps_casa)
+        lat_casa = coords_casa["Latitud"].to_numpy(dtype=np.float64)
+        lon_casa = coords_casa["Longitud"].to_numpy(dtype=np.float64)
+
+        # Por bloques de filas para no materializar la matriz completa en float64
+        distancias = np.empty((len(codigos), len(tecnicos)), dtype=np.float32)
+        for inicio in range(0, len(codigos), FILAS_POR_BLOQUE):
+            fin = inicio + FILAS_POR_BLOQUE
+            distancias[inicio:fin] = distancias_pares(lat_cp[inicio:fin], lon_cp[inicio:fin], lat_casa, lon_casa)
+        duraciones = np.full(distancias.shape, np.nan, dtype=np.float32)
+
+        metadatos = {
+            "firma_adt": firma_adt,
+            "firma_cp": firma_cp,
+            "tecnicos": tecnicos,
+            "cp_casa": [cp if isinstance(cp, str) else None for cp in cps_casa],
+            "lat_casa": [None if np.isnan(v) else float(v) for v in lat_casa],
+            "lon_casa": [None if np.isnan(v) else float(v) for v in lon_casa],
+            "codigos": codigos,
+        }
+        try:
+            # Escribir en temporales y sustituir, para no dejar una matriz a medias si algo falla
+            for nombre, valores in ((ARCHIVO_DISTANCIAS, distancias), (ARCHIVO_DURACIONES, duraciones)):
+                temporal = self._ruta(nombre + ".tmp")
+                with open(temporal, "wb") as file:
+                    np.save(file, valores)
+                os.replace(temporal, self._ruta(nombre))
+            with open(self._ruta(ARCHIVO_METADATOS), "w", encoding="utf-8") as file:
+                json.dump(metadatos, file)
+        except OSError as e:
+            # Otra ventana puede tener la matriz anterior mapeada; se trabaja en memoria hasta la próxima vez
+            logger.error(f"[ERROR] No se pudo guardar la matriz de técnicos, se usará en memoria: {e}")
+            self._abrir(metadatos, distancias, duraciones)
+            return metadatos
+
+        logger.info(f"Matriz de técnicos generada: {len(codigos)} códigos postales x {len(tecnicos)} técnicos")
+        return metadatos
+
+    def _abrir(self, metadatos, distancias=None, duraciones=None):
+        self.firma_adt = metadatos.get("firma_adt")
+        self.tecnicos = metadatos["tecnicos"]
+        self.codigos = metadatos["codigos"]
+        self.cp_casa = metadatos.get("cp_casa", [None] * len(self.tecnicos))
+        self.lat_casa = np.array([np.nan if v is None else v for v in metadatos["lat_casa"]], dtype=np.float64)
+        self.lon_casa = np.array([np.nan if v is None else v for v in metadatos["lon_casa"]], dtype=np.float64)
+        self.indice_tecnico = {tecnico: i for i, tecnico in enumerate(self.tecnicos)}
+        self.indice_cp = {cp: i for i, cp in enumerate(self.codigos)}
+
+        if distancias is not None:
+            self.distancias, self.duraciones = distancias, duraciones
+            return
+
+        self.distancias = np.load(self._ruta(ARCHIVO_DISTANCIAS), mmap_mode="r")
+        ruta_duraciones = self._ruta(ARCHIVO_DURACIONES)
+        self.duraciones = np.load(ruta_duraciones, mmap_mode="r+") if os.path.exists(ruta_duraciones) else None
+
+    def distancias_desde(self, codigo_postal=None, lat=None, lon=None):
+        """
+        Devuelve la distancia en km desde cada técnico (en el orden de `self.tecnicos`) hasta un punto.
+
+        Si el código postal está en la matriz, es una lectura directa; si no, se calcula de forma
+        vectorizada a partir de las coordenadas de las casas.
+
+        Args:
+            codigo_postal (str, optional): Código postal de destino.
+            lat (float, optional): Latitud de destino si no hay código postal.
+            lon (float, optional): Longitud de destino si no hay código postal.
+        Returns:
+            np.ndarray: Distancias en km, NaN para técnicos sin coordenadas de casa.
+        """
+        fila = self.indice_cp.get(codigo_postal)
+        if fila is not None:
+            return np.asarray(self.distancias[fila], dtype=np.float64)
+        if lat is None or lon is None:
+            return np.full(len(self.tecnicos), np.nan)
+        return distancia_haversine_np(lat, lon, self.lat_casa, self.lon_casa)
+
+    def duraciones_desde(self, codigo_postal):
+        """Devuelve las duraciones por carretera cacheadas (minutos) desde cada técnico, NaN si no se conocen."""
+        fila = self.indice_cp.get(codigo_postal)
+        if fila is None or self.duraciones is None:
+            return np.full(len(self.tecnicos), np.nan)
+        return np.asarray(self.duraciones[fila], dtype=np.float64)
+
+    def registrar_duraciones(self, codigo_postal, tecnicos, minutos):
+        """
+        Guarda duraciones reales por carretera en la matriz persistente.
+
+        Args:
+            codigo_postal (str): Código postal de destino.
+            tecnicos (list): Nombres de técnico.
+            minutos (list): Duraciones en minutos, en el mismo orden que `tecnicos`.
+        """
+        fila = self.indice_cp.get(codigo_postal)
+        if fila is None or self.duraciones is None:
+            return
+        for tecnico, valor in zip(tecnicos, minutos):
+            columna = self.indice_tecnico.get(tecnico)
+            if columna is not None and valor is not None:
+                self.duraciones[fila, columna] = valor
+        if hasattr(self.duraciones, "flush"):
+            self.duraciones.flush()
+
+    def registrar_duraciones_tecnico(self, tecnico, filas, minutos):
+        """
+        Guarda duraciones reales por carretera desde la casa de un técnico a varios códigos postales.
+
+        Args:
+            tecnico (str): Nombre del técnico.
+            filas (np.ndarray): Índices de los códigos postales en `self.codigos`.
+            minutos (np.ndarray): Duraciones en minutos (NaN donde no se conocen), alineadas con `filas`.
+        """
+        columna = self.indice_tecnico.get(tecnico)
+        if columna is None or self.duraciones is None:
+            return
+        self.duraciones[filas, columna] = minutos
+        if hasattr(self.duraciones, "flush"):
+            self.duraciones.flush()
+
+    def distancias_por_tecnico(self, codigo_postal=None, lat=None, lon=None):
+        """Igual que `distancias_desde`, pero como `pd.Series` indexada por nombre de técnico."""
+        return pd.Series(self.distancias_desde(codigo_postal, lat, lon), index=self.tecnicos)
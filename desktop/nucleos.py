@@ -0,0 +1,281 @@
+# modulos/nucleos.py
+"""
+Núcleos de cálculo de los bucles internos (distancias por pares, huecos entre visitas y
+coste de inserción) con dos implementaciones intercambiables:
+
+- `numpy`: vectorizada, siempre disponible.
+- `numba`: compilada con `@njit(parallel=True)`, sin GIL y usando todos los núcleos.
+  Solo se activa si `numba` está instalado.
+
+El backend se elige al arrancar con la variable de entorno `ENRUTADOR_NUCLEOS`
+(`auto`, `numba` o `numpy`; por defecto `auto`) o con `seleccionar_backend`.
+`verificar_equivalencia` comprueba que ambos dan los mismos resultados; las pruebas de
+`tests/test_nucleos.py` lo hacen para cada backend instalado.
+"""
+import os
+import argparse
+
+import numpy as np
+
+from modulos.logger_config import logger
+from modulos.geo import RADIO_TIERRA_KM, distancia_haversine_np
+
+NANOSEGUNDOS_POR_HORA = 3600 * 10**9
+NANOSEGUNDOS_POR_DIA = 24 * NANOSEGUNDOS_POR_HORA
+VARIABLE_ENTORNO = "ENRUTADOR_NUCLEOS"
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# --- Implementación NumPy -------------------------------------------------------------
+
+def _distancias_pares_numpy(lat1, lon1, lat2, lon2):
+    return distancia_haversine_np(lat1[:, None], lon1[:, None], lat2[None, :], lon2[None, :])
+
+
+def _huecos_entre_visitas_numpy(inicios_ns, fines_ns, indptr):
+    huecos = np.full(len(inicios_ns), np.nan)
+    mismo_dia = np.zeros(len(inicios_ns), dtype=np.bool_)
+    if len(inicios_ns) < 2:
+        return huecos, mismo_dia
+
+    # Pares consecutivos, descartando los que cruzan de un técnico al siguiente
+    ultimo_de_grupo = np.zeros(len(inicios_ns), dtype=np.bool_)
+    ultimo_de_grupo[np.asarray(indptr[1:], dtype=np.int64) - 1] = True
+    validos = ~ultimo_de_grupo[:-1]
+
+    fin_actual = fines_ns[:-1]
+    inicio_siguiente = inicios_ns[1:]
+    huecos[:-1] = np.where(validos, (inicio_siguiente - fin_actual) / NANOSEGUNDOS_POR_HORA, np.nan)
+    mismo_dia[:-1] = validos & (fin_actual // NANOSEGUNDOS_POR_DIA == inicio_siguiente // NANOSEGUNDOS_POR_DIA)
+    return huecos, mismo_dia
+
+
+def _coste_insercion_numpy(lat_prev, lon_prev, lat_sig, lon_sig, lat_nueva, lon_nueva):
+    ida = distancia_haversine_np(lat_prev, lon_prev, lat_nueva, lon_nueva)
+    vuelta = distancia_haversine_np(lat_nueva, lon_nueva, lat_sig, lon_sig)
+    directa = distancia_haversine_np(lat_prev, lon_prev, lat_sig, lon_sig)
+    # Sin visita siguiente (fin de jornada), el coste es solo el trayecto de ida
+    desvio = np.where(np.isnan(vuelta), ida, ida + vuelta - directa)
+    return ida, vuelta, desvio
+
+
+# --- Implementación numba -------------------------------------------------------------
+
+if numba is not None:
+    @numba.njit(cache=True, fastmath=False)
+    def _haversine_escalar(lat1, lon1, lat2, lon2):
+        lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
+        a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+        if np.isnan(a):
+            return np.nan
+        a = min(max(a, 0.0), 1.0)
+        return 2.0 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(a))
+
+    @numba.njit(parallel=True, cache=True)
+    def _distancias_pares_numba(lat1, lon1, lat2, lon2):
+        resultado = np.empty((lat1.shape[0], lat2.shape[0]))
+        for i in numba.prange(lat1.shape[0]):
+            for j in range(lat2.shape[0]):
+                resultado[i, j] = _haversine_escalar(lat1[i], lon1[i], lat2[j], lon2[j])
+        return resultado
+
+    @numba.njit(parallel=True, cache=True)
+    def _huecos_entre_visitas_numba(inicios_ns, fines_ns, indptr):
+        huecos = np.full(inicios_ns.shape[0], np.nan)
+        mismo_dia = np.zeros(inicios_ns.shape[0], dtype=np.bool_)
+        for g in numba.prange(indptr.shape[0] - 1):
+            for i in range(indptr[g], indptr[g + 1] - 1):
+                huecos[i] = (inicios_ns[i + 1] - fines_ns[i]) / NANOSEGUNDOS_POR_HORA
+                mismo_dia[i] = fines_ns[i] // NANOSEGUNDOS_POR_DIA == inicios_ns[i + 1] // NANOSEGUNDOS_POR_DIA
+        return huecos, mismo_dia
+
+    @numba.njit(parallel=True, cache=True)
+    def _coste_insercion_numba(lat_prev, lon_prev, lat_sig, lon_sig, lat_nueva, lon_nueva):
+        n = lat_prev.shape[0]
+        ida, vuelta, desvio = np.empty(n), np.empty(n), np.empty(n)
+        for i in numba.prange(n):
+            ida[i] = _haversine_escalar(lat_prev[i], lon_prev[i], lat_nueva, lon_nueva)
+            vuelta[i] = _haversine_escalar(lat_nueva, lon_nueva, lat_sig[i], lon_sig[i])
+            if np.isnan(vuelta[i]):
+                desvio[i] = ida[i]
+            else:
+                desvio[i] = ida[i] + vuelta[i] - _haversine_escalar(lat_prev[i], lon_prev[i], lat_sig[i], lon_sig[i])
+        return ida, vuelta, desvio
+
+
+_IMPLEMENTACIONES = {
+    "numpy": (_distancias_pares_numpy, _huecos_entre_visitas_numpy, _coste_insercion_numpy),
+}
+if numba is not None:
+    _IMPLEMENTACIONES["numba"] = (_distancias_pares_numba, _huecos_entre_visitas_numba, _coste_insercion_numba)
+
+_backend = None
+
+
+def seleccionar_backend(nombre=None):
+    """
+    Elige la implementación de los núcleos.
+
+    Args:
+        nombre (str, optional): `auto`, `numba` o `numpy`. Por defecto, el valor de
+            `ENRUTADOR_NUCLEOS` o `auto` (numba si está instalado).
+    Returns:
+        str: Backend efectivo.
+    """
+    global _backend
+    nombre = (nombre or os.environ.get(VARIABLE_ENTORNO, "auto")).lower()
+    if nombre == "auto":
+        nombre = "numba" if "numba" in _IMPLEMENTACIONES else "numpy"
+    elif nombre not in _IMPLEMENTACIONES:
+        logger.warning(f"Backend de núcleos '{nombre}' no disponible; se usará numpy.")
+        nombre = "numpy"
+    _backend = nombre
+    logger.debug(f"[DEBUG] Backend de núcleos de cálculo: {_backend}")
+    return _backend
+
+
+def backend_actual():
+    """Devuelve el backend en uso, eligiéndolo la primera vez según `ENRUTADOR_NUCLEOS`."""
+    return _backend or seleccionar_backend()
+
+
+def distancias_pares(lat1, lon1, lat2, lon2):
+    """
+    Matriz de distancias Haversine (km) entre dos conjuntos de puntos.
+
+    Returns:
+        np.ndarray: Matriz (len(lat1), len(lat2)).
+    """
+    args = [np.ascontiguousarray(v, dtype=np.float64) for v in (lat1, lon1, lat2, lon2)]
+    return _IMPLEMENTACIONES[backend_actual()][0](*args)
+
+
+def huecos_entre_visitas(inicios, fines, indptr=None):
+    """
+    Calcula el hueco (en horas) entre el fin de cada visita y el inicio de la siguiente.
+
+    Las visitas deben venir ordenadas por inicio dentro de cada técnico; `indptr` delimita
+    los técnicos (las visitas del técnico `g` son `indptr[g]:indptr[g + 1]`).
+
+    Args:
+        inicios, fines (array-like): Fechas de inicio y fin (datetime64 o enteros en ns).
+        indptr (array-like, optional): Límites por técnico. Por defecto, un único técnico.
+    Returns:
+        tuple: `(huecos, mismo_dia)`. La última visita de cada técnico tiene hueco NaN.
+    """
+    inicios_ns = np.asarray(inicios, dtype="datetime64[ns]").astype(np.int64)
+    fines_ns = np.asarray(fines, dtype="datetime64[ns]").astype(np.int64)
+    indptr = np.asarray([0, len(inicios_ns)] if indptr is None else indptr, dtype=np.int64)
+    huecos, mismo_dia = _IMPLEMENTACIONES[backend_actual()][1](inicios_ns, fines_ns, indptr)
+
+    # Fechas NaT: el hueco no se puede calcular, igual que al restar fechas con pandas
+    nat = np.iinfo(np.int64).min
+    sin_fecha = (fines_ns[:-1] == nat) | (inicios_ns[1:] == nat)
+    if sin_fecha.any():
+        huecos[:-1][sin_fecha] = np.nan
+        mismo_dia[:-1][sin_fecha] = False
+    return huecos, mismo_dia
+
+
+def coste_insercion(lat_prev, lon_prev, lat_sig, lon_sig, lat_nueva, lon_nueva):
+    """
+    Evalúa insertar una visita nueva entre pares de visitas (anterior, siguiente).
+
+    Args:
+        lat_prev, lon_prev (array-like): Coordenadas de las visitas anteriores.
+        lat_sig, lon_sig (array-like): Coordenadas de las visitas siguientes (NaN si no hay).
+        lat_nueva, lon_nueva (float): Coordenadas de la visita nueva.
+    Returns:
+        tuple: Arrays `(ida, vuelta, desvio)` en km: anterior -> nueva, nueva -> siguiente y
+        el kilometraje añadido frente a ir directamente de la anterior a la siguiente.
+    """
+    args = [np.ascontiguousarray(v, dtype=np.float64) for v in (lat_prev, lon_prev, lat_sig, lon_sig)]
+    return _IMPLEMENTACIONES[backend_actual()][2](*args, float(lat_nueva), float(lon_nueva))
+
+
+def backends_disponibles():
+    """Devuelve los nombres de los backends instalados (`numpy` siempre está)."""
+    return list(_IMPLEMENTACIONES)
+
+
+def datos_de_prueba(n=2000, semilla=0):
+    """
+    Datos aleatorios para comparar backends: coordenadas con NaN, visitas de 20 técnicos con
+    límites de grupo (incluidos técnicos de una sola visita), huecos que cruzan la medianoche
+    y fechas NaT.
+
+    Returns:
+        dict: `lat`, `lon`, `inicios`, `fines` (datetime64[ns]) e `indptr`.
+    """
+    rng = np.random.default_rng(semilla)
+    lat = rng.uniform(36.0, 43.5, n)
+    lon = rng.uniform(-9.0, 3.3, n)
+    lat[::11] = np.nan
+    lon[::13] = np.nan
+
+    indptr = np.unique(np.concatenate([[0, n], rng.integers(1, n, 20), [1, 2]]))
+    inicios = rng.integers(0, 30 * NANOSEGUNDOS_POR_DIA, n)
+    for g in range(len(indptr) - 1):
+        inicios[indptr[g]:indptr[g + 1]].sort()
+    fines = inicios + rng.integers(NANOSEGUNDOS_POR_HORA // 2, 3 * NANOSEGUNDOS_POR_HORA, n)
+    inicios = inicios.astype("datetime64[ns]")
+    fines = fines.astype("datetime64[ns]")
+    inicios[::17] = np.datetime64("NaT")
+    fines[::19] = np.datetime64("NaT")
+    return {"lat": lat, "lon": lon, "inicios": inicios, "fines": fines, "indptr": indptr}
+
+
+def verificar_equivalencia(n=2000, semilla=0):
+    """
+    Comprueba, a través de las funciones públicas, que todos los backends disponibles dan los
+    mismos resultados que el de NumPy sobre `datos_de_prueba`.
+
+    Returns:
+        bool: True si todos coinciden. Con solo NumPy instalado no hay nada que comparar y
+        devuelve True; `backends_disponibles()` indica qué se ha comprobado.
+    """
+    datos = datos_de_prueba(n, semilla)
+    lat, lon = datos["lat"], datos["lon"]
+
+    def calcular():
+        return {
+            "distancias_pares": (distancias_pares(lat[:300], lon[:300], lat, lon),),
+            "huecos_entre_visitas": huecos_entre_visitas(datos["inicios"], datos["fines"], datos["indptr"]),
+            "coste_insercion": coste_insercion(lat, lon, lat[::-1], lon[::-1], 40.4, -3.7),
+        }
+
+    global _backend
+    anterior = _backend
+    try:
+        seleccionar_backend("numpy")
+        referencia = calcular()
+        correcto = True
+        for nombre in backends_disponibles():
+            if nombre == "numpy":
+                continue
+            seleccionar_backend(nombre)
+            for kernel, obtenido in calcular().items():
+                iguales = all(np.array_equal(a, b, equal_nan=True) if a.dtype == np.bool_
+                              else np.allclose(a, b, rtol=1e-9, atol=1e-9, equal_nan=True)
+                              for a, b in zip(obtenido, referencia[kernel]))
+                if not iguales:
+                    logger.error(f"[ERROR] El núcleo '{kernel}' de {nombre} no coincide con numpy")
+                correcto &= iguales
+    finally:
+        _backend = anterior
+    return correcto
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comprueba que los backends de núcleos de cálculo son equivalentes.")
+    parser.add_argument("--n", type=int, default=2000, help="Número de puntos aleatorios.")
+    args = parser.parse_args()
+    print(f"Backends disponibles: {', '.join(backends_disponibles())}")
+    if len(backends_disponibles()) < 2:
+        print("Solo está disponible numpy: no hay otro backend con el que comparar.")
+    else:
+        print("Equivalentes" if verificar_equivalencia(args.n) else "NO equivalentes")
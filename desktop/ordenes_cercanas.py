@@ -2,7 +2,7 @@ from PyQt5.QtCore import QCoreApplication, Qt
 QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
 
 from PyQt5.QtWidgets import (QVBoxLayout, QLabel, QLineEdit, QPushButton, 
-                             QScrollArea, QWidget, QHBoxLayout)
+                             QScrollArea, QWidget, QHBoxLayout, QComboBox)
 from PyQt5.QtWebEngineWidgets import QWebEngineView
 from PyQt5.QtCore import QUrl
 
@@ -12,13 +12,17 @@ import warnings
 import os
 
 from modulos.utils import (cargar_listado_codigos_postales, obtener_lat_lon_de_direccion,
-                           calcular_distancia_haversine, obtener_archivo_unico)
+                           obtener_archivo_unico)
 from modulos.logger_config import logger, get_data_dir
-from modulos.tecnicos import get_adjusted_coords
+from modulos.tecnicos import ajustar_coordenadas_superpuestas
+from modulos.fragmentos_geograficos import FragmentosGeograficos
+from modulos.autocompletado import configurar_autocompletado
 
 
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
 
+HOJAS_ZONAS = ["NORTE", "SUR", "ESTE", "LEVANTE", "CENTRO"]
+
 class OrdenesCercanas(QWidget):
 
     def __init__(self):
@@ -34,6 +38,8 @@ class OrdenesCercanas(QWidget):
             self.excel_path = None
 
         self.listado_codigos_postales = self.load_codigos_postales() if self.excel_path else pd.DataFrame()
+        self.fragmentos = FragmentosGeograficos()
+        self.siguiente_indice = 0
         self.data = self.load_data() if self.excel_path else pd.DataFrame()
         self.map_file = os.path.join(get_data_dir(), "map.html")
 
@@ -72,12 +78,26 @@ class OrdenesCercanas(QWidget):
         self.cp_input.setPlaceholderText("Introduce un código postal (ej. 28001)")
         self.cp_input.setFixedSize(400, 40)
         self.cp_input.setStyleSheet("font-size: 16px; border-radius: 5px; padding: 5px; border: 2px solid #046d94;")
+        self.completador_cp = configurar_autocompletado(self.cp_input)
 
         search_button = QPushButton("Buscar", self)
         search_button.setFixedSize(250, 40)
         search_button.setStyleSheet(BUTTON_STYLE)
         search_button.clicked.connect(self.on_buscar_click)
 
+        # Recarga de una sola hoja del ARCHIVO UNICO sin releer las demás zonas
+        self.zona_combo = QComboBox(self)
+        self.zona_combo.addItems(HOJAS_ZONAS)
+        self.zona_combo.setFixedSize(150, 40)
+        self.zona_combo.setStyleSheet("font-size: 16px; border-radius: 5px; padding: 5px; border: 2px solid #046d94;")
+
+        recargar_button = QPushButton("Recargar zona", self)
+        recargar_button.setFixedSize(180, 40)
+        recargar_button.setStyleSheet(BUTTON_STYLE)
+        recargar_button.clicked.connect(self.on_recargar_zona_click)
+
+        input_layout.addWidget(self.zona_combo)
+        input_layout.addWidget(recargar_button)
         input_layout.addStretch()
         input_layout.addWidget(self.cp_input)
         input_layout.addWidget(search_button)
@@ -130,24 +150,80 @@ class OrdenesCercanas(QWidget):
     en un solo DataFrame. Realiza un merge con los códigos postales para agregar coordenadas y
     registra advertencias si hay códigos postales sin coordenadas.
 
+    Cada hoja se indexa además como un fragmento geográfico independiente. Los fragmentos se
+    cortan del DataFrame combinado para que sus filas conserven un índice único entre zonas.
+
     Returns:
         pd.DataFrame: DataFrame combinado con las columnas requeridas y coordenadas.
     """
-        sheet_names = ["NORTE", "SUR", "ESTE", "LEVANTE", "CENTRO"]
-        data_frames = []
-        for sheet in sheet_names:
+        self.listado_codigos_postales["codigo_postal"] = self.listado_codigos_postales["codigo_postal"].astype(str).str.zfill(5)
+        hojas, data_frames = [], []
+        for sheet in HOJAS_ZONAS:
             try:
-                df = pd.read_excel(self.excel_path, sheet_name=sheet)
-                data_frames.append(df)
+                data_frames.append(self.load_zona(sheet))
+                hojas.append(sheet)
             except Exception as e:
                 logger.error(f"Error al leer la hoja {sheet}: {e}")
         combined_data = pd.concat(data_frames, ignore_index=True)
-        combined_data["CP"] = combined_data["CP"].astype(str).str.strip().str.zfill(5)
-        self.listado_codigos_postales["codigo_postal"] = self.listado_codigos_postales["codigo_postal"].astype(str).str.zfill(5)
-        combined_data = combined_data.merge(self.listado_codigos_postales, 
-                                            left_on="CP", right_on="codigo_postal", how="left")
+        self.siguiente_indice = len(combined_data)
+
+        inicio = 0
+        for sheet, df in zip(hojas, data_frames):
+            self.fragmentos.actualizar_fragmento(sheet, combined_data.iloc[inicio:inicio + len(df)])
+            inicio += len(df)
         return combined_data
 
+    def load_zona(self, sheet):
+        """
+    Carga una hoja (zona) del archivo Excel y le añade las coordenadas de su código postal.
+
+    Args:
+        sheet (str): Nombre de la hoja (NORTE, SUR, ESTE, LEVANTE o CENTRO).
+    Returns:
+        pd.DataFrame: Órdenes de la zona con coordenadas.
+    """
+        df = pd.read_excel(self.excel_path, sheet_name=sheet)
+        df["CP"] = df["CP"].astype(str).str.strip().str.zfill(5)
+        return df.merge(self.listado_codigos_postales, left_on="CP", right_on="codigo_postal", how="left")
+
+    def recargar_zona(self, sheet):
+        """
+    Vuelve a leer una sola hoja del Excel y reconstruye únicamente su fragmento, sin recargar
+    el resto de zonas. Las filas nuevas reciben etiquetas de índice que no usa ninguna otra zona.
+
+    Args:
+        sheet (str): Nombre de la hoja a recargar.
+    Returns:
+        int: Número de órdenes de la zona, o None si no se pudo leer la hoja.
+    """
+        try:
+            df = self.load_zona(sheet)
+        except Exception as e:
+            logger.error(f"Error al recargar la hoja {sheet}: {e}")
+            return None
+
+        df.index = pd.RangeIndex(self.siguiente_indice, self.siguiente_indice + len(df))
+        self.siguiente_indice += len(df)
+        anterior = self.fragmentos.fragmentos.get(sheet)
+        if anterior is not None:
+            self.data = self.data.drop(anterior.datos.index, errors="ignore")
+        self.data = pd.concat([self.data, df])
+        self.fragmentos.actualizar_fragmento(sheet, df)
+        logger.info(f"Zona {sheet} recargada en 'Órdenes Cercanas': {len(df)} órdenes")
+        return len(df)
+
+    def on_recargar_zona_click(self):
+        """Recarga la zona elegida en el desplegable y lo indica en el área de resultados."""
+        if not self.excel_path:
+            self.show_message("No se ha encontrado el archivo de órdenes.")
+            return
+        sheet = self.zona_combo.currentText()
+        ordenes = self.recargar_zona(sheet)
+        if ordenes is None:
+            self.show_message(f"No se pudo recargar la zona {sheet}.")
+        else:
+            self.show_message(f"Zona {sheet} recargada: {ordenes} órdenes.")
+
     def load_empty_map(self):
         m = folium.Map(location=[40.4168, -3.7038], zoom_start=6)
         m.save(self.map_file)
@@ -174,15 +250,12 @@ class OrdenesCercanas(QWidget):
         # Guardamos las coordenadas del usuario para mantener el marcador rojo
         self.usuario_lat, self.usuario_lon = lat_usuario, lon_usuario
 
-        data_valid = self.data.dropna(subset=["Latitud", "Longitud"]).copy()
-        if data_valid.empty:
+        # Solo se visitan las zonas que intersectan el radio de búsqueda, ampliándolo si hace falta
+        ordenes_cercanas = self.fragmentos.mas_cercanos(lat_usuario, lon_usuario, 25)
+        if ordenes_cercanas.empty:
             self.show_message("No hay datos válidos con coordenadas para calcular distancias.")
             return
 
-        data_valid["Distancia"] = data_valid.apply(
-            lambda x: calcular_distancia_haversine(lat_usuario, lon_usuario, x["Latitud"], x["Longitud"]), axis=1)
-        ordenes_cercanas = data_valid.sort_values(by="Distancia").head(25)
-
         self.show_results(ordenes_cercanas)
         self.update_map(ordenes_cercanas, lat_usuario, lon_usuario)
 
@@ -233,17 +306,10 @@ class OrdenesCercanas(QWidget):
                 icon=folium.Icon(color="red")
             ).add_to(m)
 
-        coordenadas_contador = {}
-
-        for _, orden in self.ordenes_mostradas.iterrows():
-            coords = (orden["Latitud"], orden["Longitud"])
+        coordenadas_ajustadas = ajustar_coordenadas_superpuestas(self.ordenes_mostradas, adjustment_factor=0.01)
 
-            if coords in coordenadas_contador:
-                coordenadas_contador[coords] += 1
-            else:
-                coordenadas_contador[coords] = 0
-
-            adjusted_coords = get_adjusted_coords(coords, adjustment_factor=0.01, index=coordenadas_contador[coords])
+        for idx, orden in self.ordenes_mostradas.iterrows():
+            adjusted_coords = tuple(coordenadas_ajustadas.loc[idx, ["Latitud", "Longitud"]])
 
             color = "green" if orden["ORDEN"] == row["ORDEN"] else "blue"
 
@@ -277,21 +343,12 @@ class OrdenesCercanas(QWidget):
             icon=folium.Icon(color="red")
         ).add_to(m)
 
-        # Diccionario para contar coordenadas repetidas
-        coordenadas_contador = {}
+        # Desplazamientos de todas las coordenadas repetidas calculados de una vez
+        coordenadas_ajustadas = ajustar_coordenadas_superpuestas(ordenes, adjustment_factor=0.01)
 
         # Generar los marcadores con ajuste de coordenadas
-        for index, (_, row) in enumerate(ordenes.iterrows()):
-            coords = (row["Latitud"], row["Longitud"])
-
-            # Si la coordenada ya existe, aumentar su contador
-            if coords in coordenadas_contador:
-                coordenadas_contador[coords] += 1
-            else:
-                coordenadas_contador[coords] = 0
-
-            # Aplicar desplazamiento usando la función get_adjusted_coords
-            adjusted_coords = get_adjusted_coords(coords, adjustment_factor=0.01, index=coordenadas_contador[coords])
+        for idx, row in ordenes.iterrows():
+            adjusted_coords = tuple(coordenadas_ajustadas.loc[idx, ["Latitud", "Longitud"]])
 
             popup_html = f"""
                 <div style="text-align: center; font-size: 16px; padding: 5px;">
@@ -0,0 +1,150 @@
+# modulos/posicion_flota.py
+import numpy as np
+import pandas as pd
+
+from modulos.logger_config import logger
+from modulos.geo import distancia_haversine_np
+from modulos.nucleos import NANOSEGUNDOS_POR_DIA
+
+SIN_INICIAR = "Sin iniciar"
+EN_VISITA = "En visita"
+EN_DESPLAZAMIENTO = "En desplazamiento"
+JORNADA_FINALIZADA = "Jornada finalizada"
+SIN_VISITAS = "Sin visitas ese día"
+
+
+class PosicionFlota:
+    """
+    Estimador de la posición de todos los técnicos en un instante dado.
+
+    Las visitas se guardan ordenadas por técnico y `FechaHoraInicio` en arrays planos
+    (formato CSR: las visitas del técnico `g` son `indptr[g]:indptr[g + 1]`). Para un
+    instante `t`, solo cuentan las visitas del mismo día que `t`, y la posición de cada técnico es:
+
+    - la de su visita en curso, si `t` cae entre su inicio y su fin;
+    - la interpolación lineal entre dos visitas del día, si está desplazándose;
+    - su casa, si aún no ha empezado la jornada (o su primera visita del día si no se conoce la casa);
+    - la de la última visita del día, si ya ha terminado;
+    - su casa, si ese día no tiene visitas (sin casa conocida, no se sitúa).
+
+    Toda la flota se resuelve con operaciones vectorizadas, sin bucles por técnico.
+    """
+
+    def __init__(self, rutas, columna_tecnico="Res_Label", columnas_coordenadas=("Latitud", "Longitud"), casas=None):
+        """
+        Args:
+            rutas (pd.DataFrame): Visitas con técnico, `FechaHoraInicio`, `FechaHoraFin` y coordenadas.
+            columna_tecnico (str): Columna con el nombre del técnico.
+            columnas_coordenadas (tuple): Columnas de latitud y longitud.
+            casas (pd.DataFrame, optional): Coordenadas de la casa de cada técnico (índice = técnico,
+                columnas `Latitud` y `Longitud`). Los técnicos que solo aparecen aquí se sitúan en casa.
+        """
+        columna_lat, columna_lon = columnas_coordenadas
+        visitas = rutas.dropna(subset=[columna_tecnico, "FechaHoraInicio", "FechaHoraFin", columna_lat, columna_lon])
+        visitas = visitas.sort_values([columna_tecnico, "FechaHoraInicio"], kind="stable")
+
+        tecnicos = visitas[columna_tecnico].to_numpy()
+        cambios = np.flatnonzero(tecnicos[1:] != tecnicos[:-1]) + 1
+        if len(tecnicos):
+            self.indptr = np.concatenate([[0], cambios, [len(tecnicos)]]).astype(np.int64)
+        else:
+            self.indptr = np.zeros(1, dtype=np.int64)
+        self.tecnicos = tecnicos[self.indptr[:-1]]
+
+        self.inicio = visitas["FechaHoraInicio"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        self.fin = visitas["FechaHoraFin"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        self.lat = visitas[columna_lat].to_numpy(dtype=np.float64)
+        self.lon = visitas[columna_lon].to_numpy(dtype=np.float64)
+        self.visitas = visitas.reset_index(drop=True)
+
+        casas = pd.DataFrame(columns=["Latitud", "Longitud"]) if casas is None else casas
+        casas = casas[~casas.index.duplicated(keep="first")].dropna(subset=["Latitud", "Longitud"])
+        self.casas_sin_visitas = casas[~casas.index.isin(self.tecnicos)]
+        casas = casas.reindex(self.tecnicos)
+        self.lat_casa = casas["Latitud"].to_numpy(dtype=np.float64)
+        self.lon_casa = casas["Longitud"].to_numpy(dtype=np.float64)
+
+        logger.debug(f"[DEBUG] Estimador de posición creado con {len(self.tecnicos)} técnicos y {len(visitas)} visitas")
+
+    def __len__(self):
+        return len(self.tecnicos)
+
+    def posiciones_en(self, momento):
+        """
+        Estima dónde está cada técnico en `momento`.
+
+        Args:
+            momento (datetime | pd.Timestamp): Instante de la consulta.
+        Returns:
+            pd.DataFrame: Una fila por técnico (índice = técnico) con `Latitud`, `Longitud`,
+            `Estado` y `Visita` (posición de la última visita empezada ese día, -1 si ninguna).
+            Los técnicos sin visitas ese día ni casa conocida no aparecen.
+        """
+        columnas = ["Latitud", "Longitud", "Estado", "Visita"]
+        t = pd.Timestamp(momento).to_datetime64().astype("datetime64[ns]").astype(np.int64)
+        inicio_dia = t - t % NANOSEGUNDOS_POR_DIA
+        solo_casa = pd.DataFrame({
+            "Latitud": self.casas_sin_visitas["Latitud"].to_numpy(dtype=np.float64),
+            "Longitud": self.casas_sin_visitas["Longitud"].to_numpy(dtype=np.float64),
+            "Estado": SIN_VISITAS,
+            "Visita": -1,
+        }, index=pd.Index(self.casas_sin_visitas.index, name="Tecnico"))
+        if not len(self.tecnicos):
+            return solo_casa[columnas]
+
+        # Las visitas de cada técnico están ordenadas: las de antes del día, las del día y las
+        # empezadas en `t` son prefijos de su tramo
+        primera = self.indptr[:-1]
+        previas = np.add.reduceat((self.inicio < inicio_dia).astype(np.int64), primera)
+        hasta_fin_dia = np.add.reduceat((self.inicio < inicio_dia + NANOSEGUNDOS_POR_DIA).astype(np.int64), primera)
+        empezadas = np.add.reduceat((self.inicio <= t).astype(np.int64), primera)
+
+        primera_dia = primera + previas
+        ultima_dia = primera + hasta_fin_dia - 1
+        con_visitas = hasta_fin_dia > previas
+        sin_iniciar = con_visitas & (empezadas == previas)
+        actual = primera + empezadas - 1
+        actual_segura = np.where(con_visitas & ~sin_iniciar, actual, np.minimum(primera_dia, self.indptr[1:] - 1))
+        siguiente = np.minimum(actual_segura + 1, np.maximum(ultima_dia, actual_segura))
+
+        en_visita = con_visitas & ~sin_iniciar & (t <= self.fin[actual_segura])
+        en_desplazamiento = con_visitas & ~sin_iniciar & ~en_visita & (actual_segura < ultima_dia)
+
+        duracion_tramo = (self.inicio[siguiente] - self.fin[actual_segura]).astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraccion = np.clip((t - self.fin[actual_segura]) / duracion_tramo, 0.0, 1.0)
+        fraccion = np.where(en_desplazamiento & (duracion_tramo > 0), fraccion, 0.0)
+
+        lat = self.lat[actual_segura] + fraccion * (self.lat[siguiente] - self.lat[actual_segura])
+        lon = self.lon[actual_segura] + fraccion * (self.lon[siguiente] - self.lon[actual_segura])
+
+        # Antes de empezar la jornada, o sin visitas ese día, en casa
+        en_casa = (sin_iniciar | ~con_visitas) & ~np.isnan(self.lat_casa)
+        lat = np.where(en_casa, self.lat_casa, np.where(con_visitas, lat, np.nan))
+        lon = np.where(en_casa, self.lon_casa, np.where(con_visitas, lon, np.nan))
+
+        estado = np.select([~con_visitas, sin_iniciar, en_visita, en_desplazamiento],
+                           [SIN_VISITAS, SIN_INICIAR, EN_VISITA, EN_DESPLAZAMIENTO], default=JORNADA_FINALIZADA)
+
+        posiciones = pd.DataFrame({
+            "Latitud": lat,
+            "Longitud": lon,
+            "Estado": estado,
+            "Visita": np.where(con_visitas & ~sin_iniciar, actual, -1),
+        }, index=pd.Index(self.tecnicos, name="Tecnico"))
+        posiciones = posiciones.dropna(subset=["Latitud", "Longitud"])
+        if solo_casa.empty:
+            return posiciones
+        return pd.concat([posiciones, solo_casa[columnas]])
+
+    def mas_cercanos(self, lat, lon, momento, n=5):
+        """
+        Devuelve los `n` técnicos más cercanos a un punto en `momento`.
+
+        Returns:
+            pd.DataFrame: Posiciones estimadas con la columna `Distancia` (km), ordenadas.
+        """
+        posiciones = self.posiciones_en(momento)
+        posiciones["Distancia"] = distancia_haversine_np(lat, lon, posiciones["Latitud"].to_numpy(),
+                                                         posiciones["Longitud"].to_numpy())
+        return posiciones.sort_values("Distancia", kind="stable").head(n)
@@ -0,0 +1,251 @@
+# modulos/precalentamiento.py
+import glob
+import re
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import QObject, QEvent
+
+from modulos.logger_config import logger, LOG_FILE_PATH
+from modulos.cache_rutas import franja_horaria
+from modulos.geo import distancia_haversine_np
+from modulos.utils import obtener_lat_lon_de_direccion, limpiar_direccion, formatear_codigo_postal
+
+SEGUNDOS_INACTIVIDAD = 20      # Sin teclado ni ratón durante este tiempo se considera que la aplicación está ociosa
+ESPERA_COMPROBACION = 5        # Segundos entre comprobaciones mientras el usuario está activo
+MAX_PARES = 2000               # Pares por franja horaria, para no gastar la cuota en trayectos improbables
+TAMANO_LOTE_DESTINOS = 10      # Destinos de un mismo origen por consulta de matriz
+RADIO_KM = 200                 # El mismo radio que usa "Buscar Hueco" al filtrar por proximidad
+PESO_BUSQUEDA = 5              # Un código postal buscado pesa como cinco visitas
+RESERVA_CUOTA = 0.5            # Parte de la cuota diaria que se deja para las consultas interactivas
+                               # (las claves sin `rpd` no se usan en segundo plano)
+# Línea que escribe "Buscar Hueco" en el log; `\S*` admite la "ó" perdida si el log no está en UTF-8
+PATRON_BUSQUEDA = re.compile(r"hueco en el c\S*digo postal (\d{5})")
+
+EVENTOS_ENTRADA = (QEvent.KeyPress, QEvent.MouseButtonPress, QEvent.MouseMove, QEvent.Wheel)
+
+
+def codigos_buscados(ruta_log=LOG_FILE_PATH):
+    """
+    Cuenta los códigos postales buscados en "Buscar Hueco" según el log de uso
+    (el actual y el de la semana anterior).
+
+    Returns:
+        Counter: Número de búsquedas por código postal.
+    """
+    busquedas = Counter()
+    for ruta in glob.glob(f"{ruta_log}*"):
+        try:
+            with open(ruta, "r", encoding="utf-8", errors="ignore") as archivo:
+                for linea in archivo:
+                    coincidencia = PATRON_BUSQUEDA.search(linea)
+                    if coincidencia:
+                        busquedas[coincidencia.group(1)] += 1
+        except OSError as e:
+            logger.error(f"[ERROR] No se pudo leer el log de uso {ruta}: {e}")
+    return busquedas
+
+
+def pares_probables(rutas_tecnicos, cp_tecnicos_adt, df_codigos_postales, busquedas, max_pares=MAX_PARES):
+    """
+    Ordena los trayectos que con más probabilidad se van a consultar:
+
+    - De la dirección de cada visita a los códigos postales buscados ("Buscar Hueco").
+    - De la casa de cada técnico a los códigos postales de las visitas y de las búsquedas
+      ("Buscar Técnico", "Rutas Urgentes").
+
+    El peso de un par es el producto de las visitas y búsquedas de sus extremos; se descartan
+    los pares a más de `RADIO_KM` en línea recta. Las coordenadas se resuelven igual que en las
+    búsquedas, para que coincidan con sus claves en la caché.
+
+    Args:
+        rutas_tecnicos (pd.DataFrame): Visitas del ExportBase con la columna `Direcciones`.
+        cp_tecnicos_adt (pd.DataFrame): Técnicos con su `Codigo Postal` de casa.
+        df_codigos_postales (pd.DataFrame): Códigos postales con sus coordenadas.
+        busquedas (Counter): Búsquedas por código postal, p. ej. de `codigos_buscados()`.
+        max_pares (int): Número máximo de pares devueltos.
+    Returns:
+        list: `((lat_origen, lon_origen), (lat_destino, lon_destino))` de más a menos probable.
+    """
+    def coordenadas(pesos):
+        puntos, valores = [], []
+        for direccion, peso in pesos.items():
+            lat, lon = obtener_lat_lon_de_direccion(direccion, df_codigos_postales)
+            if lat is not None and lon is not None:
+                puntos.append((float(lat), float(lon)))
+                valores.append(float(peso))
+        return np.array(puntos, dtype=float).reshape(-1, 2), np.array(valores, dtype=float)
+
+    visitas = rutas_tecnicos['Direcciones'].dropna().value_counts()
+    cp_visitas = rutas_tecnicos['Direcciones'].map(limpiar_direccion).dropna().value_counts()
+    casas = cp_tecnicos_adt['Codigo Postal'].dropna().map(formatear_codigo_postal).value_counts()
+    buscados = pd.Series(busquedas, dtype=float) * PESO_BUSQUEDA
+
+    grupos = [
+        (coordenadas(visitas), coordenadas(buscados)),
+        (coordenadas(casas), coordenadas(cp_visitas.add(buscados, fill_value=0))),
+    ]
+
+    candidatos = []
+    for (origenes, peso_origenes), (destinos, peso_destinos) in grupos:
+        if not len(origenes) or not len(destinos):
+            continue
+        recta = distancia_haversine_np(origenes[:, None, 0], origenes[:, None, 1], destinos[None, :, 0], destinos[None, :, 1])
+        peso = peso_origenes[:, None] * peso_destinos[None, :]
+        i, j = np.nonzero((recta <= RADIO_KM) & (recta > 0))
+        candidatos.extend(zip(-peso[i, j], recta[i, j], map(tuple, origenes[i].tolist()), map(tuple, destinos[j].tolist())))
+
+    # Más peso primero y, a igual peso, los más cercanos
+    candidatos.sort(key=lambda c: (c[0], c[1]))
+    pares, vistos = [], set()
+    for _, _, origen, destino in candidatos:
+        if (origen, destino) not in vistos:
+            vistos.add((origen, destino))
+            pares.append((origen, destino))
+            if len(pares) >= max_pares:
+                break
+    return pares
+
+
+class DetectorInactividad(QObject):
+    """
+    Filtro de eventos de la aplicación que anota la última pulsación de teclado o ratón, para
+    saber si el usuario está usando la aplicación. Se instala con
+    `QApplication.instance().installEventFilter(detector)`.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.ultima_actividad = time.monotonic()
+
+    def eventFilter(self, objeto, evento):
+        if evento.type() in EVENTOS_ENTRADA:
+            self.ultima_actividad = time.monotonic()
+        return False
+
+    def inactivo(self, segundos=SEGUNDOS_INACTIVIDAD):
+        return time.monotonic() - self.ultima_actividad >= segundos
+
+
+class Precalentador:
+    """
+    Tarea en segundo plano que, mientras la aplicación está ociosa, pide por matriz las
+    distancias de los trayectos más probables (`pares_probables`) para que las búsquedas
+    interactivas encuentren la caché caliente.
+
+    Pide solo los pares elegidos, agrupados por origen en lotes de `TAMANO_LOTE_DESTINOS` destinos.
+    Antes de cada lote se pausa si el usuario vuelve a estar activo y se detiene si no queda ninguna
+    API con cuota de sobra: un motor local o una clave con `rpd` que conserve más de la mitad.
+    Después, con el mismo criterio, va completando las isócronas y la tabla de hitos si se le han dado.
+    Se repite al cambiar de franja horaria para recoger las búsquedas nuevas del log; los pares que
+    ya están en la caché (de cualquier franja vigente) no se vuelven a pedir.
+    """
+
+    def __init__(self, api_manager, inactivo=None):
+        """
+        Args:
+            api_manager (APIManager): Gestor de APIs cuya caché se calienta.
+            inactivo (callable, optional): Devuelve True si la aplicación está ociosa; por
+                defecto se considera siempre ociosa.
+        """
+        self.api_manager = api_manager
+        self.inactivo = inactivo or (lambda: True)
+        self.pares_consultados = 0
+        self._datos = None
+        self._tablas = []
+        self._hilo = None
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._nuevos_datos = threading.Event()
+
+    def programar(self, rutas_tecnicos, cp_tecnicos_adt, df_codigos_postales, hitos=None, isocronas=None):
+        """
+        Indica los datos del ExportBase recién cargado y arranca la tarea si no estaba en marcha.
+        Si ya lo estaba, los pares se recalculan con los nuevos datos.
+
+        Args:
+            hitos (Hitos, optional): Tabla de hitos que completar en los ratos libres.
+            isocronas (Isocronas, optional): Isócronas de los técnicos que completar en los ratos libres.
+        """
+        with self._lock:
+            self._datos = (rutas_tecnicos, cp_tecnicos_adt, df_codigos_postales)
+            self._tablas = [tabla for tabla in (isocronas, hitos) if tabla is not None]
+            self._nuevos_datos.set()
+            if self._hilo is None or not self._hilo.is_alive():
+                self._detener.clear()
+                self._hilo = threading.Thread(target=self._ejecutar, name="precalentamiento", daemon=True)
+                self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._nuevos_datos.set()
+
+    def _esperar_inactividad(self):
+        """Espera a que la aplicación esté ociosa. Devuelve False si hay que parar."""
+        while not self.inactivo():
+            if self._detener.wait(ESPERA_COMPROBACION):
+                return False
+        return not self._detener.is_set()
+
+    def _ejecutar(self):
+        try:
+            while not self._detener.is_set():
+                self._nuevos_datos.clear()
+                franja = franja_horaria()
+                with self._lock:
+                    datos = self._datos
+                pares = pares_probables(*datos, codigos_buscados())
+                self._calentar(pares, franja)
+                self._completar_tablas(franja)
+                # Lo recién pedido también afina las estimaciones sin API
+                self.api_manager.recalibrar_estimador()
+
+                # Hasta que cambie la franja horaria o lleguen datos nuevos
+                while franja_horaria() == franja and not self._nuevos_datos.is_set():
+                    self._nuevos_datos.wait(60)
+        except Exception as e:
+            logger.error(f"[ERROR] Error en el precalentamiento de distancias: {e}")
+
+    def _completar_tablas(self, franja):
+        """Completa las isócronas y la tabla de hitos poco a poco mientras la aplicación siga ociosa."""
+        with self._lock:
+            tablas = list(self._tablas)
+        for tabla in tablas:
+            while True:
+                if not self._esperar_inactividad() or self._nuevos_datos.is_set() or franja_horaria() != franja:
+                    return
+                if not self.api_manager.cuota_disponible(RESERVA_CUOTA):
+                    return
+                if not tabla.completar(self.api_manager, reserva_cuota=RESERVA_CUOTA):
+                    logger.debug(f"[DEBUG] {type(tabla).__name__} completada en esta sesión; "
+                                 f"pendiente: {tabla.pendiente():.1%}")
+                    break
+
+    def _calentar(self, pares, franja):
+        """
+        Pide las distancias de `pares` agrupadas por origen (una fila de matriz por consulta),
+        empezando por los orígenes de los pares más probables.
+        """
+        inicio = time.monotonic()
+        consultados = 0
+        por_origen = {}
+        for origen, destino in pares:
+            por_origen.setdefault(origen, []).append(destino)
+
+        for origen, destinos in por_origen.items():
+            for k in range(0, len(destinos), TAMANO_LOTE_DESTINOS):
+                if not self._esperar_inactividad() or self._nuevos_datos.is_set() or franja_horaria() != franja:
+                    return
+                if not self.api_manager.cuota_disponible(RESERVA_CUOTA):
+                    logger.info("Precalentamiento detenido para conservar la cuota diaria")
+                    return
+                lote = destinos[k:k + TAMANO_LOTE_DESTINOS]
+                self.api_manager.obtener_matriz([origen], lote, estimar=False, reserva_cuota=RESERVA_CUOTA)
+                consultados += len(lote)
+                self.pares_consultados += len(lote)
+
+        logger.debug(f"[DEBUG] Precalentamiento de la franja {franja}: {len(pares)} pares probables, "
+                     f"{consultados} consultados en {time.monotonic() - inicio:.1f} s")
@@ -0,0 +1,54 @@
+# modulos/presupuesto.py
+import time
+from contextlib import contextmanager
+
+from modulos.logger_config import logger
+
+TOLERANCIA_SEGUNDOS = 0.05  # Margen antes de dar por excedida una etapa (lo que tarda en cortar)
+
+
+class Presupuesto:
+    """
+    Plazo total de una operación (p. ej. una búsqueda de huecos) que se reparte entre sus
+    etapas y las consultas a las APIs que hacen. Cuando se agota, quien lo recibe debe dejar
+    de esperar y devolver lo que tenga (resultados parciales o estimados).
+
+    Cada etapa recibe una parte del tiempo que queda y, si la supera, se anota en el log.
+    """
+
+    def __init__(self, segundos, nombre="operación", limite=None):
+        self.segundos = float(segundos)
+        self.nombre = nombre
+        self.inicio = time.monotonic()
+        self.limite = limite if limite is not None else self.inicio + self.segundos
+
+    def restante(self):
+        """Segundos que quedan (0 si ya se ha agotado)."""
+        return max(self.limite - time.monotonic(), 0.0)
+
+    def agotado(self):
+        return self.restante() <= 0
+
+    @contextmanager
+    def etapa(self, nombre, fraccion=1.0):
+        """
+        Reserva para una etapa `fraccion` del tiempo que queda.
+
+        Args:
+            nombre (str): Nombre de la etapa para el log.
+            fraccion (float): Parte del tiempo restante asignada (1.0 = todo lo que queda).
+        Yields:
+            Presupuesto: Presupuesto de la etapa, con su propio límite dentro del total.
+        """
+        asignado = self.restante() * fraccion
+        inicio = time.monotonic()
+        sub = Presupuesto(asignado, f"{self.nombre}/{nombre}", limite=min(inicio + asignado, self.limite))
+        try:
+            yield sub
+        finally:
+            usado = time.monotonic() - inicio
+            if usado > asignado + TOLERANCIA_SEGUNDOS:
+                logger.warning(f"{self.nombre}: la etapa '{nombre}' ha tardado {usado:.2f} s "
+                               f"de {asignado:.2f} s asignados")
+            else:
+                logger.debug(f"[DEBUG] {self.nombre}: etapa '{nombre}' en {usado:.2f} s de {asignado:.2f} s")
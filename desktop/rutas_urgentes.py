@@ -1,16 +1,41 @@
 # modulos/rutas_urgentes.py
 import pandas as pd
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QHBoxLayout, QScrollArea
-from PyQt5.QtCore import Qt
-from datetime import time
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from datetime import time, datetime
 
 from modulos.utils import (obtener_lat_lon_de_direccion, calcular_distancia_haversine, 
-                           cargar_configuracion, formatear_codigo_postal)
+                           cargar_configuracion, formatear_codigo_postal, obtener_distancias_reales,
+                           nombres_adt_de_rutas)
 
 from modulos.logger_config import logger
-from modulos.api_manager import APIManager
+from modulos.api_manager import obtener_api_manager
+from modulos.vecinos_cp import VecinosCP
+from modulos.autocompletado import configurar_autocompletado
+from modulos.posicion_flota import PosicionFlota
+from modulos.isocronas import Isocronas
+from modulos.matriz_tecnicos import firma_archivo
+
+api_manager = obtener_api_manager()
+
+ALCANCE_URGENTE_MINUTOS = 45  # Técnicos que llegan desde casa en este tiempo, según sus isócronas
+
+
+class HiloDistanciasReales(QThread):
+    """
+    Calcula las distancias por carretera de varios trayectos (`obtener_distancias_reales`) fuera
+    del hilo de la interfaz y las emite en `terminado` junto con el número de consulta.
+    """
+    terminado = pyqtSignal(int, object)
+
+    def __init__(self, consulta, pares, parent=None):
+        super().__init__(parent)
+        self.consulta = consulta
+        self.pares = pares
+
+    def run(self):
+        self.terminado.emit(self.consulta, obtener_distancias_reales(self.pares))
 
-api_manager = APIManager()
 
 class RutasUrgentesWindow(QWidget):
     def __init__(self):
@@ -23,6 +48,13 @@ class RutasUrgentesWindow(QWidget):
         self.rutas_tecnicos = None
         self.duracion_nueva_visita = None
         self.rutas_tecnicos_local = None
+        self.vecinos_cp = VecinosCP.cargar()
+        self.flota = None
+        self.coordenadas_usuario = None
+        self.tecnicos_alcance = []
+        # Cada cambio de día invalida las distancias por carretera aún en curso
+        self.consulta_distancias = 0
+        self.hilos_distancias = []
 
     def init_ui(self):
         """
@@ -62,6 +94,7 @@ class RutasUrgentesWindow(QWidget):
         self.cp_input.setPlaceholderText("Ejemplo: 28001 (Madrid)")
         self.cp_input.setFixedSize(400, 40)
         self.cp_input.setStyleSheet("font-size: 16px; border-radius: 5px; padding: 5px; border: 2px solid #046d94;")
+        self.completador_cp = configurar_autocompletado(self.cp_input)
 
         self.duracion_input = QLineEdit(self)
         self.duracion_input.setPlaceholderText("Duración de la visita en horas (ej. 1.5)")
@@ -126,6 +159,15 @@ class RutasUrgentesWindow(QWidget):
         self.setLayout(self.layout)
 
             
+    def closeEvent(self, event):
+        """
+    Espera a las consultas de distancias por carretera en curso antes de cerrar, para no
+    destruir sus hilos mientras se ejecutan.
+    """
+        for hilo in list(self.hilos_distancias):
+            hilo.wait()
+        super().closeEvent(event)
+
     def reset_result_area(self):
         """
     Limpia el área de resultados eliminando todos los widgets existentes.
@@ -211,18 +253,43 @@ class RutasUrgentesWindow(QWidget):
         self.rutas_tecnicos = self.rutas_tecnicos.dropna(subset=['Latitud', 'Longitud'])
         self.rutas_tecnicos = self.rutas_tecnicos[~self.rutas_tecnicos['Res_Label'].str.startswith('Pendiente RECUR')]
 
+        # Técnicos que llegan desde casa a tiempo: lectura de un bit por técnico en las isócronas
+        # (solo si están al día con el archivo ADT actual)
+        isocronas = Isocronas.cargar(firma_archivo(configuracion.get('archivo_cp_tecnicos_adt')))
+        self.tecnicos_alcance = isocronas.tecnicos_que_alcanzan(cp_usuario, ALCANCE_URGENTE_MINUTOS) if isocronas else []
+
+        # Posición estimada de toda la flota, antes de recortar las órdenes por distancia
+        casas = self.obtener_casas_tecnicos(configuracion.get('archivo_cp_tecnicos_adt'), df_codigos_postales,
+                                            self.rutas_tecnicos['Res_Label'])
+        self.flota = PosicionFlota(self.rutas_tecnicos, casas=casas)
+        self.coordenadas_usuario = (lat_usuario, lon_usuario)
+
+        # Filtrar órdenes para que solo se incluyan las que estén dentro de una distancia máxima permitida (por ejemplo, 100 km)
+        distancia_maxima_permitida = 100  # Puedes ajustar este valor según sea necesario
+
+        def distancia_en_linea_recta(rutas):
+            return rutas.apply(
+                lambda x: calcular_distancia_haversine(lat_usuario, lon_usuario, x['Latitud'], x['Longitud'])
+                if pd.notna(x['Latitud']) and pd.notna(x['Longitud']) else None,
+                axis=1
+            )
+
         # Calcular la distancia al código postal introducido
-        self.rutas_tecnicos['Distancia_lat_long'] = self.rutas_tecnicos.apply(
-            lambda x: calcular_distancia_haversine(lat_usuario, lon_usuario, x['Latitud'], x['Longitud'])
-            if pd.notna(x['Latitud']) and pd.notna(x['Longitud']) else None,
-            axis=1
-        )
+        if (self.vecinos_cp is not None and self.vecinos_cp.cubre_radio(distancia_maxima_permitida)
+                and self.vecinos_cp.contiene(cp_usuario)):
+            # Consulta directa al índice de vecinos: los códigos fuera del radio quedan como NaN
+            distancias_cp = self.vecinos_cp.distancias_desde(cp_usuario, distancia_maxima_permitida)
+            self.rutas_tecnicos['Distancia_lat_long'] = self.rutas_tecnicos['codigo_postal'].map(distancias_cp)
+            # Las órdenes con códigos que el índice no conoce (generado con un listado anterior), en línea recta
+            sin_indice = ~self.rutas_tecnicos['codigo_postal'].isin(self.vecinos_cp.codigos)
+            if sin_indice.any():
+                self.rutas_tecnicos.loc[sin_indice, 'Distancia_lat_long'] = distancia_en_linea_recta(self.rutas_tecnicos[sin_indice])
+        else:
+            self.rutas_tecnicos['Distancia_lat_long'] = distancia_en_linea_recta(self.rutas_tecnicos)
 
         # Eliminar filas con distancias no válidas y ordenar por distancia
         self.rutas_tecnicos = self.rutas_tecnicos.dropna(subset=['Distancia_lat_long']).sort_values(by=['Distancia_lat_long']).reset_index(drop=True)
 
-        # Filtrar órdenes para que solo se incluyan las que estén dentro de una distancia máxima permitida (por ejemplo, 100 km)
-        distancia_maxima_permitida = 100  # Puedes ajustar este valor según sea necesario
         self.rutas_tecnicos = self.rutas_tecnicos[self.rutas_tecnicos['Distancia_lat_long'] <= distancia_maxima_permitida]
 
         # Verificar si hay órdenes disponibles después del filtrado
@@ -262,10 +329,86 @@ class RutasUrgentesWindow(QWidget):
         for _, row in rutas_tecnicos_dia.iterrows():
             self.mostrar_estadisticas_tecnico(row)
 
+        self.mostrar_tecnicos_cercanos(fecha)
+
         self.status_label.setText("Órdenes cercanas encontradas.")
         self.status_label.setStyleSheet("color: green;")
 
 
+    def mostrar_tecnicos_cercanos(self, fecha, num_tecnicos=3):
+        """
+    Muestra los técnicos que estarán más cerca del código postal en la fecha indicada, a la hora actual,
+    según la posición estimada de cada uno (visita en curso o desplazamiento entre visitas).
+    Args:
+        fecha (datetime.date): Fecha de la consulta.
+        num_tecnicos (int): Número de técnicos a mostrar.
+    """
+        if self.flota is None or not len(self.flota) or self.coordenadas_usuario is None:
+            return
+
+        momento = datetime.combine(fecha, datetime.now().time())
+        lat_usuario, lon_usuario = self.coordenadas_usuario
+        cercanos = self.flota.mas_cercanos(lat_usuario, lon_usuario, momento, n=num_tecnicos)
+
+        # Primero en línea recta; la distancia por carretera de todos los técnicos a la vez
+        # se pide en otro hilo y sustituye al texto cuando llega
+        label = QLabel(self.texto_tecnicos_cercanos(momento, cercanos))
+        label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        label.setWordWrap(True)
+        label.setStyleSheet("font-size: 15px;")
+        self.result_layout.addWidget(label)
+
+        self.consulta_distancias += 1
+        pares = [(posicion["Latitud"], posicion["Longitud"], lat_usuario, lon_usuario) for _, posicion in cercanos.iterrows()]
+        hilo = HiloDistanciasReales(self.consulta_distancias, pares, self)
+        hilo.terminado.connect(
+            lambda consulta, rutas_reales: self.actualizar_tecnicos_cercanos(consulta, label, momento, cercanos, rutas_reales))
+        hilo.finished.connect(lambda: self.hilos_distancias.remove(hilo))
+        self.hilos_distancias.append(hilo)
+        hilo.start()
+
+    def actualizar_tecnicos_cercanos(self, consulta, label, momento, cercanos, rutas_reales):
+        """Pone las distancias por carretera en el recuadro de técnicos cercanos si sigue siendo el de la consulta actual."""
+        if consulta != self.consulta_distancias:
+            return
+        try:
+            label.setText(self.texto_tecnicos_cercanos(momento, cercanos, rutas_reales))
+        except RuntimeError:
+            # El recuadro ya se ha borrado al limpiar los resultados
+            pass
+
+    def texto_tecnicos_cercanos(self, momento, cercanos, rutas_reales=None):
+        """
+    Compone el recuadro de técnicos cercanos.
+    Args:
+        momento (datetime): Instante de la posición estimada.
+        cercanos (pd.DataFrame): Técnicos más cercanos (`PosicionFlota.mas_cercanos`).
+        rutas_reales (list, optional): `(distancia, duracion)` por carretera de cada técnico; sin
+            ellas se muestra la distancia en línea recta.
+    Returns:
+        str: HTML del recuadro.
+    """
+        rutas_reales = rutas_reales or [(None, None)] * len(cercanos)
+        filas = []
+        for (tecnico, posicion), (distancia_real, duracion_real) in zip(cercanos.iterrows(), rutas_reales):
+            if distancia_real is not None and duracion_real is not None:
+                distancia = f"{distancia_real:.2f} km por carretera, {duracion_real:.0f} min"
+            else:
+                distancia = f"{posicion['Distancia']:.2f} km"
+            filas.append(f"<p><b>&nbsp;&nbsp;&nbsp;&nbsp;👨‍🔧 {tecnico}:</b> {distancia} ({posicion['Estado']})</p>")
+        if self.tecnicos_alcance:
+            filas.append(f"<p><b>&nbsp;&nbsp;&nbsp;&nbsp;🏠 Llegan desde casa en {ALCANCE_URGENTE_MINUTOS} min:</b> "
+                         f"{', '.join(self.tecnicos_alcance)}</p>")
+        filas = "".join(filas)
+        return (
+            f"<div style='border-radius: 10px; background-color: #eef6fa; padding: 15px; margin: 10px 0; "
+            f"border: 1px solid #ccc; font-size: 14px;'>"
+            f"<h3 style='color: #046d94; margin-bottom: 5px;'>📍 Técnicos más cercanos a las {momento.strftime('%H:%M')} "
+            f"del {momento.strftime('%d-%m-%Y')}</h3>"
+            f"{filas}"
+            f"</div>"
+        )
+
     def obtener_rutas_tecnicos(self, archivo_excel):
         """
     Carga las rutas de los técnicos desde un archivo Excel, combinándolas con coordenadas geográficas,
@@ -290,6 +433,42 @@ class RutasUrgentesWindow(QWidget):
 
         return df
 
+    def obtener_casas_tecnicos(self, archivo_cp_tecnicos_adt, df_codigos_postales, res_labels=None):
+        """
+    Obtiene las coordenadas de la casa de cada técnico a partir del código postal del archivo ADT.
+    Args:
+        archivo_cp_tecnicos_adt (str): Ruta del archivo "CODIGOS POSTALES TECNICOS ADT".
+        df_codigos_postales (pd.DataFrame): Códigos postales con sus coordenadas.
+        res_labels (pd.Series, optional): Nombres de los técnicos en las rutas; las casas de los que
+            se emparejan con el ADT se indexan por ese nombre, como las visitas de `PosicionFlota`.
+    Returns:
+        pd.DataFrame: `Latitud` y `Longitud` por técnico (índice = `Res_Label` o, sin rutas,
+        `Nombre Enrutador`); None si no se puede leer.
+    """
+        try:
+            cp_tecnicos_adt = pd.read_excel(archivo_cp_tecnicos_adt, sheet_name='Hoja1')
+        except Exception as e:
+            logger.error(f"[ERROR] No se pudieron leer las casas de los técnicos: {e}")
+            return None
+
+        coords_cp = df_codigos_postales.drop_duplicates(subset='codigo_postal', keep='first').set_index('codigo_postal')
+        codigos = cp_tecnicos_adt['Codigo Postal'].apply(formatear_codigo_postal)
+        casas = pd.DataFrame({
+            'Latitud': codigos.map(coords_cp['Latitud']).to_numpy(),
+            'Longitud': codigos.map(coords_cp['Longitud']).to_numpy(),
+        }, index=cp_tecnicos_adt['Nombre Enrutador'].astype(str).str.strip())
+        casas = casas[~casas.index.duplicated(keep='first')]
+        if res_labels is None:
+            return casas
+
+        # Mismo emparejamiento aproximado que el resto de la aplicación entre `Res_Label` y el ADT
+        labels = pd.Series(res_labels.dropna().unique())
+        nombres = nombres_adt_de_rutas(labels, casas.index)
+        emparejados = nombres.isin(casas.index)
+        por_label = casas.reindex(nombres[emparejados]).set_axis(labels[emparejados].to_numpy())
+        sin_rutas = casas[~casas.index.isin(nombres[emparejados]) & ~casas.index.isin(labels)]
+        return pd.concat([por_label, sin_rutas])
+
     def agregar_botones_estadisticas(self, rutas):
         """
     Genera botones dinámicos para mostrar las estadísticas de cada técnico disponible en las rutas.
@@ -0,0 +1,152 @@
+# modulos/salud_proveedores.py
+import time
+import threading
+from collections import deque
+
+from modulos.logger_config import logger
+
+CERRADO = "cerrado"          # Funciona con normalidad
+ABIERTO = "abierto"          # Falla: no se le envía tráfico hasta que pase el enfriamiento
+SEMIABIERTO = "semiabierto"  # Tras el enfriamiento: se deja pasar una única consulta de prueba
+
+VENTANA_MUESTRAS = 50
+MIN_MUESTRAS = 5
+UMBRAL_ERRORES = 0.5
+FALLOS_SEGUIDOS_APERTURA = 3
+ENFRIAMIENTO_SEGUNDOS = 30
+ENFRIAMIENTO_MAXIMO_SEGUNDOS = 600
+LATENCIA_REFERENCIA = 1.0  # Segundos; por encima, el peso del proveedor se reduce en proporción
+FACTOR_MINIMO = 0.05
+
+
+class SaludProveedor:
+    """
+    Estadísticas móviles de un proveedor de rutas y su cortocircuito (circuit breaker).
+
+    Se guardan las últimas `VENTANA_MUESTRAS` consultas (éxito y latencia). El circuito se abre
+    con `FALLOS_SEGUIDOS_APERTURA` fallos seguidos o con una tasa de errores de al menos
+    `UMBRAL_ERRORES` (con `MIN_MUESTRAS` como mínimo). Abierto, el proveedor no recibe tráfico;
+    pasado el enfriamiento admite una consulta de prueba: si acierta se cierra y, si falla,
+    vuelve a abrirse con el doble de enfriamiento (hasta `ENFRIAMIENTO_MAXIMO_SEGUNDOS`).
+
+    Es seguro usarlo desde varios hilos.
+    """
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.estado = CERRADO
+        self._muestras = deque(maxlen=VENTANA_MUESTRAS)
+        self._fallos_seguidos = 0
+        self._enfriamiento = ENFRIAMIENTO_SEGUNDOS
+        self._reapertura = 0.0
+        self._prueba_en_curso = False
+        self._inicio_prueba = 0.0
+        self._lock = threading.Lock()
+
+    def disponible(self, reservar=True):
+        """
+        Indica si se le puede enviar una consulta ahora. Si el enfriamiento ha terminado, pasa a
+        semiabierto y, con `reservar`, se queda la única consulta de prueba para quien llama.
+
+        Args:
+            reservar (bool): False para solo consultar, sin ocupar la consulta de prueba.
+        """
+        with self._lock:
+            if self.estado == CERRADO:
+                return True
+            if self.estado == ABIERTO and time.monotonic() >= self._reapertura:
+                self.estado = SEMIABIERTO
+                self._prueba_en_curso = False
+            # Una prueba reservada que nunca llegó a registrarse caduca tras un enfriamiento
+            prueba_caducada = time.monotonic() - self._inicio_prueba > ENFRIAMIENTO_SEGUNDOS
+            if self.estado == SEMIABIERTO and (not self._prueba_en_curso or prueba_caducada):
+                if reservar:
+                    self._prueba_en_curso = True
+                    self._inicio_prueba = time.monotonic()
+                return True
+            return False
+
+    def registrar(self, exito, latencia):
+        """
+        Anota el resultado de una consulta y actualiza el estado del circuito.
+
+        Args:
+            exito (bool): Si la consulta devolvió un resultado válido.
+            latencia (float): Duración de la consulta en segundos.
+        """
+        with self._lock:
+            self._muestras.append((bool(exito), float(latencia)))
+            if exito:
+                self._fallos_seguidos = 0
+                if self.estado != CERRADO:
+                    logger.info(f"{self.nombre} vuelve a responder; se cierra el circuito")
+                self.estado = CERRADO
+                self._enfriamiento = ENFRIAMIENTO_SEGUNDOS
+                self._prueba_en_curso = False
+                return
+
+            self._fallos_seguidos += 1
+            if self.estado == SEMIABIERTO:
+                self._enfriamiento = min(self._enfriamiento * 2, ENFRIAMIENTO_MAXIMO_SEGUNDOS)
+                self._abrir()
+            elif self.estado == CERRADO and (
+                    self._fallos_seguidos >= FALLOS_SEGUIDOS_APERTURA
+                    or (len(self._muestras) >= MIN_MUESTRAS and self._tasa_errores() >= UMBRAL_ERRORES)):
+                self._abrir()
+
+    def _abrir(self):
+        """Abre el circuito durante el enfriamiento actual (con el lock tomado)."""
+        self.estado = ABIERTO
+        self._prueba_en_curso = False
+        self._reapertura = time.monotonic() + self._enfriamiento
+        logger.warning(f"{self.nombre} falla de forma repetida; sin tráfico durante {self._enfriamiento} s")
+
+    def _tasa_errores(self):
+        if not self._muestras:
+            return 0.0
+        return sum(1 for exito, _ in self._muestras if not exito) / len(self._muestras)
+
+    def _latencia_media(self):
+        latencias = [latencia for exito, latencia in self._muestras if exito]
+        return sum(latencias) / len(latencias) if latencias else None
+
+    def latencia_percentil(self, percentil=90):
+        """
+        Latencia de las consultas correctas en el percentil indicado.
+
+        Returns:
+            float: Segundos, o None si aún no hay `MIN_MUESTRAS` consultas correctas.
+        """
+        with self._lock:
+            latencias = sorted(latencia for exito, latencia in self._muestras if exito)
+        if len(latencias) < MIN_MUESTRAS:
+            return None
+        return latencias[min(int(len(latencias) * percentil / 100), len(latencias) - 1)]
+
+    def factor_rendimiento(self):
+        """
+        Multiplicador del peso configurado según lo medido: baja con la tasa de errores y con
+        la latencia media por encima de `LATENCIA_REFERENCIA`. Sin muestras vale 1.
+
+        Returns:
+            float: Factor entre `FACTOR_MINIMO` y 1.
+        """
+        with self._lock:
+            factor = 1.0 - self._tasa_errores()
+            latencia = self._latencia_media()
+            if latencia is not None and latencia > LATENCIA_REFERENCIA:
+                factor *= LATENCIA_REFERENCIA / latencia
+            return max(factor, FACTOR_MINIMO)
+
+    def resumen(self):
+        """
+        Returns:
+            dict: Estado del circuito, número de muestras, tasa de errores y latencia media (s).
+        """
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "muestras": len(self._muestras),
+                "tasa_errores": self._tasa_errores(),
+                "latencia_media": self._latencia_media(),
+            }
@@ -0,0 +1,304 @@
+# modulos/servidor_rutas_simulado.py
+"""
+Servidor HTTP local que imita las APIs de rutas de OpenRouteService, HERE y TomTom, y los
+motores autoalojados OSRM y Valhalla (rutas y matrices), para probar y medir `APIManager`
+sin conexión.
+
+Las distancias son sintéticas y deterministas: línea recta por `FACTOR_DESVIO` a
+`VELOCIDAD_KMH`. La latencia, la tasa de errores 5xx y la de 429 son configurables.
+
+Uso:
+    python -m modulos.servidor_rutas_simulado --puerto 8080 --latencia 150 --errores 0.05 --limite 0.1
+
+y en `api_keys.csv`:
+    name,key,app_id,url,weight,matrix_url
+    OpenRouteService,prueba,,http://127.0.0.1:8080/v2/directions,1,
+    Here,prueba,,http://127.0.0.1:8080/v8/routes,1,http://127.0.0.1:8080/v8/matrix
+    TomTom,prueba,,http://127.0.0.1:8080,1,
+    OSRM,,,http://127.0.0.1:8080,1,
+    Valhalla,,,http://127.0.0.1:8080,1,
+
+`GET /estadisticas` devuelve cuántas peticiones, errores y 429 ha servido cada ruta.
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from modulos.geo import distancia_haversine_np
+
+FACTOR_DESVIO = 1.3
+VELOCIDAD_KMH = 60
+PUERTO_POR_DEFECTO = 8080
+
+_RUTA_TOMTOM = re.compile(r"^/routing/1/calculateRoute/([-\d.]+),([-\d.]+):([-\d.]+),([-\d.]+)/json$")
+_RUTA_OSRM = re.compile(r"^/(route|table)/v1/[\w-]+/([-\d.,;]+)$")
+
+
+def ruta_sintetica(lat_origen, lon_origen, lat_destino, lon_destino):
+    """
+    Returns:
+        tuple: Distancia en metros y duración en segundos, siempre las mismas para el mismo par.
+    """
+    metros = float(distancia_haversine_np(lat_origen, lon_origen, lat_destino, lon_destino)) * FACTOR_DESVIO * 1000
+    return metros, metros / (VELOCIDAD_KMH / 3.6)
+
+
+class ConfiguracionSimulada:
+    """
+    Comportamiento del servidor: latencia en milisegundos (media ± variación) y probabilidad de
+    responder 5xx o 429. Con `semilla`, la secuencia de fallos es reproducible.
+    """
+
+    def __init__(self, latencia=0, variacion=0, tasa_errores=0.0, tasa_429=0.0, semilla=None):
+        self.latencia = latencia
+        self.variacion = variacion
+        self.tasa_errores = tasa_errores
+        self.tasa_429 = tasa_429
+        self._azar = random.Random(semilla)
+        self._lock = threading.Lock()
+        self.estadisticas = Counter()
+
+    def sortear(self):
+        """Decide el resultado de una petición: `None` si es correcta, 429 o 500."""
+        with self._lock:
+            espera = max(self.latencia + self._azar.uniform(-self.variacion, self.variacion), 0)
+            valor = self._azar.random()
+        time.sleep(espera / 1000)
+        if valor < self.tasa_429:
+            return 429
+        if valor < self.tasa_429 + self.tasa_errores:
+            return 500
+        return None
+
+    def anotar(self, ruta, resultado):
+        with self._lock:
+            self.estadisticas[ruta] += 1
+            if resultado is not None:
+                self.estadisticas[f"{ruta} {resultado}"] += 1
+
+
+class ManejadorRutasSimulado(BaseHTTPRequestHandler):
+    """Atiende las rutas de cada proveedor con el formato de respuesta de su API real."""
+
+    configuracion = ConfiguracionSimulada()
+    protocol_version = "HTTP/1.1"  # keep-alive, como los servidores reales
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _responder(self, estado, cuerpo, cabeceras=None):
+        datos = json.dumps(cuerpo).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _leer_json(self):
+        longitud = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(longitud) or b"{}")
+
+    def _atender(self, ruta, generar):
+        """Aplica la latencia y los fallos simulados y, si toca, responde con `generar()`."""
+        resultado = self.configuracion.sortear()
+        self.configuracion.anotar(ruta, resultado)
+        if resultado == 429:
+            self._responder(429, {"error": "Rate limit exceeded"}, {"Retry-After": "1"})
+        elif resultado == 500:
+            self._responder(500, {"error": "Simulated server error"})
+        else:
+            try:
+                self._responder(200, generar())
+            except (KeyError, ValueError, TypeError, IndexError) as e:
+                self._responder(400, {"error": f"Petición no válida: {e}"})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parametros = {clave: valores[0] for clave, valores in parse_qs(url.query).items()}
+
+        if url.path == "/estadisticas":
+            self._responder(200, dict(self.configuracion.estadisticas))
+        elif url.path.startswith("/v8/routes"):
+            self._atender("here_ruta", lambda: self._here_ruta(parametros))
+        elif _RUTA_TOMTOM.match(url.path):
+            coordenadas = [float(c) for c in _RUTA_TOMTOM.match(url.path).groups()]
+            self._atender("tomtom_ruta", lambda: self._tomtom_ruta(*coordenadas))
+        elif _RUTA_OSRM.match(url.path):
+            servicio, texto = _RUTA_OSRM.match(url.path).groups()
+            # OSRM recibe "lon,lat;lon,lat;..."
+            coordenadas = [tuple(float(c) for c in par.split(",")) for par in texto.split(";")]
+            if servicio == "route":
+                self._atender("osrm_ruta", lambda: self._osrm_ruta(coordenadas))
+            else:
+                self._atender("osrm_matriz", lambda: self._osrm_matriz(coordenadas, parametros))
+        else:
+            self._responder(404, {"error": f"Ruta no simulada: {url.path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        cuerpo = self._leer_json()
+
+        if url.path.startswith("/v2/directions/"):
+            self._atender("ors_ruta", lambda: self._ors_ruta(cuerpo))
+        elif url.path.startswith("/v2/matrix/"):
+            self._atender("ors_matriz", lambda: self._ors_matriz(cuerpo))
+        elif url.path.startswith("/v8/matrix"):
+            self._atender("here_matriz", lambda: self._here_matriz(cuerpo))
+        elif url.path == "/routing/matrix/2":
+            self._atender("tomtom_matriz", lambda: self._tomtom_matriz(cuerpo))
+        elif url.path == "/route":
+            self._atender("valhalla_ruta", lambda: self._valhalla_ruta(cuerpo))
+        elif url.path == "/sources_to_targets":
+            self._atender("valhalla_matriz", lambda: self._valhalla_matriz(cuerpo))
+        else:
+            self._responder(404, {"error": f"Ruta no simulada: {url.path}"})
+
+    @staticmethod
+    def _ors_ruta(cuerpo):
+        (lon_o, lat_o), (lon_d, lat_d) = cuerpo["coordinates"][:2]
+        metros, segundos = ruta_sintetica(lat_o, lon_o, lat_d, lon_d)
+        return {
+            "type": "FeatureCollection",
+            "features": [{"type": "Feature", "properties": {
+                "segments": [{"distance": metros, "duration": segundos}],
+                "summary": {"distance": metros, "duration": segundos},
+            }}],
+        }
+
+    @staticmethod
+    def _ors_matriz(cuerpo):
+        ubicaciones = cuerpo["locations"]
+        origenes = cuerpo.get("sources") or list(range(len(ubicaciones)))
+        destinos = cuerpo.get("destinations") or list(range(len(ubicaciones)))
+        divisor = {"km": 1000, "mi": 1609.344}.get(cuerpo.get("units"), 1)
+        distancias, duraciones = [], []
+        for i in origenes:
+            fila_distancias, fila_duraciones = [], []
+            for j in destinos:
+                metros, segundos = ruta_sintetica(ubicaciones[i][1], ubicaciones[i][0], ubicaciones[j][1], ubicaciones[j][0])
+                fila_distancias.append(metros / divisor)
+                fila_duraciones.append(segundos)
+            distancias.append(fila_distancias)
+            duraciones.append(fila_duraciones)
+        return {"distances": distancias, "durations": duraciones}
+
+    @staticmethod
+    def _here_ruta(parametros):
+        lat_o, lon_o = (float(c) for c in parametros["origin"].split(","))
+        lat_d, lon_d = (float(c) for c in parametros["destination"].split(","))
+        metros, segundos = ruta_sintetica(lat_o, lon_o, lat_d, lon_d)
+        return {"routes": [{"sections": [{"summary": {"length": round(metros), "duration": round(segundos)}}]}]}
+
+    @staticmethod
+    def _here_matriz(cuerpo):
+        origenes, destinos = cuerpo["origins"], cuerpo["destinations"]
+        distancias, tiempos = [], []
+        for o in origenes:
+            for d in destinos:
+                metros, segundos = ruta_sintetica(o["lat"], o["lng"], d["lat"], d["lng"])
+                distancias.append(round(metros))
+                tiempos.append(round(segundos))
+        return {"matrix": {
+            "numOrigins": len(origenes),
+            "numDestinations": len(destinos),
+            "distances": distancias,
+            "travelTimes": tiempos,
+        }}
+
+    @staticmethod
+    def _tomtom_ruta(lat_o, lon_o, lat_d, lon_d):
+        metros, segundos = ruta_sintetica(lat_o, lon_o, lat_d, lon_d)
+        return {"routes": [{"summary": {"lengthInMeters": round(metros), "travelTimeInSeconds": round(segundos)}}]}
+
+    @staticmethod
+    def _tomtom_matriz(cuerpo):
+        datos = []
+        for i, o in enumerate(cuerpo["origins"]):
+            for j, d in enumerate(cuerpo["destinations"]):
+                metros, segundos = ruta_sintetica(o["point"]["latitude"], o["point"]["longitude"],
+                                                  d["point"]["latitude"], d["point"]["longitude"])
+                datos.append({"originIndex": i, "destinationIndex": j, "routeSummary": {
+                    "lengthInMeters": round(metros), "travelTimeInSeconds": round(segundos)}})
+        return {"data": datos, "statistics": {"totalCount": len(datos), "successes": len(datos), "failures": 0}}
+
+    @staticmethod
+    def _osrm_ruta(coordenadas):
+        (lon_o, lat_o), (lon_d, lat_d) = coordenadas[0], coordenadas[-1]
+        metros, segundos = ruta_sintetica(lat_o, lon_o, lat_d, lon_d)
+        return {"code": "Ok", "routes": [{"distance": metros, "duration": segundos, "legs": []}], "waypoints": []}
+
+    @staticmethod
+    def _osrm_matriz(coordenadas, parametros):
+        todos = list(range(len(coordenadas)))
+        origenes = [int(i) for i in parametros["sources"].split(";")] if "sources" in parametros else todos
+        destinos = [int(j) for j in parametros["destinations"].split(";")] if "destinations" in parametros else todos
+        distancias, duraciones = [], []
+        for i in origenes:
+            fila = [ruta_sintetica(coordenadas[i][1], coordenadas[i][0], coordenadas[j][1], coordenadas[j][0]) for j in destinos]
+            distancias.append([metros for metros, _ in fila])
+            duraciones.append([segundos for _, segundos in fila])
+        return {"code": "Ok", "distances": distancias, "durations": duraciones}
+
+    @staticmethod
+    def _valhalla_ruta(cuerpo):
+        origen, destino = cuerpo["locations"][0], cuerpo["locations"][-1]
+        metros, segundos = ruta_sintetica(origen["lat"], origen["lon"], destino["lat"], destino["lon"])
+        return {"trip": {"summary": {"length": metros / 1000, "time": segundos}, "status": 0}}
+
+    @staticmethod
+    def _valhalla_matriz(cuerpo):
+        filas = []
+        for i, o in enumerate(cuerpo["sources"]):
+            fila = []
+            for j, d in enumerate(cuerpo["targets"]):
+                metros, segundos = ruta_sintetica(o["lat"], o["lon"], d["lat"], d["lon"])
+                fila.append({"from_index": i, "to_index": j, "distance": metros / 1000, "time": round(segundos)})
+            filas.append(fila)
+        return {"sources_to_targets": filas, "units": "kilometers"}
+
+
+def iniciar_servidor(puerto=PUERTO_POR_DEFECTO, configuracion=None, host="127.0.0.1"):
+    """
+    Arranca el servidor simulado en un hilo en segundo plano.
+
+    Args:
+        puerto (int): Puerto de escucha (0 para uno libre cualquiera).
+        configuracion (ConfiguracionSimulada, optional): Latencia y fallos simulados.
+        host (str): Interfaz de escucha.
+    Returns:
+        ThreadingHTTPServer: El servidor; `server_address[1]` es el puerto y `shutdown()` lo detiene.
+    """
+    manejador = type("Manejador", (ManejadorRutasSimulado,), {"configuracion": configuracion or ConfiguracionSimulada()})
+    servidor = ThreadingHTTPServer((host, puerto), manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="servidor_rutas_simulado", daemon=True).start()
+    return servidor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local que simula las APIs de rutas de ORS, HERE, TomTom, OSRM y Valhalla.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interfaz de escucha.")
+    parser.add_argument("--puerto", type=int, default=PUERTO_POR_DEFECTO, help="Puerto de escucha.")
+    parser.add_argument("--latencia", type=float, default=0, help="Latencia media por petición, en milisegundos.")
+    parser.add_argument("--variacion", type=float, default=0, help="Variación aleatoria de la latencia, en milisegundos.")
+    parser.add_argument("--errores", type=float, default=0.0, help="Proporción de respuestas 500 (0-1).")
+    parser.add_argument("--limite", type=float, default=0.0, help="Proporción de respuestas 429 (0-1).")
+    parser.add_argument("--semilla", type=int, default=None, help="Semilla para reproducir la secuencia de fallos.")
+    args = parser.parse_args()
+
+    configuracion = ConfiguracionSimulada(args.latencia, args.variacion, args.errores, args.limite, args.semilla)
+    servidor = iniciar_servidor(args.puerto, configuracion, args.host)
+    print(f"Servidor de rutas simulado en http://{args.host}:{servidor.server_address[1]} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
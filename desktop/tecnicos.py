@@ -13,13 +13,17 @@ from folium import CustomIcon, Popup
 import os
 import re
 import pandas as pd
+import numpy as np
 import math
 import base64
+import hashlib
 import sys
+from collections import OrderedDict
 
 from modulos.utils import cargar_configuracion
 from modulos.logger_config import logger
-from modulos.api_manager import APIManager
+from modulos.api_manager import obtener_api_manager
+from modulos.autocompletado import configurar_autocompletado
 
 
 def get_adjusted_coords(coords, adjustment_factor=0.01, index=0):
@@ -30,6 +34,47 @@ def get_adjusted_coords(coords, adjustment_factor=0.01, index=0):
     new_lon = coords[1] + adjustment_factor * math.sin(math.radians(angle))
     return (new_lat, new_lon)
 
+# Caché de desplazamientos por conjunto de resultados filtrado (las ventanas repiten el mismo conjunto
+# al pintar el mapa y al centrarlo en una orden)
+_cache_coordenadas_ajustadas = OrderedDict()
+MAX_CACHE_COORDENADAS_AJUSTADAS = 16
+
+def ajustar_coordenadas_superpuestas(df, adjustment_factor=0.01, inicio=0, agrupar_por=None):
+    """
+    Versión vectorizada de `get_adjusted_coords` para todas las filas de un DataFrame.
+
+    Numera las filas que comparten coordenadas (y, opcionalmente, las columnas de `agrupar_por`)
+    con `groupby().cumcount()` en el orden en que aparecen, y calcula todos los desplazamientos a la vez.
+
+    Args:
+        df (pd.DataFrame): Filas con columnas `Latitud` y `Longitud`.
+        adjustment_factor (float): Radio del desplazamiento en grados.
+        inicio (int): Índice asignado a la primera aparición de cada coordenada.
+        agrupar_por (list, optional): Columnas adicionales que reinician la numeración.
+    Returns:
+        pd.DataFrame: Columnas `Latitud` y `Longitud` ajustadas, con el mismo índice que `df`.
+    """
+    columnas = list(agrupar_por or []) + ['Latitud', 'Longitud']
+
+    huella = hashlib.sha1(pd.util.hash_pandas_object(df[columnas], index=True).to_numpy().tobytes()).hexdigest()
+    clave = (huella, adjustment_factor, inicio, tuple(columnas))
+    if clave in _cache_coordenadas_ajustadas:
+        _cache_coordenadas_ajustadas.move_to_end(clave)
+        return _cache_coordenadas_ajustadas[clave]
+
+    indices = df.groupby(columnas, sort=False, dropna=False).cumcount().to_numpy() + inicio
+    angulos = np.radians(indices * 30)  # Mismo despliegue que get_adjusted_coords
+
+    ajustadas = pd.DataFrame({
+        'Latitud': df['Latitud'].to_numpy(dtype=float) + adjustment_factor * np.cos(angulos),
+        'Longitud': df['Longitud'].to_numpy(dtype=float) + adjustment_factor * np.sin(angulos),
+    }, index=df.index)
+
+    _cache_coordenadas_ajustadas[clave] = ajustadas
+    if len(_cache_coordenadas_ajustadas) > MAX_CACHE_COORDENADAS_AJUSTADAS:
+        _cache_coordenadas_ajustadas.popitem(last=False)
+    return ajustadas
+
 def format_order_popup(row):
     """Genera el contenido HTML del popup para cada orden."""
     fecha_formateada = row['Fecha'].strftime('%d/%m/%Y') if pd.notna(row['Fecha']) else "Fecha desconocida"
@@ -70,7 +115,7 @@ class BuscarTecnicoWindow(QWidget):
     def __init__(self):
         super().__init__()
         self.data = None
-        self.api_manager = APIManager()
+        self.api_manager = obtener_api_manager()
 
         self.status_label = QLabel(" ", self)
         self.status_label.setStyleSheet("font-size: 16px; color: black")
@@ -214,6 +259,7 @@ class BuscarTecnicoWindow(QWidget):
         self.cp_input.setFixedHeight(36)
         self.cp_input.setPlaceholderText("Introduce un código postal")
         self.cp_input.setStyleSheet("font-size: 14px; border-radius: 5px; padding: 5px; border: 2px solid #046d94;")
+        self.completador_cp = configurar_autocompletado(self.cp_input)
 
                 
         # Botón para agregar marcador
@@ -239,6 +285,7 @@ class BuscarTecnicoWindow(QWidget):
         self.cp_distance_input.setFixedHeight(36)
         self.cp_distance_input.setPlaceholderText("Código postal destino")
         self.cp_distance_input.setStyleSheet("font-size: 14px; border-radius: 5px; padding: 5px; border: 2px solid #046d94;")
+        self.completador_cp_distancia = configurar_autocompletado(self.cp_distance_input)
 
         # Botón para calcular distancia
         self.calculate_distance_button = QPushButton("Calcular Distancia")
@@ -627,6 +674,10 @@ class BuscarTecnicoWindow(QWidget):
                 if not ordenes_validas.empty:
                     ordenes_validas = ordenes_validas.sort_values(by=['Fecha', 'Dat_StartHour'])
 
+                    # Desplazamientos de todas las órdenes repetidas, por técnico y fecha
+                    coordenadas_ajustadas = ajustar_coordenadas_superpuestas(
+                        ordenes_validas, adjustment_factor=0.01, agrupar_por=['Nombre Tecnico', 'Fecha'])
+
                     for (tecnico, fecha), grupo in ordenes_validas.groupby(['Nombre Tecnico', 'Fecha']):
                         if tecnico in rutas_por_tecnico_fecha:
                             if fecha not in rutas_por_tecnico_fecha[tecnico]:
@@ -638,17 +689,8 @@ class BuscarTecnicoWindow(QWidget):
 
                             rutas_por_tecnico_fecha[tecnico][fecha].append([lat_casa, lon_casa])
 
-                            coordenadas_contador = {}
-
-                            for _, row in grupo.iterrows():
-                                coords = (row['Latitud'], row['Longitud'])
-
-                                if coords in coordenadas_contador:
-                                    coordenadas_contador[coords] += 1
-                                else:
-                                    coordenadas_contador[coords] = 0
-
-                                adjusted_coords = get_adjusted_coords(coords, adjustment_factor=0.01, index=coordenadas_contador[coords])
+                            for idx, row in grupo.iterrows():
+                                adjusted_coords = tuple(coordenadas_ajustadas.loc[idx, ['Latitud', 'Longitud']])
 
                                 rutas_por_tecnico_fecha[tecnico][fecha].append(adjusted_coords)
 
@@ -787,17 +829,15 @@ class BuscarTecnicoWindow(QWidget):
         lat_origen, lon_origen = origen.iloc[0]["Latitud"], origen.iloc[0]["Longitud"]
         lat_destino, lon_destino = destino.iloc[0]["Latitud"], destino.iloc[0]["Longitud"]
 
-        # Seleccionar la API antes de la consulta para loggear el nombre
-        api_seleccionada = self.api_manager.seleccionar_api()
-        api_nombre = api_seleccionada["name"]
-
-        # Llamar a la API para calcular la distancia
-        distancia, duracion = self.api_manager.obtener_distancia(lat_origen, lon_origen, lat_destino, lon_destino)
+        # Llamar a la API para calcular la distancia (con failover entre APIs si alguna falla y,
+        # al ser una consulta interactiva, con respaldo en otra API si la primera tarda)
+        distancia, duracion = self.api_manager.obtener_distancia(lat_origen, lon_origen, lat_destino, lon_destino,
+                                                                 respaldo=True)
 
         if distancia is not None and duracion is not None:
             self.distance_text.setText(f"📍 Distancia: {distancia:.2f} km ⏳ Duración: {duracion:.1f} min")
             
-            logger.info(f"El usuario calculó una distancia con la API {api_nombre}")
+            logger.info(f"El usuario calculó una distancia con la API {self.api_manager.ultima_api_usada}")
 
             # Crear el marcador para el código postal destino sin sobrescribir el mapa
             popup_html = f"""
@@ -809,7 +849,14 @@ class BuscarTecnicoWindow(QWidget):
             self.add_marker_to_map(lat_destino, lon_destino, popup_html, "gray")
 
         else:
-            self.distance_text.setText("No se pudo calcular la distancia.")
+            # Sin APIs disponibles: estimación calibrada con las rutas ya consultadas
+            estimacion = self.api_manager.estimador.estimar(lat_origen, lon_origen, lat_destino, lon_destino)
+            self.distance_text.setText(
+                f"📍 Distancia estimada: {float(estimacion['distancia']):.1f} km "
+                f"({float(estimacion['distancia_p10']):.0f}-{float(estimacion['distancia_p90']):.0f}) "
+                f"⏳ Duración estimada: {float(estimacion['duracion']):.0f} min "
+                f"({float(estimacion['duracion_p10']):.0f}-{float(estimacion['duracion_p90']):.0f}) · sin conexión con las APIs"
+            )
 
     def add_marker_to_map(self, lat, lon, popup_text, color="gray"):
         """Añade un marcador al mapa sin sobrescribir los datos existentes."""
@@ -967,7 +1014,6 @@ class BuscarTecnicoWindow(QWidget):
             filtered_data = filtered_data[filtered_data['Nombre Tecnico'].isin(tecnicos_seleccionados)]
 
         m = folium.Map(location=[lat, lon], zoom_start=12)
-        coordenadas_contador = {}
 
         # Agregar casas de técnicos seleccionados (negro)
         for tecnico in tecnicos_seleccionados:
@@ -985,21 +1031,29 @@ class BuscarTecnicoWindow(QWidget):
                 custom_icon_house = CustomIcon(icon_image=icon_url_house, icon_size=(30, 30))
                 folium.Marker([lat_casa, lon_casa], popup=popup_html, icon=custom_icon_house).add_to(m)
 
+        # Órdenes en el mismo orden en que se pintan, para numerar las coordenadas repetidas de una vez
+        datos_tecnicos = [
+            filtered_data[filtered_data['Nombre Tecnico'] == tecnico].sort_values(by=['Fecha', 'Dat_StartHour'])
+            for tecnico in tecnicos_seleccionados
+        ]
+        coordenadas_ajustadas = None
+        if datos_tecnicos:
+            ordenes_pintadas = pd.concat(datos_tecnicos)
+            ordenes_pintadas = ordenes_pintadas.dropna(subset=['Fecha', 'Latitud', 'Longitud'])
+            coordenadas_ajustadas = ajustar_coordenadas_superpuestas(ordenes_pintadas, adjustment_factor=0.001, inicio=1)
+
         rutas_por_tecnico_fecha = {}
-        for tecnico in tecnicos_seleccionados:
+        for tecnico, tecnico_data in zip(tecnicos_seleccionados, datos_tecnicos):
             rutas_por_tecnico_fecha[tecnico] = {}
-            tecnico_data = filtered_data[filtered_data['Nombre Tecnico'] == tecnico].sort_values(by=['Fecha', 'Dat_StartHour'])
             for fecha, grupo in tecnico_data.groupby('Fecha'):
                 rutas_por_tecnico_fecha[tecnico][fecha] = []
                 lat_casa, lon_casa = self.df_tecnicos.loc[self.df_tecnicos['Nombre Tecnico'] == tecnico, ['Latitud', 'Longitud']].values[0]
                 rutas_por_tecnico_fecha[tecnico][fecha].append([lat_casa, lon_casa])
 
-                for _, row in grupo.iterrows():
+                for idx, row in grupo.iterrows():
                     if pd.isna(row['Latitud']) or pd.isna(row['Longitud']):
                         continue
-                    coords = (row['Latitud'], row['Longitud'])
-                    coordenadas_contador[coords] = coordenadas_contador.get(coords, 0) + 1
-                    adjusted_coords = get_adjusted_coords(coords, adjustment_factor=0.001, index=coordenadas_contador[coords])
+                    adjusted_coords = tuple(coordenadas_ajustadas.loc[idx, ['Latitud', 'Longitud']])
 
                     popup_content = format_order_popup(row)
                     color_qt = self.tecnico_colors.get(tecnico, QColor("blue"))
@@ -0,0 +1,17 @@
+# modulos/tests/conftest.py
+import os
+import sys
+import types
+import logging
+
+# La carpeta de estos módulos se distribuye como el paquete `modulos` (ver `get_base_dir` en
+# logger_config); se registra con ese nombre para que las pruebas lo importen igual que la aplicación.
+CARPETA_MODULOS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "modulos" not in sys.modules:
+    modulos = types.ModuleType("modulos")
+    modulos.__path__ = [CARPETA_MODULOS]
+    sys.modules["modulos"] = modulos
+
+# Sin escribir en `enrutador.log` durante las pruebas
+logging.getLogger("EnrutadorLogger").addHandler(logging.NullHandler())
@@ -0,0 +1,132 @@
+# modulos/tests/test_nucleos.py
+import pytest
+
+# Sin numpy/pandas (p. ej. un entorno solo con pytest) no hay núcleos que probar
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from modulos import nucleos  # noqa: E402
+from modulos.geo import distancia_haversine_np  # noqa: E402
+
+BACKENDS = [
+    pytest.param(nombre, marks=pytest.mark.skipif(nombre not in nucleos.backends_disponibles(),
+                                                  reason=f"{nombre} no está instalado"))
+    for nombre in ("numpy", "numba")
+]
+
+
+@pytest.fixture
+def backend(request):
+    anterior = nucleos.backend_actual()
+    yield nucleos.seleccionar_backend(request.param)
+    nucleos.seleccionar_backend(anterior)
+
+
+@pytest.fixture(scope="module")
+def datos():
+    return nucleos.datos_de_prueba(n=1500, semilla=3)
+
+
+def huecos_con_pandas(inicios, fines, indptr):
+    """Referencia independiente: diferencias consecutivas dentro de cada técnico con pandas."""
+    tecnico = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    df = pd.DataFrame({"tecnico": tecnico, "inicio": inicios, "fin": fines})
+    inicio_siguiente = df.groupby("tecnico")["inicio"].shift(-1)
+    huecos = ((inicio_siguiente - df["fin"]) / pd.Timedelta(hours=1)).to_numpy(dtype=np.float64)
+    mismo_dia = (df["fin"].dt.normalize() == inicio_siguiente.dt.normalize()).to_numpy()
+    return huecos, mismo_dia
+
+
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+def test_distancias_pares_coincide_con_numpy(backend, datos):
+    lat, lon = datos["lat"], datos["lon"]
+    obtenido = nucleos.distancias_pares(lat[:200], lon[:200], lat, lon)
+    esperado = distancia_haversine_np(lat[:200, None], lon[:200, None], lat[None, :], lon[None, :])
+
+    assert obtenido.shape == (200, len(lat))
+    np.testing.assert_array_equal(np.isnan(obtenido), np.isnan(esperado))
+    np.testing.assert_allclose(obtenido, esperado, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+def test_distancias_pares_nan_y_vacios(backend):
+    resultado = nucleos.distancias_pares([40.4, np.nan], [-3.7, -3.7], [40.4, 41.0], [-3.7, np.nan])
+    assert resultado[0, 0] == 0
+    assert np.isnan(resultado[0, 1]) and np.isnan(resultado[1]).all()
+    assert nucleos.distancias_pares([], [], [40.4], [-3.7]).shape == (0, 1)
+
+
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+def test_huecos_coincide_con_pandas(backend, datos):
+    huecos, mismo_dia = nucleos.huecos_entre_visitas(datos["inicios"], datos["fines"], datos["indptr"])
+    esperado_huecos, esperado_mismo_dia = huecos_con_pandas(datos["inicios"], datos["fines"], datos["indptr"])
+
+    np.testing.assert_allclose(huecos, esperado_huecos, rtol=1e-12, equal_nan=True)
+    np.testing.assert_array_equal(mismo_dia, esperado_mismo_dia)
+
+
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+def test_huecos_limites_de_grupo_y_nat(backend):
+    inicios = pd.to_datetime(["2024-03-04 09:00", "2024-03-04 12:00", "2024-03-04 08:00",
+                              "2024-03-04 10:00", "NaT", "2024-03-05 09:00"])
+    fines = pd.to_datetime(["2024-03-04 10:00", "2024-03-04 13:00", "2024-03-04 09:30",
+                            "2024-03-04 23:30", "NaT", "2024-03-05 10:00"])
+    # Técnicos: [0, 1], [2, 3, 4, 5]
+    huecos, mismo_dia = nucleos.huecos_entre_visitas(inicios, fines, [0, 2, 6])
+
+    np.testing.assert_allclose(huecos, [2.0, np.nan, 0.5, np.nan, np.nan, np.nan], equal_nan=True)
+    np.testing.assert_array_equal(mismo_dia, [True, False, True, False, False, False])
+
+
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+def test_huecos_cruzan_medianoche(backend):
+    inicios = pd.to_datetime(["2024-03-04 20:00", "2024-03-05 08:00"])
+    fines = pd.to_datetime(["2024-03-04 22:00", "2024-03-05 09:00"])
+    huecos, mismo_dia = nucleos.huecos_entre_visitas(inicios, fines)
+
+    np.testing.assert_allclose(huecos, [10.0, np.nan], equal_nan=True)
+    np.testing.assert_array_equal(mismo_dia, [False, False])
+
+
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+def test_huecos_una_sola_visita(backend):
+    huecos, mismo_dia = nucleos.huecos_entre_visitas(pd.to_datetime(["2024-03-04 09:00"]),
+                                                     pd.to_datetime(["2024-03-04 10:00"]))
+    assert np.isnan(huecos).all() and not mismo_dia.any()
+
+
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+def test_coste_insercion_coincide_con_haversine(backend, datos):
+    lat, lon = datos["lat"], datos["lon"]
+    lat_sig, lon_sig = lat[::-1].copy(), lon[::-1].copy()
+    lat_sig[::7] = np.nan
+    ida, vuelta, desvio = nucleos.coste_insercion(lat, lon, lat_sig, lon_sig, 40.4, -3.7)
+
+    esperado_ida = distancia_haversine_np(lat, lon, 40.4, -3.7)
+    esperado_vuelta = distancia_haversine_np(40.4, -3.7, lat_sig, lon_sig)
+    directa = distancia_haversine_np(lat, lon, lat_sig, lon_sig)
+    np.testing.assert_allclose(ida, esperado_ida, rtol=1e-9, atol=1e-9, equal_nan=True)
+    np.testing.assert_allclose(vuelta, esperado_vuelta, rtol=1e-9, atol=1e-9, equal_nan=True)
+    # Sin visita siguiente, el desvío es el trayecto de ida
+    np.testing.assert_allclose(desvio, np.where(np.isnan(esperado_vuelta), esperado_ida, esperado_ida + esperado_vuelta - directa),
+                               rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+def test_coste_insercion_en_el_camino(backend):
+    # Madrid -> Toledo pasando por Getafe: el desvío es casi nulo y no negativo
+    ida, vuelta, desvio = nucleos.coste_insercion([40.4168], [-3.7038], [39.8628], [-4.0273], 40.3057, -3.7329)
+    assert ida[0] > 0 and vuelta[0] > 0
+    assert 0 <= desvio[0] < 2
+
+
+def test_verificar_equivalencia_con_todos_los_backends():
+    assert nucleos.verificar_equivalencia(n=800, semilla=5)
+
+
+def test_backend_no_disponible_usa_numpy():
+    anterior = nucleos.backend_actual()
+    try:
+        assert nucleos.seleccionar_backend("inexistente") == "numpy"
+    finally:
+        nucleos.seleccionar_backend(anterior)
@@ -8,10 +8,12 @@ import pandas as pd
 from geopy.distance import geodesic
 from rapidfuzz import process, fuzz
 
-from modulos.api_manager import APIManager
+from modulos.api_manager import obtener_api_manager
 
 from modulos.logger_config import logger, BASE_DIR, CONFIG_PATH
 
+UMBRAL_SIMILITUD_TECNICO = 80  # token_sort_ratio mínimo para emparejar un nombre de las rutas con el ADT
+
 def cargar_configuracion():
     """
     Carga y valida los archivos de configuración necesarios para la aplicación, incluyendo:
@@ -75,14 +77,10 @@ def cargar_configuracion():
         mapping_tecnicos = dict(zip(cp_tecnicos_adt['Nombre Enrutador'], cp_tecnicos_adt['Codigo Postal']))
 
         def asignar_codigo_postal(res_label):
-            # Buscar coincidencia exacta primero
-            if res_label in mapping_tecnicos:
-                return mapping_tecnicos[res_label]
-
-            # Usar coincidencia aproximada si no se encuentra exacto
-            coincidencia = process.extractOne(res_label, list(mapping_tecnicos.keys()), scorer=fuzz.token_sort_ratio)
-            if coincidencia and coincidencia[1] >= 80:  # Umbral de similitud
-                return mapping_tecnicos[coincidencia[0]]
+            # Coincidencia exacta primero y, si no, aproximada
+            nombre = emparejar_nombre_tecnico(res_label, list(mapping_tecnicos.keys()))
+            if nombre is not None:
+                return mapping_tecnicos[nombre]
             
             # Si no se encuentra coincidencia
             valores_no_coincidentes.append(res_label)  # Añadir a la lista
@@ -221,6 +219,44 @@ def encontrar_archivo_mas_reciente(carpeta, patron):
     return archivo_mas_reciente
 
 
+def emparejar_nombre_tecnico(res_label, nombres_adt):
+    """
+    Busca el `Nombre Enrutador` del archivo ADT que corresponde a un `Res_Label` del ExportBase:
+    coincidencia exacta y, si no la hay, la más parecida con al menos `UMBRAL_SIMILITUD_TECNICO`.
+
+    Args:
+        res_label (str): Nombre del técnico en las rutas.
+        nombres_adt (list): Nombres del archivo ADT.
+    Returns:
+        str: Nombre del ADT, o None si ninguno se parece lo suficiente.
+    """
+    if res_label in nombres_adt:
+        return res_label
+    coincidencia = process.extractOne(res_label, nombres_adt, scorer=fuzz.token_sort_ratio)
+    if coincidencia and coincidencia[1] >= UMBRAL_SIMILITUD_TECNICO:
+        return coincidencia[0]
+    return None
+
+
+def nombres_adt_de_rutas(res_labels, nombres_adt):
+    """
+    Traduce los `Res_Label` de las rutas a los `Nombre Enrutador` del ADT con `emparejar_nombre_tecnico`,
+    una vez por nombre distinto. Los que no se emparejan conservan su `Res_Label`.
+
+    Args:
+        res_labels (pd.Series): Nombres de los técnicos en las rutas.
+        nombres_adt (iterable): Nombres del archivo ADT.
+    Returns:
+        pd.Series: Nombres del ADT alineados con `res_labels`.
+    """
+    nombres_adt = list(dict.fromkeys(n for n in nombres_adt if isinstance(n, str) and n))
+    equivalencias = {}
+    for res_label in res_labels.dropna().unique():
+        nombre = emparejar_nombre_tecnico(res_label, nombres_adt) if nombres_adt else None
+        equivalencias[res_label] = nombre if nombre is not None else res_label
+    return res_labels.map(equivalencias)
+
+
 def formatear_codigo_postal(cp):
     """
     Formatea un código postal para que tenga exactamente 5 dígitos, rellenando con ceros a la izquierda.
@@ -261,9 +297,28 @@ def limpiar_direccion(direccion):
 
 
 
+_geocodificador = None
+_geocodificador_cargado = False
+
+def obtener_geocodificador():
+    """
+    Devuelve el geocodificador offline, cargando el callejero local la primera vez que se necesita.
+    Returns:
+        Geocodificador: Geocodificador listo para usar, o `None` si no hay callejero.
+    """
+    global _geocodificador, _geocodificador_cargado
+    if not _geocodificador_cargado:
+        from modulos.geocodificador import Geocodificador
+        _geocodificador = Geocodificador.cargar()
+        _geocodificador_cargado = True
+    return _geocodificador
+
 def obtener_lat_lon_de_direccion(direccion, df_codigos_postales):
     """
-    Obtiene latitud y longitud de una dirección basada en su código postal.
+    Obtiene latitud y longitud de una dirección.
+
+    Si hay callejero local, intenta resolver la dirección a nivel de calle o municipio
+    (restringido a su código postal, si lo incluye); si no, usa el centroide del código postal.
     Args:
         direccion (str): Dirección que contiene el código postal.
         df_codigos_postales (pd.DataFrame): DataFrame con datos de códigos postales, latitudes y longitudes.
@@ -277,6 +332,13 @@ def obtener_lat_lon_de_direccion(direccion, df_codigos_postales):
 
     # Limpiar la dirección para extraer solo el código postal
     codigo_postal = limpiar_direccion(direccion)
+
+    geocodificador = obtener_geocodificador()
+    if geocodificador is not None:
+        lat, lon = geocodificador.geocodificar(str(direccion), codigo_postal)
+        if lat is not None:
+            return lat, lon
+
     if codigo_postal:
         fila_cp = df_codigos_postales[df_codigos_postales['codigo_postal'] == codigo_postal]
         if not fila_cp.empty:
@@ -288,7 +350,7 @@ def obtener_lat_lon_de_direccion(direccion, df_codigos_postales):
 
     return None, None
 
-api_manager = APIManager()
+api_manager = obtener_api_manager()
 
 def obtener_distancia_real(lat_anterior, lon_anterior, lat_nueva_visita, lon_nueva_visita):
     """
@@ -322,6 +384,41 @@ def obtener_distancia_real(lat_anterior, lon_anterior, lat_nueva_visita, lon_nue
         return None, None
 
 
+def obtener_distancias_reales(pares, presupuesto=None):
+    """
+    Calcula en paralelo las distancias reales de varios trayectos independientes.
+    Args:
+        pares (list): Lista de `(lat_origen, lon_origen, lat_destino, lon_destino)`.
+        presupuesto (Presupuesto, optional): Plazo máximo de espera.
+    Returns:
+        list: `(distancia, duracion)` por trayecto, en el mismo orden, con `(None, None)` en los que fallen.
+    """
+    try:
+        return api_manager.obtener_distancias(pares, presupuesto=presupuesto)
+    except Exception as e:
+        logger.debug(f"[DEBUG] Error inesperado en obtener_distancias_reales: {e}")
+        return [(None, None)] * len(pares)
+
+
+def obtener_matriz_distancias_reales(origenes, destinos, presupuesto=None):
+    """
+    Calcula las distancias y duraciones reales entre varios orígenes y destinos con una sola
+    consulta de matriz a la API seleccionada, en lugar de una llamada por par.
+    Args:
+        origenes (list): Lista de `(latitud, longitud)` de origen.
+        destinos (list): Lista de `(latitud, longitud)` de destino.
+        presupuesto (Presupuesto, optional): Plazo máximo de espera; lo que no llegue a tiempo queda en NaN.
+    Returns:
+        tuple: Matrices de distancia (km) y duración (min) con NaN en los pares sin resultado,
+        o `(None, None)` si ocurre un error.
+    """
+    try:
+        return api_manager.obtener_matriz(origenes, destinos, presupuesto=presupuesto)
+    except Exception as e:
+        logger.debug(f"[DEBUG] Error inesperado en obtener_matriz_distancias_reales: {e}")
+        return None, None
+
+
 def calcular_distancia_haversine(lat1, lon1, lat2, lon2):
     """
     Calcula la distancia entre dos coordenadas usando Haversine.
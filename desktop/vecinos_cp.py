@@ -0,0 +1,193 @@
+# modulos/vecinos_cp.py
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from modulos.logger_config import logger, get_data_dir
+from modulos.geo import cargar_tabla_codigos_postales, ruta_listado_codigos_postales
+from modulos.nucleos import distancias_pares
+
+ARCHIVO_VECINOS = "vecinos_cp.npz"
+RADIO_POR_DEFECTO_KM = 100
+TAMANO_BLOQUE = 512
+KM_POR_GRADO_LATITUD = 111.0
+
+
+def construir_vecinos_cp(df_codigos_postales, radio_km=RADIO_POR_DEFECTO_KM):
+    """
+    Calcula, para cada código postal, la lista de códigos vecinos dentro de `radio_km`.
+
+    El resultado se guarda en formato CSR: los vecinos del código `i` son
+    `indices[indptr[i]:indptr[i + 1]]`, ordenados por distancia creciente e
+    incluyendo al propio código con distancia 0.
+
+    Args:
+        df_codigos_postales (pd.DataFrame): Tabla con `codigo_postal`, `Latitud` y `Longitud`.
+        radio_km (float): Radio máximo de vecindad en kilómetros.
+    Returns:
+        dict: Arrays `codigos`, `indptr`, `indices`, `distancias` y el `radio_km` usado.
+    """
+    codigos = df_codigos_postales["codigo_postal"].to_numpy(dtype="U5")
+    lat = df_codigos_postales["Latitud"].to_numpy(dtype=np.float64)
+    lon = df_codigos_postales["Longitud"].to_numpy(dtype=np.float64)
+    n = len(codigos)
+
+    # Ordenar por latitud permite acotar cada bloque a una franja con searchsorted
+    orden_lat = np.argsort(lat, kind="stable")
+    lat_ordenada = lat[orden_lat]
+    margen_grados = radio_km / KM_POR_GRADO_LATITUD
+
+    tipo_indices = np.uint16 if n <= np.iinfo(np.uint16).max else np.uint32
+    conteos = np.zeros(n, dtype=np.int64)
+    vecinos_por_fila = [None] * n
+    distancias_por_fila = [None] * n
+
+    for inicio in range(0, n, TAMANO_BLOQUE):
+        filas = orden_lat[inicio:inicio + TAMANO_BLOQUE]
+        desde = np.searchsorted(lat_ordenada, lat[filas].min() - margen_grados, side="left")
+        hasta = np.searchsorted(lat_ordenada, lat[filas].max() + margen_grados, side="right")
+        candidatos = orden_lat[desde:hasta]
+
+        distancias = distancias_pares(lat[filas], lon[filas], lat[candidatos], lon[candidatos])
+
+        for k, fila in enumerate(filas):
+            dentro = np.flatnonzero(distancias[k] <= radio_km)
+            orden = np.argsort(distancias[k, dentro], kind="stable")
+            vecinos_por_fila[fila] = candidatos[dentro[orden]].astype(tipo_indices)
+            distancias_por_fila[fila] = distancias[k, dentro[orden]].astype(np.float32)
+            conteos[fila] = len(dentro)
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(conteos, out=indptr[1:])
+
+    return {
+        "codigos": codigos,
+        "indptr": indptr,
+        "indices": np.concatenate(vecinos_por_fila) if n else np.zeros(0, dtype=tipo_indices),
+        "distancias": np.concatenate(distancias_por_fila) if n else np.zeros(0, dtype=np.float32),
+        "radio_km": np.float32(radio_km),
+    }
+
+
+def ruta_vecinos_cp():
+    """Devuelve la ruta del archivo de vecinos junto al listado de códigos postales."""
+    return os.path.join(get_data_dir(), ARCHIVO_VECINOS)
+
+
+def generar_archivo_vecinos(radio_km=RADIO_POR_DEFECTO_KM, archivo_codigos_postales=None, destino=None):
+    """
+    Paso de construcción offline: calcula los vecinos de todos los códigos postales
+    y los guarda como arrays compactos en `vecinos_cp.npz`.
+
+    Args:
+        radio_km (float): Radio máximo de vecindad en kilómetros.
+        archivo_codigos_postales (str, optional): Ruta de `Listado-de-CP.xlsx`.
+        destino (str, optional): Ruta del archivo `.npz` a generar.
+    Returns:
+        str: Ruta del archivo generado.
+    """
+    archivo_codigos_postales = archivo_codigos_postales or ruta_listado_codigos_postales()
+    destino = destino or ruta_vecinos_cp()
+
+    df = cargar_tabla_codigos_postales(archivo_codigos_postales)
+    vecinos = construir_vecinos_cp(df, radio_km=radio_km)
+    np.savez(destino, **vecinos, mtime_listado=np.float64(os.path.getmtime(archivo_codigos_postales)))
+
+    logger.info(f"Vecinos de códigos postales generados ({len(df)} códigos, {len(vecinos['indices'])} pares, "
+                f"radio {radio_km} km) en {destino}")
+    return destino
+
+
+class VecinosCP:
+    """
+    Índice de vecindad entre códigos postales cargado desde `vecinos_cp.npz`.
+
+    Convierte los filtros de proximidad ("qué códigos hay a menos de N km") en
+    cortes de arrays, sin recalcular distancias.
+    """
+
+    def __init__(self, datos):
+        self.codigos = datos["codigos"]
+        self.indptr = datos["indptr"]
+        self.indices = datos["indices"]
+        self.distancias = datos["distancias"]
+        self.radio_km = float(datos["radio_km"])
+        self.posicion = {cp: i for i, cp in enumerate(self.codigos)}
+
+    @classmethod
+    def cargar(cls, ruta=None):
+        """
+        Carga el índice desde disco.
+
+        Args:
+            ruta (str, optional): Ruta del archivo `.npz`. Por defecto, el de `get_data_dir()`.
+        Returns:
+            VecinosCP | None: El índice, o None si no se ha generado o está desactualizado.
+        """
+        ruta = ruta or ruta_vecinos_cp()
+        if not os.path.exists(ruta):
+            logger.debug(f"[DEBUG] No existe el índice de vecinos en {ruta}")
+            return None
+
+        try:
+            try:
+                listado = ruta_listado_codigos_postales()
+            except FileNotFoundError:
+                listado = None
+            with np.load(ruta) as datos:
+                if listado and os.path.getmtime(listado) > float(datos["mtime_listado"]):
+                    logger.warning("El índice de vecinos es anterior a Listado-de-CP.xlsx; se ignora hasta regenerarlo.")
+                    return None
+                return cls({clave: datos[clave] for clave in datos.files})
+        except Exception as e:
+            logger.error(f"[ERROR] No se pudo cargar el índice de vecinos: {e}")
+            return None
+
+    def contiene(self, codigo_postal):
+        """Indica si el código postal está en el índice (uno posterior al índice no lo está)."""
+        return codigo_postal in self.posicion
+
+    def cubre_radio(self, radio_km):
+        """Indica si el índice se construyó con un radio suficiente para `radio_km`."""
+        return radio_km <= self.radio_km
+
+    def vecinos(self, codigo_postal, radio_km=None):
+        """
+        Devuelve los códigos postales vecinos y sus distancias.
+
+        Args:
+            codigo_postal (str): Código postal de origen (cinco dígitos).
+            radio_km (float, optional): Radio de búsqueda; no puede superar el del índice.
+        Returns:
+            tuple: Arrays `(codigos, distancias)` ordenados por distancia. Vacíos si el código no existe.
+        """
+        i = self.posicion.get(codigo_postal)
+        if i is None:
+            return np.zeros(0, dtype="U5"), np.zeros(0, dtype=np.float32)
+
+        inicio, fin = self.indptr[i], self.indptr[i + 1]
+        distancias = self.distancias[inicio:fin]
+        if radio_km is not None:
+            if not self.cubre_radio(radio_km):
+                raise ValueError(f"El índice de vecinos cubre {self.radio_km} km, se pidieron {radio_km} km.")
+            fin = inicio + np.searchsorted(distancias, radio_km, side="right")
+            distancias = self.distancias[inicio:fin]
+
+        return self.codigos[self.indices[inicio:fin]], distancias
+
+    def distancias_desde(self, codigo_postal, radio_km=None):
+        """
+        Devuelve las distancias a los códigos vecinos como `pd.Series` indexada por código postal,
+        lista para usar con `Series.map` sobre una columna de códigos.
+        """
+        codigos, distancias = self.vecinos(codigo_postal, radio_km)
+        return pd.Series(distancias.astype(np.float64), index=codigos)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera las listas de vecinos de códigos postales.")
+    parser.add_argument("--radio", type=float, default=RADIO_POR_DEFECTO_KM, help="Radio de vecindad en km.")
+    args = parser.parse_args()
+    generar_archivo_vecinos(radio_km=args.radio)